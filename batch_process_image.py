@@ -6,6 +6,9 @@ ORIGINAL_DIR = "original_sites"
 
 python_executable = sys.executable  # 当前运行脚本的 Python 路径
 
+# 额外参数原样传给 compress_image.py，例如: python batch_process_image.py --sweep --min-ms-ssim 0.96
+compress_args = sys.argv[1:]
+
 site_list = [d for d in os.listdir(ORIGINAL_DIR) if os.path.isdir(os.path.join(ORIGINAL_DIR, d))]
 
 for site in site_list:
@@ -13,5 +16,5 @@ for site in site_list:
 
     # 依次运行三个脚本，参数是当前site名
     subprocess.run([python_executable, "images_ai/extract_images.py", site], check=True)
-    subprocess.run([python_executable, "images_ai/compress_image.py", site], check=True)
+    subprocess.run([python_executable, "images_ai/compress_image.py", site] + compress_args, check=True)
     subprocess.run([python_executable, "images_ai/replace_images.py", site], check=True)
@@ -3,9 +3,6 @@ import sys
 import json
 import time
 import subprocess
-import threading
-from waitress import serve
-import mimetypes
 import numpy as np
 from statistics import mean
 import csv
@@ -17,6 +14,11 @@ sys.path.append(str(PATHS_DIR))
 
 # 导入 paths 模块中的路径变量
 from paths import HTML_OPTI_DIR, CSS_OPTI_DIR, JS_OPTI_DIR, IMAGE_OPTI_DIR, ACTION_CALC_DIR
+from static_server import StaticSite, MeasurementServer
+from carbon_model import carbon_emissions
+from lighthouse_resources import resource_breakdown, attribute_carbon
+from results_store import ResultsStore
+from throttling_profiles import THROTTLING_PROFILES, DEFAULT_PROFILE, lighthouse_cli_flags
 
 # --- Configuration ---
 if len(sys.argv) < 2:
@@ -37,12 +39,9 @@ if invalid_tasks:
 TASK_DIRS = {task: dir_path for task, dir_path in VALID_TASKS.items()}
 
 # Path configuration
-LOCAL_SERVER_PORT = 8000
+# 0 lets the OS pick a free port, so several reports can run side by side
+LOCAL_SERVER_PORT = int(os.getenv("LOCAL_SERVER_PORT", "0"))
 SCRIPT_DIR = os.path.abspath(os.path.dirname(__file__))
-DATA_DIR = os.path.join(SCRIPT_DIR, "data")
-CUSTOM_EMISSION_SCRIPT = os.path.join(SCRIPT_DIR, "scripts", "compute_emission.mjs")
-INPUT_DATA_PATH = os.path.join(DATA_DIR, "lh_data_got.json")
-OUTPUT_EMISSION_PATH = os.path.join(DATA_DIR, "carbon_emission.json")
 
 # Output report path
 OUTPUT_DIR = os.path.join(ACTION_CALC_DIR, PROJECT_NAME)
@@ -54,15 +53,17 @@ LIGHTHOUSE_EXEC = os.path.join(NODE_MODULES_DIR, ".bin", "lighthouse.cmd")
 # Number of Lighthouse runs
 NUM_RUNS = 5
 
+# Throttling profile from utils/throttling_profiles.py (mobile-slow4g, desktop-cable, none)
+LIGHTHOUSE_PROFILE = os.getenv("LIGHTHOUSE_PROFILE", DEFAULT_PROFILE)
+if LIGHTHOUSE_PROFILE not in THROTTLING_PROFILES:
+    print(f"Error: Unknown throttling profile '{LIGHTHOUSE_PROFILE}'. Supported profiles: {list(THROTTLING_PROFILES)}")
+    sys.exit(1)
+
 # --- Helper Functions ---
 def check_local_dependencies():
     if not os.path.exists(LIGHTHOUSE_EXEC):
         print(f"Error: Lighthouse executable '{LIGHTHOUSE_EXEC}' not found. Run: npm install lighthouse")
         sys.exit(1)
-    if not os.path.exists(CUSTOM_EMISSION_SCRIPT):
-        print(f"Error: Custom carbon emission script '{CUSTOM_EMISSION_SCRIPT}' not found. Ensure the file exists.")
-        sys.exit(1)
-    os.makedirs(DATA_DIR, exist_ok=True)
 
 def check_directory_exists(directory, description):
     if not os.path.exists(directory):
@@ -74,100 +75,48 @@ def check_file_exists(file_path, description):
         print(f"Error: {description} file '{file_path}' does not exist.")
         sys.exit(1)
 
-def start_local_server(serve_dir):
+def start_local_server(serve_dir, precompress_dirs=()):
     serve_dir = os.path.abspath(serve_dir)
     os.chdir(serve_dir)
     
-    def app(environ, start_response):
-        path = environ.get('PATH_INFO', '').lstrip('/')
-        print(f"Request: {path}")
-        full_path = os.path.join(serve_dir, path)
-        
-        if not os.path.exists(full_path) or not os.path.isfile(full_path):
-            start_response('404 Not Found', [('Content-Type', 'text/plain')])
-            return [b'404 Not Found']
-        
-        content_type, _ = mimetypes.guess_type(full_path)
-        if not content_type:
-            content_type = 'application/octet-stream'
-        
-        try:
-            with open(full_path, 'rb') as f:
-                content = f.read()
-            start_response('200 OK', [('Content-Type', content_type), ('Content-Length', str(len(content)))])
-            return [content]
-        except Exception as e:
-            start_response('500 Internal Server Error', [('Content-Type', 'text/plain')])
-            return [f'Error: {str(e)}'.encode('utf-8')]
-    
-    server_thread = threading.Thread(
-        target=serve,
-        args=(app,),
-        kwargs={'host': '127.0.0.1', 'port': LOCAL_SERVER_PORT, 'threads': 10}
-    )
-    server_thread.daemon = True
-    server_thread.start()
-    print(f"Local server started at http://localhost:{LOCAL_SERVER_PORT}")
-    time.sleep(2)
-    return server_thread
-
-def stop_local_server(server_thread):
-    print("Local server stopped")
-
-def run_custom_emission_script(total_bytes):
-    try:
-        if not os.path.exists(DATA_DIR):
-            os.makedirs(DATA_DIR)
-        print(f"  Generating input file: {INPUT_DATA_PATH}")
-        input_data = {"total_byte_weight": total_bytes}
-        with open(INPUT_DATA_PATH, 'w', encoding='utf-8') as f:
-            json.dump(input_data, f, indent=2)
-
-        print(f"  Running custom script: node {CUSTOM_EMISSION_SCRIPT}")
-        process = subprocess.run(
-            ["node", CUSTOM_EMISSION_SCRIPT],
-            capture_output=True,
-            text=True,
-            encoding='utf-8',
-            errors='replace',
-            timeout=30
-        )
-
-        if process.returncode != 0:
-            print(f"Error: Failed to run compute_emission.mjs. Exit code: {process.returncode}")
-            print(f"STDERR: {process.stderr[:500]}...")
-            return 0
-
-        if not os.path.exists(OUTPUT_EMISSION_PATH):
-            print(f"Error: Carbon emission output file '{OUTPUT_EMISSION_PATH}' was not generated.")
-            return 0
-
-        print(f"  Reading output file: {OUTPUT_EMISSION_PATH}")
-        with open(OUTPUT_EMISSION_PATH, 'r', encoding='utf-8') as f:
-            emission_data = json.load(f)
-
-        carbon_emissions = emission_data.get("carbon_emissions")
-        if carbon_emissions is None or not isinstance(carbon_emissions, (int, float)) or carbon_emissions <= 0:
-            print(f"Error: Invalid carbon_emissions in carbon_emission.json: {carbon_emissions}")
-            return 0
-
-        print(f"  Custom carbon emission: {carbon_emissions} g")
-        return carbon_emissions
-
-    except FileNotFoundError as e:
-        print(f"Error: Node.js not installed or '{CUSTOM_EMISSION_SCRIPT}' missing: {e}")
-        return 0
-    except Exception as e:
-        print(f"Error: Failed to run custom carbon emission script: {e}")
-        return 0
+    # Negotiate br/gzip via Accept-Encoding so total-byte-weight reflects real transfer size;
+    # both sites are compressed before the server reports ready, not inside the first measured request
+    app = StaticSite(serve_dir, log_requests=True, precompress_dirs=precompress_dirs)
+
+    server = MeasurementServer(app, port=LOCAL_SERVER_PORT)
+    ready_seconds = server.start()
+    print(f"Local server started at {server.base_url} (ready in {ready_seconds * 1000:.1f} ms)")
+    return server
+
+def stop_local_server(server):
+    # Server-side latency should stay far below Lighthouse metric variance
+    print(f"Local server request stats: {server.app.latency_summary()}")
+    if server.stop():
+        print("Local server stopped")
+    else:
+        print("Warning: Local server thread did not exit in time")
+
+def compute_custom_emissions(total_bytes_values):
+    """
+    Carbon (g) for several byte weights at once via carbon_model, which uses the same formula as
+    scripts/compute_emission.mjs. Missing or non-positive byte weights yield 0, as before.
+    """
+    values = np.asarray(total_bytes_values, dtype=np.float64)
+    emissions = np.where(values > 0, carbon_emissions(np.where(values > 0, values, 0)), 0.0)
+    for total_bytes, carbon in zip(values.ravel(), emissions.ravel()):
+        if total_bytes > 0:
+            print(f"  Custom carbon emission: {total_bytes:.0f} bytes -> {carbon} g")
+        else:
+            print(f"Error: Invalid total_byte_weight: {total_bytes}")
+    return emissions.tolist()
 
 def run_lighthouse(url, num_runs=NUM_RUNS, max_retries=3):
     command = [
         "cmd.exe", "/c", LIGHTHOUSE_EXEC, url,
         "--output=json",
-        "--chrome-flags=--headless", "--throttle",
+        "--chrome-flags=--headless",
         "--disable-storage-reset", "--only-categories=performance"
-    ]
+    ] + lighthouse_cli_flags(LIGHTHOUSE_PROFILE)
     results = []
     metrics_list = []
     
@@ -209,7 +158,7 @@ def run_lighthouse(url, num_runs=NUM_RUNS, max_retries=3):
     
     # 计算平均值
     averaged_metrics = {
-        key: round(mean([m[key] for m in metrics_list]), 2)
+        key: round(mean([m[key] for m in metrics_list if key in m]), 2)
         for key in metrics_list[0].keys()
     }
     
@@ -223,13 +172,16 @@ def extract_lighthouse_metrics(report):
         return None
     try:
         audits = report.get("audits", {})
-        return {
+        metrics = {
             "total_byte_weight": audits.get("total-byte-weight", {}).get("numericValue", 0),
             "first_contentful_paint_ms": audits.get("first-contentful-paint", {}).get("numericValue", 0),
             "largest_contentful_paint_ms": audits.get("largest-contentful-paint", {}).get("numericValue", 0),
             "time_to_interactive_ms": audits.get("interactive", {}).get("numericValue", 0),
             "performance_score": report.get("categories", {}).get("performance", {}).get("score", 0) * 100
         }
+        # Per-type transfer bytes from the network-requests audit (resource_bytes_*)
+        metrics.update(resource_breakdown(report))
+        return metrics
     except Exception as e:
         print(f"Error: Failed to extract Lighthouse data: {e}")
         return None
@@ -283,13 +235,15 @@ def print_summary(carbon_report):
 # --- Main Logic ---
 def main():
     check_local_dependencies()
+    # Every invocation is one run in the results store; each task is recorded as its own variant
+    results_store = ResultsStore()
+    run_id = results_store.start_run("action", {"project": PROJECT_NAME, "tasks": TASK_NAMES, "num_runs": NUM_RUNS,
+                                                "profile": LIGHTHOUSE_PROFILE})
 
     for TASK_NAME in TASK_NAMES:
         BASE_DIR = TASK_DIRS[TASK_NAME]
         WEBSITES_ORIGINAL_DIR = os.path.join("websites_original", PROJECT_NAME)
         WEBSITES_OPTIMIZED_DIR = os.path.join(BASE_DIR, "websites_optimized", PROJECT_NAME)
-        BASE_URL_ORIGINAL = f"http://localhost:{LOCAL_SERVER_PORT}/{WEBSITES_ORIGINAL_DIR.replace(os.sep, '/')}/index.html"
-        BASE_URL_OPTIMIZED = f"http://localhost:{LOCAL_SERVER_PORT}/{WEBSITES_OPTIMIZED_DIR.replace(os.sep, '/')}/index.html"
         OUTPUT_REPORT = os.path.join(OUTPUT_DIR, f"{TASK_NAME}_carbon_report_local_deps.json")
         CSV_BEFORE = os.path.join(OUTPUT_DIR, f"{TASK_NAME}_lighthouse_metrics_before.csv")
         CSV_AFTER = os.path.join(OUTPUT_DIR, f"{TASK_NAME}_lighthouse_metrics_after.csv")
@@ -300,7 +254,9 @@ def main():
         check_directory_exists(WEBSITES_OPTIMIZED_DIR, "Optimized website")
         check_file_exists(os.path.join(WEBSITES_OPTIMIZED_DIR, "index.html"), "Optimized index.html")
 
-        server_thread = start_local_server(SCRIPT_DIR)
+        server = start_local_server(SCRIPT_DIR, [WEBSITES_ORIGINAL_DIR, WEBSITES_OPTIMIZED_DIR])
+        BASE_URL_ORIGINAL = f"{server.base_url}/{WEBSITES_ORIGINAL_DIR.replace(os.sep, '/')}/index.html"
+        BASE_URL_OPTIMIZED = f"{server.base_url}/{WEBSITES_OPTIMIZED_DIR.replace(os.sep, '/')}/index.html"
         try:
             print(f"\nGenerating carbon emissions report for project '{PROJECT_NAME}' task '{TASK_NAME}'...")
             print(f"Report will be saved to: {OUTPUT_REPORT}")
@@ -323,13 +279,21 @@ def main():
             before_total_bytes = lighthouse_metrics_before["averaged_metrics"]["total_byte_weight"]
             after_total_bytes = lighthouse_metrics_after["averaged_metrics"]["total_byte_weight"]
 
-            before_custom_carbon = run_custom_emission_script(before_total_bytes)
-            after_custom_carbon = run_custom_emission_script(after_total_bytes)
+            before_custom_carbon, after_custom_carbon = compute_custom_emissions([before_total_bytes, after_total_bytes])
+            for state, url, lighthouse_metrics, total_bytes, carbon in (
+                    ("before", BASE_URL_ORIGINAL, lighthouse_metrics_before, before_total_bytes, before_custom_carbon),
+                    ("after", BASE_URL_OPTIMIZED, lighthouse_metrics_after, after_total_bytes, after_custom_carbon)):
+                results_store.record_lighthouse_runs(run_id, PROJECT_NAME, TASK_NAME, state,
+                                                     [{"metrics": m, "backend": "cli"} for m in lighthouse_metrics["raw_runs"]],
+                                                     profile=LIGHTHOUSE_PROFILE)
+                results_store.record_carbon(run_id, PROJECT_NAME, TASK_NAME, state, url, total_bytes, carbon,
+                                            profile=LIGHTHOUSE_PROFILE)
 
             # Generate report
             carbon_report = {
                 "project_name": PROJECT_NAME,
                 "task_name": TASK_NAME,
+                "throttling_profile": LIGHTHOUSE_PROFILE,
                 "timestamp": time.strftime("%Y-%m-%d %H:%M:%S", time.localtime()),
                 "metrics_before": {
                     "raw_runs": lighthouse_metrics_before["raw_runs"],
@@ -345,7 +309,10 @@ def main():
                 "carbon_estimates_after": {
                     "custom": {"carbon_g": round(after_custom_carbon, 4)}
                 },
-                "carbon_reduction_g": round(before_custom_carbon - after_custom_carbon, 4)
+                "carbon_reduction_g": round(before_custom_carbon - after_custom_carbon, 4),
+                # Transfer carbon split by resource type, showing which assets the task actually reduced
+                "carbon_by_resource_type": attribute_carbon(lighthouse_metrics_before["averaged_metrics"],
+                                                            lighthouse_metrics_after["averaged_metrics"])
             }
 
             # Save report
@@ -390,7 +357,9 @@ def main():
             print_summary(carbon_report)
 
         finally:
-            stop_local_server(server_thread)
+            stop_local_server(server)
+
+    results_store.close()
 
 if __name__ == "__main__":
     try:
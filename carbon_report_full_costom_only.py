@@ -4,8 +4,10 @@ import json
 import time
 import subprocess
 import threading
-from waitress import serve
-import mimetypes
+import queue
+import shutil
+import signal
+from concurrent.futures import ThreadPoolExecutor
 import numpy as np
 from statistics import mean
 import csv
@@ -18,6 +20,12 @@ if str(PATHS_DIR) not in sys.path:
 
 try:
     from paths import WEBSITES_ORIGINAL_DIR, FULL_CARBON_DIR, FULL_OPTI_DIR
+    from static_server import StaticSite, MeasurementServer
+    from carbon_model import carbon_emissions
+    from lighthouse_resources import resource_breakdown, attribute_carbon
+    from results_store import ResultsStore
+    from carbon_uncertainty import carbon_bands, band_columns, band_header, MC_SAMPLES
+    from throttling_profiles import THROTTLING_PROFILES, selected_profiles, lighthouse_cli_flags, lighthouse_settings
 except ImportError as e:
     print(f"错误：无法从 'paths.py' 导入路径变量。请确保 'utils/paths.py' 文件存在且路径正确。")
     print(f"尝试的路径是: {PATHS_DIR}")
@@ -25,16 +33,13 @@ except ImportError as e:
     sys.exit(1)
 
 # --- 全局配置 ---
-LOCAL_SERVER_PORT = 8000
+# 0 表示由系统分配空闲端口，多个报告脚本可以同时运行
+LOCAL_SERVER_PORT = int(os.getenv("LOCAL_SERVER_PORT", "0"))
 ROOT_DIR = "C:/Users/user/Desktop/web_carbon"
 FINAL_OPTIMIZED_WEBSITES_BASE_DIR = os.path.join(FULL_OPTI_DIR, "websites_optimized")
 FULL_REPORT_OUTPUT_BASE_DIR = FULL_CARBON_DIR
 TEMP_PROJECT_DATA_BASE_DIR = os.path.join(FULL_REPORT_OUTPUT_BASE_DIR, "temp")
 FINAL_AGGREGATED_REPORTS_DIR = FULL_REPORT_OUTPUT_BASE_DIR
-DATA_DIR = os.path.join(ROOT_DIR, "data")
-CUSTOM_EMISSION_SCRIPT = os.path.join(ROOT_DIR, "scripts", "compute_emission.mjs")
-INPUT_DATA_PATH = os.path.join(DATA_DIR, "lh_data_got.json")
-OUTPUT_EMISSION_PATH = os.path.join(DATA_DIR, "carbon_emission.json")
 
 
 # Lighthouse 可执行文件路径
@@ -47,15 +52,53 @@ if sys.platform != "win32":
 NUM_RUNS = 5
 MAX_RETRIES_PER_RUN = 3
 
+# 并发 Lighthouse：worker 数量受 CPU 预算限制，每个 worker 的 Chrome 调试端口由系统分配（端口 0），
+# 同时运行的多个报告之间不会连到彼此的 Chrome
+LIGHTHOUSE_WORKERS = int(os.getenv("LIGHTHOUSE_WORKERS", "4"))
+LIGHTHOUSE_CPU_BUDGET = float(os.getenv("LIGHTHOUSE_CPU_BUDGET", str(os.cpu_count() or 2)))
+CORES_PER_LIGHTHOUSE_WORKER = 2
+# 大于 0 时，先在第一个项目上比较串行与并发运行的方差
+LIGHTHOUSE_CALIBRATION_RUNS = int(os.getenv("LIGHTHOUSE_CALIBRATION_RUNS", "0"))
+# 自适应采样：每个站点至少运行 LIGHTHOUSE_MIN_RUNS 次，之后当 CI_METRICS 的 95% 置信区间全宽
+# 不超过均值的 CI_TARGET_RELATIVE_WIDTH 时停止，最多运行 LIGHTHOUSE_MAX_RUNS 次
+LIGHTHOUSE_MIN_RUNS = int(os.getenv("LIGHTHOUSE_MIN_RUNS", "2"))
+LIGHTHOUSE_MAX_RUNS = int(os.getenv("LIGHTHOUSE_MAX_RUNS", "10"))
+CI_TARGET_RELATIVE_WIDTH = float(os.getenv("LIGHTHOUSE_CI_RELATIVE_WIDTH", "0.1"))
+CI_METRICS = ["total_byte_weight_bytes", "largest_contentful_paint_ms"]
+# 偏离中位数超过 MAD_OUTLIER_THRESHOLD 个（标准化）MAD 的运行视为离群，样本少于 4 个时不剔除
+MAD_OUTLIER_THRESHOLD = 3.5
+MIN_RUNS_FOR_OUTLIER_REMOVAL = 4
+# 95% 双侧 t 分布临界值（自由度 1–30），更大的自由度使用正态近似
+T_CRITICAL_95 = [12.706, 4.303, 3.182, 2.776, 2.571, 2.447, 2.365, 2.306, 2.262, 2.228,
+                 2.201, 2.179, 2.160, 2.145, 2.131, 2.120, 2.110, 2.101, 2.093, 2.086,
+                 2.080, 2.074, 2.069, 2.064, 2.060, 2.056, 2.052, 2.048, 2.045, 2.042]
+# 测量后端：warm（常驻 Chrome，每次运行新建无痕上下文）或 cli（每次运行启动一次 Lighthouse CLI）
+LIGHTHOUSE_BACKEND = os.getenv("LIGHTHOUSE_BACKEND", "warm").lower()
+WARM_LIGHTHOUSE_SCRIPT = os.path.join(ROOT_DIR, "scripts", "lighthouse_warm.mjs")
+# 节流配置矩阵：逗号分隔的配置名（见 utils/throttling_profiles.py），每个站点在每个配置下分别采样，第一个为主配置
+try:
+    LIGHTHOUSE_PROFILES = selected_profiles()
+except ValueError as e:
+    print(f"错误: {e}")
+    sys.exit(1)
+PRIMARY_PROFILE = LIGHTHOUSE_PROFILES[0]
+TIMING_METRICS = ["first_contentful_paint_ms", "largest_contentful_paint_ms", "time_to_interactive_ms", "loading_time_ms"]
+PROFILE_CSV_METRICS = {
+    "total_byte_weight_bytes": "Total Byte Size (bytes)",
+    "first_contentful_paint_ms": "First Contentful Paint (ms)",
+    "largest_contentful_paint_ms": "Largest Contentful Paint (ms)",
+    "time_to_interactive_ms": "Time to Interactive (ms)",
+    "loading_time_ms": "Loading Time (ms)",
+    "performance_score": "Performance Score",
+}
+VARIANCE_METRICS = ["total_byte_weight_bytes", "first_contentful_paint_ms", "largest_contentful_paint_ms",
+                    "time_to_interactive_ms", "loading_time_ms"]
+
 # --- 辅助函数 ---
 def check_local_dependencies():
     if not os.path.exists(LIGHTHOUSE_EXEC):
         print(f"错误: Lighthouse 可执行文件 '{LIGHTHOUSE_EXEC}' 未找到。请运行: npm install lighthouse")
         sys.exit(1)
-    if not os.path.exists(CUSTOM_EMISSION_SCRIPT):
-        print(f"错误: 自定义碳排放脚本 '{CUSTOM_EMISSION_SCRIPT}' 未找到。请确保文件存在。")
-        sys.exit(1)
-    os.makedirs(DATA_DIR, exist_ok=True)
 
 def check_directory_exists(directory, description, critical=True):
     if not os.path.exists(directory) or not os.path.isdir(directory):
@@ -77,198 +120,140 @@ def start_local_server(serve_from_dir):
     abs_serve_from_dir = os.path.abspath(serve_from_dir)
     print(f"尝试从以下目录启动服务: {abs_serve_from_dir}")
 
-    def app(environ, start_response):
-        path = environ.get('PATH_INFO', '').lstrip('/')
-        requested_file_path = os.path.normpath(os.path.join(abs_serve_from_dir, path))
-        if not requested_file_path.startswith(abs_serve_from_dir):
-            start_response('403 Forbidden', [('Content-Type', 'text/plain')])
-            return [b'403 Forbidden']
-        if os.path.exists(requested_file_path) and os.path.isfile(requested_file_path):
-            content_type, _ = mimetypes.guess_type(requested_file_path)
-            content_type = content_type or 'application/octet-stream'
-            try:
-                with open(requested_file_path, 'rb') as f:
-                    content = f.read()
-                start_response('200 OK', [('Content-Type', content_type), ('Content-Length', str(len(content)))])
-                return [content]
-            except Exception as e:
-                start_response('500 Internal Server Error', [('Content-Type', 'text/plain')])
-                return [f'读取文件错误: {str(e)}'.encode('utf-8')]
-        else:
-            start_response('404 Not Found', [('Content-Type', 'text/plain')])
-            return [b'404 Not Found']
-
-    server_thread = threading.Thread(
-        target=serve,
-        args=(app,),
-        kwargs={'host': '127.0.0.1', 'port': LOCAL_SERVER_PORT, 'threads': 10, '_quiet': False}
-    )
-    server_thread.daemon = True
-    server_thread.start()
-    print(f"本地 Waitress 服务器已启动: http://localhost:{LOCAL_SERVER_PORT}, 服务目录: {abs_serve_from_dir}")
-    time.sleep(5)
-    return server_thread
-
-def stop_local_server(server_thread):
-    print("本地服务器正在停止 (Waitress 通常在主线程退出时停止守护线程)。")
-
-def run_custom_emission_script(total_bytes):
-    try:
-        if not os.path.exists(DATA_DIR):
-            os.makedirs(DATA_DIR)
-        print(f"  生成输入文件: {INPUT_DATA_PATH}")
-        input_data = {"total_byte_weight": total_bytes}
-        with open(INPUT_DATA_PATH, 'w', encoding='utf-8') as f:
-            json.dump(input_data, f, indent=2)
-
-        print(f"  运行自定义脚本: node {CUSTOM_EMISSION_SCRIPT}")
-        process = subprocess.run(
-            ["node", CUSTOM_EMISSION_SCRIPT],
-            capture_output=True,
-            text=True,
-            encoding='utf-8',
-            errors='replace',
-            timeout=30
-        )
+    # 按 Accept-Encoding 返回 br/gzip 编码的响应，使 total-byte-weight 反映真实传输大小；
+    # 原始站点与优化站点在服务器就绪前一起预压缩，请求中不再临时压缩
+    precompress_dirs = [os.path.basename(Path(WEBSITES_ORIGINAL_DIR)),
+                        os.path.join(os.path.basename(Path(FULL_OPTI_DIR)), "websites_optimized")]
+    app = StaticSite(abs_serve_from_dir, precompress_dirs=precompress_dirs)
 
-        if process.returncode != 0:
-            print(f"错误: 运行 compute_emission.mjs 失败。退出码: {process.returncode}")
-            print(f"STDERR: {process.stderr[:500]}...")
-            return 0
-
-        if not os.path.exists(OUTPUT_EMISSION_PATH):
-            print(f"错误: 碳排放输出文件 '{OUTPUT_EMISSION_PATH}' 未生成。")
-            return 0
-
-        print(f"  读取输出文件: {OUTPUT_EMISSION_PATH}")
-        with open(OUTPUT_EMISSION_PATH, 'r', encoding='utf-8') as f:
-            emission_data = json.load(f)
-
-        carbon_emissions = emission_data.get("carbon_emissions")
-        if carbon_emissions is None or not isinstance(carbon_emissions, (int, float)) or carbon_emissions <= 0:
-            print(f"错误: carbon_emission.json 中的 carbon_emissions 无效: {carbon_emissions}")
-            return 0
-
-        print(f"  自定义碳排放: {carbon_emissions} g")
-        return carbon_emissions
-
-    except FileNotFoundError as e:
-        print(f"错误: Node.js 未安装或 '{CUSTOM_EMISSION_SCRIPT}' 缺失: {e}")
-        return 0
+    server = MeasurementServer(app, port=LOCAL_SERVER_PORT)
+    try:
+        ready_seconds = server.start()
     except Exception as e:
-        print(f"错误: 运行自定义碳排放脚本失败: {e}")
-        return 0
-
-def run_lighthouse_multiple_times(url, num_runs=NUM_RUNS, max_retries=MAX_RETRIES_PER_RUN, temp_dir="."):
-    base_command_prefix = [str(LIGHTHOUSE_EXEC), url, "--output=json"]
-    base_command_suffix = [
-        "--chrome-flags=--headless --disable-gpu --no-sandbox --no-zygote",
+        print(f"错误: 本地服务器启动失败: {e}")
+        return None
+    print(f"本地 Waitress 服务器已启动: {server.base_url}（{ready_seconds * 1000:.1f} 毫秒后就绪）, 服务目录: {abs_serve_from_dir}")
+    return server
+
+def stop_local_server(server):
+    # 服务端耗时分位数应远小于 Lighthouse 指标的波动，否则测量结果受服务器影响
+    print(f"本地服务器请求统计: {server.app.latency_summary()}")
+    if server.stop():
+        print("本地服务器已停止。")
+    else:
+        print("警告: 本地服务器线程未在超时内退出。")
+
+def compute_custom_emissions(total_bytes_values):
+    """
+    用 carbon_model（与 scripts/compute_emission.mjs 相同的公式）一次计算多个字节数对应的碳排放（g）。
+    无效的字节数（缺失或 <= 0）返回 0，与原先 .mjs 拒绝计算时的处理一致。
+    """
+    values = np.asarray(total_bytes_values, dtype=np.float64)
+    emissions = np.where(values > 0, carbon_emissions(np.where(values > 0, values, 0)), 0.0)
+    for total_bytes, carbon in zip(values.ravel(), emissions.ravel()):
+        if total_bytes > 0:
+            print(f"  自定义碳排放: {total_bytes:.0f} 字节 → {carbon} g")
+        else:
+            print(f"错误: total_byte_weight 数据缺失或无效: {total_bytes}")
+    return emissions.tolist()
+
+def build_lighthouse_command(url, output_path, slot=None, profile_dir=None, throttling=PRIMARY_PROFILE):
+    chrome_flags = "--headless --disable-gpu --no-sandbox --no-zygote"
+    command = [str(LIGHTHOUSE_EXEC), url, "--output=json", f"--output-path={output_path}"]
+    if slot:
+        # 每个并发 worker 使用独立的 Chrome 配置目录；--port=0 让每次启动的 Chrome 使用系统分配的空闲调试端口
+        chrome_flags += f" --user-data-dir={profile_dir}"
+        command.append("--port=0")
+    return command + [
+        f"--chrome-flags={chrome_flags}",
         "--disable-storage-reset",
         "--only-categories=performance"
-    ]
-    all_run_metrics = []
-    os.makedirs(temp_dir, exist_ok=True)
-
-    for i in range(num_runs):
-        temp_output_json = os.path.join(temp_dir, f"temp_lighthouse_run_{i+1}_{time.time_ns()}.json")
-        print(f"  Lighthouse 运行 {i+1}/{num_runs} 针对 {url}...")
-        current_run_command = base_command_prefix + [f"--output-path={temp_output_json}"] + base_command_suffix
-
-        for attempt in range(max_retries):
-            process_handle = None
-            print(f"    尝试 {attempt+1} 命令: {' '.join(current_run_command)}")
-            try:
-                process_handle = subprocess.Popen(
-                    current_run_command,
-                    stdout=subprocess.PIPE,
-                    stderr=subprocess.PIPE,
-                    text=True,
-                    encoding='utf-8',
-                    errors='replace',
-                    shell=(sys.platform == "win32")
-                )
-                stdout, stderr = process_handle.communicate(timeout=100)
-                returncode = process_handle.returncode
-
-                if stdout:
-                    print(f"      Lighthouse stdout (运行 {i+1}, 尝试 {attempt+1}) 头500字符:\n{stdout[:500]}...")
-                if stderr:
-                    print(f"      Lighthouse stderr (运行 {i+1}, 尝试 {attempt+1}) 头500字符:\n{stderr[:500]}...")
-
-                if returncode != 0:
-                    print(f"    运行 {i+1}, 尝试 {attempt+1} 失败: Lighthouse 退出码 {returncode}")
-                    if attempt < max_retries - 1:
-                        print(f"      2秒后重试...")
-                        time.sleep(2)
-                        continue
-                    else:
-                        print(f"  错误: 运行 {i+1} 在 {max_retries} 次重试后因 Lighthouse 错误退出 (URL: {url})。")
-                        break
-
-                if not os.path.exists(temp_output_json):
-                    print(f"    运行 {i+1}, 尝试 {attempt+1}: Lighthouse 报告文件 '{temp_output_json}' 未创建。")
-                    if attempt < max_retries - 1:
-                        time.sleep(2)
-                        continue
-                    else:
-                        break
-
-                if os.path.getsize(temp_output_json) == 0:
-                    print(f"    运行 {i+1}, 尝试 {attempt+1}: Lighthouse 报告文件 '{temp_output_json}' 为空。")
-                    if attempt < max_retries - 1:
-                        time.sleep(2)
-                        continue
-                    else:
-                        break
+    ] + lighthouse_cli_flags(throttling)
 
+def run_lighthouse_once(url, run_label, temp_dir=".", max_retries=MAX_RETRIES_PER_RUN, slot=None, throttling=PRIMARY_PROFILE):
+    """
+    运行一次 Lighthouse（失败时重试），返回提取出的指标，失败返回 None。
+    Lighthouse 可执行文件缺失时抛出 FileNotFoundError。
+    """
+    os.makedirs(temp_dir, exist_ok=True)
+    temp_output_json = os.path.join(temp_dir, f"temp_lighthouse_run_{time.time_ns()}_{threading.get_ident()}.json")
+    print(f"  Lighthouse {run_label} 针对 {url}...")
+    # 每次运行使用全新的配置目录：配合 --disable-storage-reset，缓存不能在两次运行之间残留
+    profile_dir = os.path.join(slot["user_data_dir"], f"run_{time.time_ns()}") if slot else None
+    current_run_command = build_lighthouse_command(url, temp_output_json, slot, profile_dir, throttling)
+    metrics = None
+
+    for attempt in range(max_retries):
+        process_handle = None
+        print(f"    {run_label} 尝试 {attempt+1} 命令: {' '.join(current_run_command)}")
+        try:
+            process_handle = subprocess.Popen(
+                current_run_command,
+                stdout=subprocess.PIPE,
+                stderr=subprocess.PIPE,
+                text=True,
+                encoding='utf-8',
+                errors='replace',
+                shell=(sys.platform == "win32")
+            )
+            stdout, stderr = process_handle.communicate(timeout=100)
+            returncode = process_handle.returncode
+
+            if stdout:
+                print(f"      Lighthouse stdout ({run_label}, 尝试 {attempt+1}) 头500字符:\n{stdout[:500]}...")
+            if stderr:
+                print(f"      Lighthouse stderr ({run_label}, 尝试 {attempt+1}) 头500字符:\n{stderr[:500]}...")
+
+            if returncode != 0:
+                print(f"    {run_label}, 尝试 {attempt+1} 失败: Lighthouse 退出码 {returncode}")
+            elif not os.path.exists(temp_output_json):
+                print(f"    {run_label}, 尝试 {attempt+1}: Lighthouse 报告文件 '{temp_output_json}' 未创建。")
+            elif os.path.getsize(temp_output_json) == 0:
+                print(f"    {run_label}, 尝试 {attempt+1}: Lighthouse 报告文件 '{temp_output_json}' 为空。")
+            else:
                 with open(temp_output_json, 'r', encoding='utf-8') as f:
                     report = json.load(f)
-
                 metrics = extract_lighthouse_metrics(report)
                 if metrics:
-                    all_run_metrics.append(metrics)
-                    print(f"    运行 {i+1} 成功。性能得分: {metrics.get('performance_score', 'N/A')}")
+                    print(f"    {run_label} 成功。性能得分: {metrics.get('performance_score', 'N/A')}")
                     break
-                else:
-                    print(f"    运行 {i+1}, 尝试 {attempt+1}: 未能从报告中提取指标。文件内容可能不是有效的 Lighthouse JSON。")
-
-            except subprocess.TimeoutExpired:
-                print(f"    运行 {i+1}, 尝试 {attempt+1}: Lighthouse 运行超时。")
-                if process_handle:
-                    process_handle.kill()
-            except FileNotFoundError:
-                print(f"    运行 {i+1}, 尝试 {attempt+1}: Lighthouse 可执行文件未找到。请检查路径: {LIGHTHOUSE_EXEC}")
-                return None
-            except json.JSONDecodeError:
-                print(f"    运行 {i+1}, 尝试 {attempt+1}: 解析 Lighthouse JSON 报告 '{temp_output_json}' 失败。")
-                if os.path.exists(temp_output_json):
-                    try:
-                        with open(temp_output_json, 'r', encoding='utf-8') as f_err:
-                            file_content_preview = f_err.read(1000)
-                            print(f"      文件 '{temp_output_json}' 内容预览 (前1000字符):\n{file_content_preview}...")
-                    except Exception as e_read:
-                        print(f"      读取错误文件 '{temp_output_json}' 内容时出错: {e_read}")
-            except Exception as e:
-                print(f"    运行 {i+1}, 尝试 {attempt+1}: 发生意外错误: {e}")
-
-            if attempt < max_retries - 1 and not all_run_metrics:
-                print(f"      2秒后重试...")
-                time.sleep(2)
-            elif all_run_metrics and len(all_run_metrics) == i+1:
-                break
-            else:
-                print(f"  错误: 运行 {i+1} 在 {max_retries} 次重试后失败 (URL: {url})。")
-
-        if os.path.exists(temp_output_json):
-            try:
-                os.remove(temp_output_json)
-            except Exception as e_del:
-                print(f"    警告: 删除临时 Lighthouse 文件 '{temp_output_json}' 失败: {e_del}")
-
-    if not all_run_metrics:
-        print(f"错误: {num_runs} 次 Lighthouse 运行后未能收集到有效指标 (URL: {url})。")
-        return None
-
+                print(f"    {run_label}, 尝试 {attempt+1}: 未能从报告中提取指标。文件内容可能不是有效的 Lighthouse JSON。")
+
+        except subprocess.TimeoutExpired:
+            print(f"    {run_label}, 尝试 {attempt+1}: Lighthouse 运行超时。")
+            if process_handle:
+                process_handle.kill()
+        except FileNotFoundError:
+            print(f"    {run_label}, 尝试 {attempt+1}: Lighthouse 可执行文件未找到。请检查路径: {LIGHTHOUSE_EXEC}")
+            raise
+        except json.JSONDecodeError:
+            print(f"    {run_label}, 尝试 {attempt+1}: 解析 Lighthouse JSON 报告 '{temp_output_json}' 失败。")
+            if os.path.exists(temp_output_json):
+                try:
+                    with open(temp_output_json, 'r', encoding='utf-8') as f_err:
+                        file_content_preview = f_err.read(1000)
+                        print(f"      文件 '{temp_output_json}' 内容预览 (前1000字符):\n{file_content_preview}...")
+                except Exception as e_read:
+                    print(f"      读取错误文件 '{temp_output_json}' 内容时出错: {e_read}")
+        except Exception as e:
+            print(f"    {run_label}, 尝试 {attempt+1}: 发生意外错误: {e}")
+
+        if attempt < max_retries - 1:
+            print(f"      2秒后重试...")
+            time.sleep(2)
+        else:
+            print(f"  错误: {run_label} 在 {max_retries} 次重试后失败 (URL: {url})。")
+
+    if os.path.exists(temp_output_json):
+        try:
+            os.remove(temp_output_json)
+        except Exception as e_del:
+            print(f"    警告: 删除临时 Lighthouse 文件 '{temp_output_json}' 失败: {e_del}")
+    if profile_dir:
+        shutil.rmtree(profile_dir, ignore_errors=True)
+    return metrics
+
+def average_run_metrics(all_run_metrics):
     averaged_metrics = {}
     if all_run_metrics:
         keys_to_average = all_run_metrics[0].keys()
@@ -278,8 +263,380 @@ def run_lighthouse_multiple_times(url, num_runs=NUM_RUNS, max_retries=MAX_RETRIE
                 averaged_metrics[key] = round(mean(values), 2)
             else:
                 averaged_metrics[key] = 0
+    return averaged_metrics
 
-    return {"raw_runs": all_run_metrics, "averaged_metrics": averaged_metrics}
+def run_lighthouse_multiple_times(url, num_runs=NUM_RUNS, max_retries=MAX_RETRIES_PER_RUN, temp_dir=".",
+                                  throttling=PRIMARY_PROFILE):
+    all_run_metrics = []
+    for i in range(num_runs):
+        try:
+            metrics = run_lighthouse_once(url, f"运行 {i+1}/{num_runs}", temp_dir, max_retries, throttling=throttling)
+        except FileNotFoundError:
+            return None
+        if metrics:
+            all_run_metrics.append(metrics)
+
+    if not all_run_metrics:
+        print(f"错误: {num_runs} 次 Lighthouse 运行后未能收集到有效指标 (URL: {url})。")
+        return None
+    return {"raw_runs": all_run_metrics, "averaged_metrics": average_run_metrics(all_run_metrics)}
+
+class WarmLighthouse:
+    """
+    常驻 Lighthouse 进程（scripts/lighthouse_warm.mjs）：Chrome 只启动一次，每次测量在新的无痕上下文中进行，
+    省去每次运行启动 Node 与 Chrome 的开销。返回的报告只包含 extract_lighthouse_metrics 需要的字段。
+    """
+
+    def __init__(self, port=0, user_data_dir=None, startup_timeout=60):
+        self.chrome_port = None
+        self.chrome_pid = None
+        self.process = subprocess.Popen(
+            ["node", str(WARM_LIGHTHOUSE_SCRIPT), str(port), user_data_dir or ""],
+            stdin=subprocess.PIPE,
+            stdout=subprocess.PIPE,
+            stderr=subprocess.PIPE,
+            text=True,
+            encoding='utf-8',
+            errors='replace',
+            bufsize=1
+        )
+        self._lines = queue.Queue()
+        self._stderr_tail = []
+        self._next_id = 0
+        threading.Thread(target=self._pump_stdout, daemon=True).start()
+        threading.Thread(target=self._pump_stderr, daemon=True).start()
+        message = self._read_message(startup_timeout)
+        if not message.get("ready"):
+            self.close()
+            raise RuntimeError(f"常驻 Lighthouse 启动失败: {message.get('error', '')[:500]}")
+        # port 为 0 时由 chrome-launcher 选择空闲端口，以实际端口为准
+        self.chrome_port = message.get("port")
+        self.chrome_pid = message.get("pid")
+
+    def _pump_stdout(self):
+        for line in self.process.stdout:
+            self._lines.put(line)
+        self._lines.put(None)
+
+    def _pump_stderr(self):
+        for line in self.process.stderr:
+            self._stderr_tail = (self._stderr_tail + [line])[-20:]
+
+    def _stderr_summary(self):
+        try:
+            self.process.wait(timeout=5)
+        except subprocess.TimeoutExpired:
+            pass
+        errors = [line.strip() for line in self._stderr_tail if "Error" in line]
+        return (errors[0] if errors else "".join(self._stderr_tail).strip())[:500]
+
+    def _read_message(self, timeout):
+        while True:
+            try:
+                line = self._lines.get(timeout=timeout)
+            except queue.Empty:
+                raise TimeoutError(f"常驻 Lighthouse 在 {timeout} 秒内没有响应")
+            if line is None:
+                raise RuntimeError(f"常驻 Lighthouse 进程已退出: {self._stderr_summary()}")
+            line = line.strip()
+            if line.startswith("{"):
+                return json.loads(line)
+
+    def run(self, url, settings=None, timeout=100):
+        self._next_id += 1
+        self.process.stdin.write(json.dumps({"id": self._next_id, "url": url, "settings": settings or {}}) + "\n")
+        self.process.stdin.flush()
+        while True:
+            message = self._read_message(timeout)
+            if message.get("id") == self._next_id:
+                break
+        if message.get("error"):
+            raise RuntimeError(message["error"][:500])
+        return message["report"]
+
+    def close(self):
+        """正常情况下由 node 进程关闭 Chrome；node 已退出或无响应被强制结束时，由这里结束它启动的 Chrome。"""
+        closed = False
+        try:
+            if self.process.poll() is None:
+                self.process.stdin.write(json.dumps({"command": "close"}) + "\n")
+                self.process.stdin.flush()
+                self.process.wait(timeout=15)
+                closed = self.process.returncode == 0
+        except Exception:
+            self.process.kill()
+        if not closed:
+            self._kill_chrome()
+
+    def _kill_chrome(self):
+        if not self.chrome_pid:
+            return
+        try:
+            if sys.platform == "win32":
+                # /T 同时结束 Chrome 的渲染等子进程
+                subprocess.run(["taskkill", "/F", "/T", "/PID", str(self.chrome_pid)], capture_output=True)
+            else:
+                os.kill(self.chrome_pid, signal.SIGKILL)
+        except OSError:
+            pass
+        self.chrome_pid = None
+
+def run_lighthouse_warm(browser, url, run_label, max_retries=MAX_RETRIES_PER_RUN, throttling=PRIMARY_PROFILE):
+    """用常驻浏览器运行一次测量（失败时重试），返回提取出的指标，失败返回 None。"""
+    for attempt in range(max_retries):
+        try:
+            metrics = extract_lighthouse_metrics(browser.run(url, lighthouse_settings(throttling)))
+            if metrics:
+                print(f"    {run_label} 成功（常驻浏览器）。性能得分: {metrics.get('performance_score', 'N/A')}")
+                return metrics
+            print(f"    {run_label}, 尝试 {attempt+1}: 常驻浏览器返回的报告不完整。")
+        except TimeoutError as e:
+            print(f"    {run_label}, 尝试 {attempt+1}: {e}")
+            return None
+        except Exception as e:
+            print(f"    {run_label}, 尝试 {attempt+1}: 常驻浏览器测量失败: {e}")
+            if browser.process.poll() is not None:
+                return None
+    return None
+
+class LighthousePool:
+    """
+    并发 Lighthouse 调度器：固定数量的 worker 槽位，每个槽位有自己的 user-data-dir，Chrome 调试端口由系统分配。
+    所有 worker 共享同一个 127.0.0.1 本地服务器。
+    """
+
+    def __init__(self, num_workers, temp_root):
+        self.num_workers = max(1, num_workers)
+        self.slots = queue.Queue()
+        for index in range(self.num_workers):
+            self.slots.put({
+                "index": index,
+                "user_data_dir": os.path.abspath(os.path.join(temp_root, "chrome_profiles", f"worker_{index}"))
+            })
+        self.executor = ThreadPoolExecutor(max_workers=self.num_workers)
+        self._active = 0
+        self._lock = threading.Lock()
+
+    def _warm_browser(self, slot):
+        """按需为槽位启动常驻浏览器；启动失败时该槽位回退到 CLI。"""
+        if LIGHTHOUSE_BACKEND != "warm" or slot.get("warm") is False:
+            return None
+        if slot.get("warm") is None or slot["warm"].process.poll() is not None:
+            try:
+                slot["warm"] = WarmLighthouse(0, slot["user_data_dir"])
+            except Exception as e:
+                hint = "（缺少 Node 依赖，请在项目根目录运行 npm install，见 package.json）" if "ERR_MODULE_NOT_FOUND" in str(e) else ""
+                print(f"  警告: worker {slot['index']} 无法启动常驻浏览器，回退到 Lighthouse CLI{hint}: {e}")
+                slot["warm"] = False
+                return None
+        return slot["warm"]
+
+    def _run(self, url, run_label, temp_dir, throttling):
+        slot = self.slots.get()
+        with self._lock:
+            self._active += 1
+            concurrency = self._active
+        label = f"{run_label} [worker {slot['index']}]"
+        started = time.perf_counter()
+        backend = "cli"
+        try:
+            metrics = None
+            browser = self._warm_browser(slot)
+            if browser is not None:
+                backend = "warm"
+                metrics = run_lighthouse_warm(browser, url, label, throttling=throttling)
+                if metrics is None:
+                    print(f"    {label}: 常驻浏览器未能完成测量，本次回退到 Lighthouse CLI。")
+                    browser.close()
+                    slot["warm"] = None
+            if metrics is None:
+                backend = "cli"
+                metrics = run_lighthouse_once(url, label, temp_dir, slot=slot, throttling=throttling)
+        except FileNotFoundError:
+            metrics = None
+        finally:
+            with self._lock:
+                self._active -= 1
+            self.slots.put(slot)
+        return {"metrics": metrics, "concurrency": concurrency, "backend": backend,
+                "seconds": round(time.perf_counter() - started, 3)}
+
+    def submit(self, url, run_label, temp_dir, throttling=PRIMARY_PROFILE):
+        return self.executor.submit(self._run, url, run_label, temp_dir, throttling)
+
+    def shutdown(self):
+        self.executor.shutdown(wait=True)
+        while not self.slots.empty():
+            slot = self.slots.get()
+            if slot.get("warm"):
+                slot["warm"].close()
+
+def lighthouse_worker_count():
+    """在 CPU 预算内能同时运行的 Lighthouse worker 数（每个 Chrome 实例约占 CORES_PER_LIGHTHOUSE_WORKER 个核）。"""
+    by_budget = int(LIGHTHOUSE_CPU_BUDGET // CORES_PER_LIGHTHOUSE_WORKER)
+    return max(1, min(LIGHTHOUSE_WORKERS, by_budget))
+
+def coefficient_of_variation(values):
+    values = np.asarray(values, dtype=float)
+    if values.size < 2 or values.mean() == 0:
+        return None
+    return float(values.std(ddof=1) / values.mean())
+
+def summarize_run_variance(run_groups):
+    """
+    run_groups: {(项目, 节流配置, 状态): [指标字典, ...]}。返回各指标在各组内变异系数的平均值。
+    """
+    summary = {}
+    for key in VARIANCE_METRICS:
+        cvs = [coefficient_of_variation([m[key] for m in runs]) for runs in run_groups.values() if runs]
+        cvs = [cv for cv in cvs if cv is not None]
+        summary[key] = round(mean(cvs), 4) if cvs else None
+    return summary
+
+def t_critical_95(df):
+    return T_CRITICAL_95[df - 1] if 1 <= df <= len(T_CRITICAL_95) else 1.96
+
+def mad_outliers(values):
+    """按中位数绝对偏差标记离群值；MAD 为 0（几乎所有值相同）时不标记。"""
+    values = np.asarray(values, dtype=float)
+    median = np.median(values)
+    mad = np.median(np.abs(values - median))
+    if mad == 0:
+        return np.zeros(values.size, dtype=bool)
+    # 1.4826 使 MAD 在正态分布下与标准差一致
+    return np.abs(values - median) / (1.4826 * mad) > MAD_OUTLIER_THRESHOLD
+
+def sampling_summary(runs):
+    """
+    对一组运行结果剔除离群运行后计算 CI_METRICS 的 95% 置信区间。
+    converged 表示所有指标的相对区间宽度（全宽 / 均值）都不超过 CI_TARGET_RELATIVE_WIDTH。
+    """
+    outliers = np.zeros(len(runs), dtype=bool)
+    if len(runs) >= MIN_RUNS_FOR_OUTLIER_REMOVAL:
+        for key in CI_METRICS:
+            outliers |= mad_outliers([m[key] for m in runs])
+    kept = [m for m, is_outlier in zip(runs, outliers) if not is_outlier]
+    summary = {
+        "runs": len(runs),
+        "kept_runs": len(kept),
+        "outlier_runs": [i + 1 for i, is_outlier in enumerate(outliers) if is_outlier],
+        "ci_95": {},
+        "converged": len(kept) >= 2
+    }
+    for key in CI_METRICS:
+        values = np.asarray([m[key] for m in kept], dtype=float)
+        if values.size < 2:
+            summary["ci_95"][key] = None
+            continue
+        half_width = t_critical_95(values.size - 1) * values.std(ddof=1) / np.sqrt(values.size)
+        relative_width = float(2 * half_width / values.mean()) if values.mean() else float("inf")
+        summary["ci_95"][key] = {
+            "mean": round(float(values.mean()), 2),
+            "low": round(float(values.mean() - half_width), 2),
+            "high": round(float(values.mean() + half_width), 2),
+            "relative_width": round(relative_width, 4)
+        }
+        summary["converged"] = summary["converged"] and relative_width <= CI_TARGET_RELATIVE_WIDTH
+    return summary, kept
+
+def sample_sites_adaptively(pool, projects, profiles=LIGHTHOUSE_PROFILES):
+    """
+    按轮次为每个 (项目, 节流配置, 状态) 追加一次运行，直到置信区间足够窄或达到运行次数上限。
+    每轮内原始/优化版本的先后顺序交替，让机器负载与温度漂移平均地落在两种状态上。
+    返回 ({(项目, 节流配置, 状态): [运行结果]}, {(项目, 节流配置, 状态): 停止原因})。
+    """
+    results, stopping = {}, {}
+    round_index = 0
+    while True:
+        pending = []
+        for project, profile in ((p, t) for p in projects for t in profiles):
+            states = [("before", project["url_original"]), ("after", project["url_optimized"])]
+            if round_index % 2 == 1:
+                states.reverse()
+            for state, url in states:
+                key = (project["name"], profile, state)
+                if key in stopping:
+                    continue
+                attempts = results.setdefault(key, [])
+                successful = [r["metrics"] for r in attempts if r["metrics"]]
+                if len(attempts) >= LIGHTHOUSE_MIN_RUNS and sampling_summary(successful)[0]["converged"]:
+                    stopping[key] = "converged"
+                    continue
+                if len(attempts) >= LIGHTHOUSE_MAX_RUNS:
+                    stopping[key] = "max_runs" if successful else "failed"
+                    continue
+                label = f"{project['name']} {profile} {state} 运行 {len(attempts)+1}"
+                pending.append((key, pool.submit(url, label, project["temp_dir"], profile)))
+        if not pending:
+            return results, stopping
+        for key, future in pending:
+            results[key].append(future.result())
+        round_index += 1
+
+def summarize_profile(project_name, profile, run_groups, sampling, stopping):
+    """
+    汇总一个项目在一个节流配置下的采样结果与碳排放；原始或优化版本没有成功运行时返回 None。
+    """
+    result = {}
+    for state in ("before", "after"):
+        key = (project_name, profile, state)
+        runs = run_groups.get(key)
+        if not runs:
+            return None
+        # 均值只使用剔除离群运行后的结果，raw_runs 保留全部成功运行
+        summary, kept = sampling[key]
+        summary["stopping_reason"] = stopping.get(key)
+        result[state] = {"raw_runs": runs, "averaged_metrics": average_run_metrics(kept), "sampling": summary}
+    before_carbon, after_carbon = compute_custom_emissions([
+        result["before"]["averaged_metrics"].get("total_byte_weight_bytes", 0),
+        result["after"]["averaged_metrics"].get("total_byte_weight_bytes", 0)
+    ])
+    result["before"]["carbon_g"] = before_carbon
+    result["after"]["carbon_g"] = after_carbon
+    result["carbon_reduced_g"] = before_carbon - after_carbon
+    result["carbon_reduced_percent"] = round(result["carbon_reduced_g"] / before_carbon * 100, 2) if before_carbon > 0 else 0
+    return result
+
+def calibrate_parallel_variance(pool, url, temp_dir, num_runs):
+    """
+    同一 URL 先单独串行运行 num_runs 次，再占满所有 worker 并发运行 num_runs 次，比较两组的变异系数，
+    衡量并发本身给测量带来的额外波动。
+    """
+    print(f"\n并发方差校准: {url}（串行 {num_runs} 次 vs 并发 {num_runs} 次）")
+    sequential = [pool.submit(url, f"校准串行 {i+1}", temp_dir).result() for i in range(num_runs)]
+    parallel_futures = [pool.submit(url, f"校准并发 {i+1}", temp_dir) for i in range(num_runs)]
+    parallel = [f.result() for f in parallel_futures]
+    sequential_runs = [r["metrics"] for r in sequential if r["metrics"]]
+    parallel_runs = [r["metrics"] for r in parallel if r["metrics"]]
+    sequential_cv = summarize_run_variance({"sequential": sequential_runs})
+    parallel_cv = summarize_run_variance({"parallel": parallel_runs})
+    result = {"url": url, "runs_per_mode": num_runs, "sequential_cv": sequential_cv, "parallel_cv": parallel_cv}
+    for mode, runs in (("sequential", sequential_runs), ("parallel", parallel_runs)):
+        result[f"{mode}_mean"] = {k: round(mean(m[k] for m in runs), 2) for k in VARIANCE_METRICS} if runs else None
+    result["cv_added_by_parallelism"] = {
+        k: round(parallel_cv[k] - sequential_cv[k], 4) if parallel_cv[k] is not None and sequential_cv[k] is not None else None
+        for k in VARIANCE_METRICS
+    }
+    return result
+
+def profile_report(profile, result):
+    """单个节流配置在项目报告中的内容：前后平均指标、采样情况、碳排放与各时间指标的变化。"""
+    before_avg = result["before"]["averaged_metrics"]
+    after_avg = result["after"]["averaged_metrics"]
+    return {
+        "description": THROTTLING_PROFILES[profile]["description"],
+        "settings": lighthouse_settings(profile),
+        "lighthouse_metrics_before_average": before_avg,
+        "lighthouse_metrics_after_average": after_avg,
+        "sampling_before": result["before"]["sampling"],
+        "sampling_after": result["after"]["sampling"],
+        "carbon_before_g": round(result["before"]["carbon_g"], 4),
+        "carbon_after_g": round(result["after"]["carbon_g"], 4),
+        "carbon_reduction_g": round(result["carbon_reduced_g"], 4),
+        "carbon_reduction_percent": result["carbon_reduced_percent"],
+        # 负值表示优化后更快
+        "timing_change_ms": {key: round(after_avg.get(key, 0) - before_avg.get(key, 0), 2) for key in TIMING_METRICS}
+    }
 
 def extract_lighthouse_metrics(report):
     if not report:
@@ -297,7 +654,7 @@ def extract_lighthouse_metrics(report):
             print("    提取指标时发现缺失值，Lighthouse 报告可能不完整。")
             return None
 
-        return {
+        metrics = {
             "total_byte_weight_bytes": total_byte_weight,
             "first_contentful_paint_ms": fcp,
             "largest_contentful_paint_ms": lcp,
@@ -305,6 +662,9 @@ def extract_lighthouse_metrics(report):
             "loading_time_ms": speed_index,
             "performance_score": perf_score * 100
         }
+        # network-requests 中每个请求的传输大小按资源类型汇总为 resource_bytes_* 指标
+        metrics.update(resource_breakdown(report))
+        return metrics
     except Exception as e:
         print(f"错误: 提取 Lighthouse 数据失败: {e}")
         return None
@@ -362,45 +722,111 @@ def main_full_report():
     print(f"发现 {len(project_names)} 个项目: {project_names}")
     all_sites_before_data_for_csv = []
     all_sites_after_data_for_csv = []
-    server_thread = start_local_server(str(PROJECT_ROOT_DIR))
-    if not server_thread:
+    resource_type_rows_for_csv = []
+    profile_rows_for_csv = []
+    # 主配置下每个站点的 (项目, 优化前字节, 优化后字节)，最后一次性计算碳排放的不确定性区间
+    sites_for_uncertainty = []
+    server = start_local_server(str(PROJECT_ROOT_DIR))
+    if not server:
         print("启动本地服务器失败。正在退出。")
         return
 
+    projects = []
+    for current_project_name in project_names:
+        project_original_site_path = os.path.join(WEBSITES_ORIGINAL_DIR, current_project_name)
+        project_optimized_site_path = os.path.join(FINAL_OPTIMIZED_WEBSITES_BASE_DIR, current_project_name)
+
+        relative_original_url_path = os.path.join(os.path.basename(Path(WEBSITES_ORIGINAL_DIR)), current_project_name, "index.html").replace(os.sep, '/')
+        relative_optimized_url_path = os.path.join(os.path.basename(Path(FULL_OPTI_DIR)), "websites_optimized", current_project_name, "index.html").replace(os.sep, '/')
+
+        project_temp_output_dir = os.path.join(TEMP_PROJECT_DATA_BASE_DIR, current_project_name)
+        os.makedirs(project_temp_output_dir, exist_ok=True)
+
+        if not (check_directory_exists(project_original_site_path, f"项目 '{current_project_name}' 的原始网站目录", critical=False) and
+                check_file_exists(os.path.join(project_original_site_path, "index.html"), f"项目 '{current_project_name}' 的原始 index.html", critical=False) and
+                check_directory_exists(project_optimized_site_path, f"项目 '{current_project_name}' 的优化后网站目录", critical=False) and
+                check_file_exists(os.path.join(project_optimized_site_path, "index.html"), f"项目 '{current_project_name}' 的优化后 index.html", critical=False)):
+            continue
+        projects.append({
+            "name": current_project_name,
+            "url_original": f"{server.base_url}/{relative_original_url_path}",
+            "url_optimized": f"{server.base_url}/{relative_optimized_url_path}",
+            "temp_dir": project_temp_output_dir
+        })
+
+    num_workers = lighthouse_worker_count()
+    pool = LighthousePool(num_workers, TEMP_PROJECT_DATA_BASE_DIR)
+    print(f"Lighthouse 并发 worker 数: {num_workers}（CPU 预算 {LIGHTHOUSE_CPU_BUDGET} 核）")
+    run_groups = {}
+    variance_report = {"workers": num_workers, "min_runs": LIGHTHOUSE_MIN_RUNS, "max_runs": LIGHTHOUSE_MAX_RUNS,
+                       "backend": LIGHTHOUSE_BACKEND, "profiles": LIGHTHOUSE_PROFILES}
+    # 每次执行记为结果库中的一个 run，原始运行与碳排放估算都追加写入
+    results_store = ResultsStore()
+    run_id = results_store.start_run("full", {
+        "projects": [p["name"] for p in projects], "profiles": LIGHTHOUSE_PROFILES, "workers": num_workers, "backend": LIGHTHOUSE_BACKEND,
+        "min_runs": LIGHTHOUSE_MIN_RUNS, "max_runs": LIGHTHOUSE_MAX_RUNS, "ci_relative_width": CI_TARGET_RELATIVE_WIDTH
+    })
+    print(f"结果库 run: {run_id}（{results_store.db_path}）")
+
     try:
-        for current_project_name in project_names:
+        if LIGHTHOUSE_CALIBRATION_RUNS > 0 and projects and num_workers > 1:
+            variance_report["calibration"] = calibrate_parallel_variance(
+                pool, projects[0]["url_original"], projects[0]["temp_dir"], LIGHTHOUSE_CALIBRATION_RUNS)
+
+        sampled, stopping = sample_sites_adaptively(pool, projects)
+        all_results = []
+        sampling = {}
+        for key, results in sampled.items():
+            run_groups[key] = [r["metrics"] for r in results if r["metrics"]]
+            all_results.extend(results)
+            # 均值只使用剔除离群运行后的结果，结果库中保留全部运行（包括失败的）并标记是否被采用
+            sampling[key] = sampling_summary(run_groups[key])
+            kept = sampling[key][1]
+            results_store.record_lighthouse_runs(run_id, key[0], "full", key[2], [
+                {**r, "kept": any(r["metrics"] is m for m in kept)} for r in results], profile=key[1])
+        concurrency_levels = [r["concurrency"] for r in all_results]
+        variance_report["mean_concurrency"] = round(mean(concurrency_levels), 2) if concurrency_levels else 0
+        for backend in ("warm", "cli"):
+            seconds = [r["seconds"] for r in all_results if r["backend"] == backend]
+            variance_report[f"{backend}_runs"] = len(seconds)
+            variance_report[f"{backend}_mean_run_seconds"] = round(mean(seconds), 3) if seconds else None
+        variance_report["within_site_cv"] = summarize_run_variance(run_groups)
+
+        for project in projects:
+            current_project_name = project["name"]
+            url_original = project["url_original"]
+            url_optimized = project["url_optimized"]
+            project_temp_output_dir = project["temp_dir"]
             print(f"\n正在处理项目: {current_project_name}...")
-            project_original_site_path = os.path.join(WEBSITES_ORIGINAL_DIR, current_project_name)
-            project_optimized_site_path = os.path.join(FINAL_OPTIMIZED_WEBSITES_BASE_DIR, current_project_name)
-
-            relative_original_url_path = os.path.join(os.path.basename(Path(WEBSITES_ORIGINAL_DIR)), current_project_name, "index.html").replace(os.sep, '/')
-            relative_optimized_url_path = os.path.join(os.path.basename(Path(FULL_OPTI_DIR)), "websites_optimized", current_project_name, "index.html").replace(os.sep, '/')
-
-            url_original = f"http://localhost:{LOCAL_SERVER_PORT}/{relative_original_url_path}"
-            url_optimized = f"http://localhost:{LOCAL_SERVER_PORT}/{relative_optimized_url_path}"
-            project_temp_output_dir = os.path.join(TEMP_PROJECT_DATA_BASE_DIR, current_project_name)
-            os.makedirs(project_temp_output_dir, exist_ok=True)
-
-            if not (check_directory_exists(project_original_site_path, f"项目 '{current_project_name}' 的原始网站目录", critical=False) and
-                    check_file_exists(os.path.join(project_original_site_path, "index.html"), f"项目 '{current_project_name}' 的原始 index.html", critical=False) and
-                    check_directory_exists(project_optimized_site_path, f"项目 '{current_project_name}' 的优化后网站目录", critical=False) and
-                    check_file_exists(os.path.join(project_optimized_site_path, "index.html"), f"项目 '{current_project_name}' 的优化后 index.html", critical=False)):
-                continue
-
             print(f"  原始网站 URL: {url_original}")
             print(f"  优化后网站 URL: {url_optimized}")
 
-            print(f"  正在运行 Lighthouse 针对 '{current_project_name}' 的原始版本...")
-            lh_result_before = run_lighthouse_multiple_times(url_original, temp_dir=project_temp_output_dir)
-            if not lh_result_before or not lh_result_before.get("averaged_metrics"):
-                print(f"  因 Lighthouse 在原始网站上运行失败，跳过项目 {current_project_name}。")
+            profile_results = {}
+            for profile in LIGHTHOUSE_PROFILES:
+                result = summarize_profile(current_project_name, profile, run_groups, sampling, stopping)
+                if result is None:
+                    print(f"  因 Lighthouse 在 {profile} 配置下运行失败，该配置不计入项目 {current_project_name}。")
+                    continue
+                profile_results[profile] = result
+                for state, url in (("before", url_original), ("after", url_optimized)):
+                    results_store.record_carbon(run_id, current_project_name, "full", state, url,
+                                                result[state]["averaged_metrics"].get("total_byte_weight_bytes", 0),
+                                                result[state]["carbon_g"], profile=profile)
+                print(f"  {profile} 采样: 原始版本 {result['before']['sampling']['runs']} 次"
+                      f"（{result['before']['sampling']['stopping_reason']}），优化版本 {result['after']['sampling']['runs']} 次"
+                      f"（{result['after']['sampling']['stopping_reason']}）")
+            if PRIMARY_PROFILE not in profile_results:
+                print(f"  因 Lighthouse 在主配置 {PRIMARY_PROFILE} 下运行失败，跳过项目 {current_project_name}。")
                 continue
 
-            print(f"  正在运行 Lighthouse 针对 '{current_project_name}' 的优化版本...")
-            lh_result_after = run_lighthouse_multiple_times(url_optimized, temp_dir=project_temp_output_dir)
-            if not lh_result_after or not lh_result_after.get("averaged_metrics"):
-                print(f"  因 Lighthouse 在优化后网站上运行失败，跳过项目 {current_project_name}。")
-                continue
+            # 单个项目的 CSV 与汇总报告的主体使用主配置的结果，其他配置的结果在 profiles 中
+            primary = profile_results[PRIMARY_PROFILE]
+            runs_before = primary["before"]["raw_runs"]
+            runs_after = primary["after"]["raw_runs"]
+            sampling_before = primary["before"]["sampling"]
+            sampling_after = primary["after"]["sampling"]
+            lh_result_before = {"raw_runs": runs_before, "averaged_metrics": primary["before"]["averaged_metrics"]}
+            lh_result_after = {"raw_runs": runs_after, "averaged_metrics": primary["after"]["averaged_metrics"]}
 
             csv_before_path = os.path.join(project_temp_output_dir, "lighthouse_metrics_before.csv")
             save_per_project_lighthouse_csv(lh_result_before, csv_before_path, "Original")
@@ -409,19 +835,20 @@ def main_full_report():
 
             avg_metrics_before = lh_result_before["averaged_metrics"]
             avg_metrics_after = lh_result_after["averaged_metrics"]
-            before_total_bytes = avg_metrics_before.get("total_byte_weight_bytes", 0)
-            after_total_bytes = avg_metrics_after.get("total_byte_weight_bytes", 0)
-
-            before_custom_carbon = run_custom_emission_script(before_total_bytes)
-            after_custom_carbon = run_custom_emission_script(after_total_bytes)
-
-            carbon_reduced_g = before_custom_carbon - after_custom_carbon
-            carbon_reduced_percent = (
-                round((carbon_reduced_g / before_custom_carbon * 100), 2)
-                if before_custom_carbon > 0 else 0
-            )
+            before_custom_carbon = primary["before"]["carbon_g"]
+            after_custom_carbon = primary["after"]["carbon_g"]
+            carbon_reduced_g = primary["carbon_reduced_g"]
+            carbon_reduced_percent = primary["carbon_reduced_percent"]
             carbon_reduced_str = f"{round(carbon_reduced_g, 2)} ({carbon_reduced_percent}%)"
 
+            carbon_by_resource_type = attribute_carbon(avg_metrics_before, avg_metrics_after)
+            for bucket, values in carbon_by_resource_type.items():
+                resource_type_rows_for_csv.append([
+                    current_project_name, bucket, values["pipeline_stage"] or "",
+                    values["before_bytes"], values["after_bytes"],
+                    values["before_g"], values["after_g"], values["reduction_g"]
+                ])
+
             project_detail_report = {
                 "project_name": current_project_name,
                 "timestamp": time.strftime("%Y-%m-%d %H:%M:%S", time.localtime()),
@@ -430,14 +857,22 @@ def main_full_report():
                 "lighthouse_metrics_before_average": avg_metrics_before,
                 "lighthouse_metrics_after_all_runs": lh_result_after["raw_runs"],
                 "lighthouse_metrics_after_average": avg_metrics_after,
+                "sampling_before": sampling_before,
+                "sampling_after": sampling_after,
                 "carbon_estimates_before_g": {
                     "custom": round(before_custom_carbon, 4) if before_custom_carbon else None
                 },
                 "carbon_estimates_after_g": {
                     "custom": round(after_custom_carbon, 4) if after_custom_carbon else None
                 },
+                # 每次运行单独估算，便于观察碳排放随测量波动的范围
+                "carbon_per_run_before_g": np.round(carbon_emissions([m["total_byte_weight_bytes"] for m in runs_before]), 4).tolist(),
+                "carbon_per_run_after_g": np.round(carbon_emissions([m["total_byte_weight_bytes"] for m in runs_after]), 4).tolist(),
+                "carbon_by_resource_type": carbon_by_resource_type,
                 "carbon_reduction_g_avg": round(carbon_reduced_g, 4),
-                "carbon_reduction_percent": carbon_reduced_percent
+                "carbon_reduction_percent": carbon_reduced_percent,
+                "primary_profile": PRIMARY_PROFILE,
+                "profiles": {profile: profile_report(profile, result) for profile, result in profile_results.items()}
             }
             project_detail_report_path = os.path.join(project_temp_output_dir, "carbon_report_local_deps.json")
             with open(project_detail_report_path, "w", encoding="utf-8") as f:
@@ -465,9 +900,27 @@ def main_full_report():
                 round(after_custom_carbon, 4) if after_custom_carbon else 0,
                 carbon_reduced_str
             ])
+            sites_for_uncertainty.append((current_project_name, avg_metrics_before.get("total_byte_weight_bytes", 0),
+                                          avg_metrics_after.get("total_byte_weight_bytes", 0)))
+            for profile, result in profile_results.items():
+                before_avg = result["before"]["averaged_metrics"]
+                after_avg = result["after"]["averaged_metrics"]
+                profile_rows_for_csv.append(
+                    [current_project_name, profile]
+                    + [value for key in PROFILE_CSV_METRICS for value in (before_avg.get(key, 0), after_avg.get(key, 0))]
+                    + [round(result["before"]["carbon_g"], 4), round(result["after"]["carbon_g"], 4),
+                       round(result["carbon_reduced_g"], 4)]
+                )
         print("\n所有项目处理完毕。")
     finally:
-        stop_local_server(server_thread)
+        pool.shutdown()
+        stop_local_server(server)
+        results_store.close()
+
+    variance_report_path = os.path.join(FINAL_AGGREGATED_REPORTS_DIR, "lighthouse_parallel_variance.json")
+    with open(variance_report_path, "w", encoding="utf-8") as f:
+        json.dump(variance_report, f, indent=4, ensure_ascii=False)
+    print(f"并发测量方差报告已保存到: {variance_report_path}")
 
     csv_header_before = [
         "Site Name", "Site Path", "Total Byte Size (bytes)", "First Contentful Paint (ms)",
@@ -495,6 +948,42 @@ def main_full_report():
         writer.writerows(all_sites_after_data_for_csv)
     print(f"汇总的优化后报告已保存到: {csv_after_aggregated_path}")
 
+    # 按资源类型拆分的字节与数据传输碳排放，用于判断哪个优化阶段带来了减排
+    csv_resource_type_path = os.path.join(FINAL_AGGREGATED_REPORTS_DIR, "carbon_report_by_resource_type.csv")
+    with open(csv_resource_type_path, 'w', newline='', encoding='utf-8') as csvfile:
+        writer = csv.writer(csvfile)
+        writer.writerow([
+            "Site Name", "Resource Type", "Pipeline Stage", "Bytes Before", "Bytes After",
+            "Transfer CO2 Before (g)", "Transfer CO2 After (g)", "Transfer CO2 Reduced (g)"
+        ])
+        writer.writerows(resource_type_rows_for_csv)
+    print(f"按资源类型的碳排放报告已保存到: {csv_resource_type_path}")
+
+    # 每个节流配置下的时间指标与碳排放，用于判断图片、JS 等节省在哪种网络与设备条件下真正影响加载时间
+    csv_profile_path = os.path.join(FINAL_AGGREGATED_REPORTS_DIR, "carbon_report_by_profile.csv")
+    with open(csv_profile_path, 'w', newline='', encoding='utf-8') as csvfile:
+        writer = csv.writer(csvfile)
+        writer.writerow(
+            ["Site Name", "Profile"]
+            + [f"{label} {state}" for label in PROFILE_CSV_METRICS.values() for state in ("Before", "After")]
+            + ["CO2 Before (g)", "CO2 After (g)", "CO2 Reduced (g)"]
+        )
+        writer.writerows(profile_rows_for_csv)
+    print(f"按节流配置的报告已保存到: {csv_profile_path}")
+
+    # 碳排放参数的蒙特卡洛区间：所有站点、优化前后在一次广播计算中完成
+    if sites_for_uncertainty:
+        started = time.perf_counter()
+        names, before_bytes, after_bytes = zip(*sites_for_uncertainty)
+        bands = carbon_bands(before_bytes, after_bytes)
+        csv_uncertainty_path = os.path.join(FINAL_AGGREGATED_REPORTS_DIR, "carbon_report_uncertainty.csv")
+        with open(csv_uncertainty_path, 'w', newline='', encoding='utf-8') as csvfile:
+            writer = csv.writer(csvfile)
+            writer.writerow(["Site Name", "Bytes Before", "Bytes After"] + band_header())
+            for i, name in enumerate(names):
+                writer.writerow([name, before_bytes[i], after_bytes[i]] + band_columns(bands, i))
+        print(f"碳排放不确定性区间（{MC_SAMPLES} 次抽样，用时 {time.perf_counter() - started:.3f} 秒）已保存到: {csv_uncertainty_path}")
+
     print("\n完整碳排放报告流程结束。")
 
 if __name__ == "__main__":
@@ -1,82 +1,449 @@
 import torch
+import torch.nn.functional as F
 from compressai.zoo import bmshj2018_factorized
 from PIL import Image
 import numpy as np
 import os
+import sys
+import csv
+import time
+from collections import defaultdict
+from functools import lru_cache
 from pathlib import Path
 import argparse
+import io
 
-def compress_image(image_path, output_dir, format="webp", quality=50):
-    device = torch.device("cuda" if torch.cuda.is_available() else "cpu")
-    model = bmshj2018_factorized(quality=3, pretrained=True).eval().to(device)
-    
+# utils/ holds the shared NumPy quality metrics and memory helpers
+sys.path.append(str(Path(__file__).resolve().parent / "utils"))
+from image_quality import psnr, ms_ssim, rgb_to_luma, downscale_luma
+from mem_usage import peak_rss_bytes, bytes_to_mb, PeakRSSSampler
+
+MODEL_QUALITY = 3
+# bmshj2018 downsamples 4 times, inputs are padded to a multiple of this before coding
+PAD_MULTIPLE = 64
+# Images above this pixel count are coded in overlapping tiles instead of one tensor
+MAX_FULL_PIXELS = 1024 * 1024
+TILE_SIZE = 512
+TILE_OVERLAP = 32
+# Maximum number of same-size images pushed through the model at once
+BATCH_SIZE = 4
+
+# Rate-distortion sweep defaults (see --sweep)
+SWEEP_CAI_QUALITIES = (1, 3, 5)
+SWEEP_FINAL_FORMATS = ("webp", "avif")
+SWEEP_FINAL_QUALITIES = (40, 50, 60, 70, 80)
+SWEEP_MIN_MS_SSIM = 0.95
+SWEEP_MIN_PSNR = 30.0
+# MS-SSIM is computed on luma downscaled to this longest side
+SWEEP_METRIC_MAX_SIDE = 1024
+
+def get_device():
+    return torch.device("cuda" if torch.cuda.is_available() else "cpu")
+
+@lru_cache(maxsize=None)
+def get_model(quality=MODEL_QUALITY, device_type=None):
+    # 每个进程、每个质量等级只加载一次预训练权重
+    device = torch.device(device_type) if device_type else get_device()
+    return bmshj2018_factorized(quality=quality, pretrained=True).eval().to(device)
+
+def to_tensor(img_array, device):
+    # HxWx3 uint8 -> 1x3xHxW float in [0, 1]
+    return torch.from_numpy(img_array).permute(2, 0, 1).float().div_(255.0).unsqueeze(0).to(device)
+
+def to_uint8(x_hat):
+    # 3xHxW float in [0, 1] -> HxWx3 uint8
+    return (torch.clamp(x_hat, 0, 1) * 255.0).round().byte().permute(1, 2, 0).cpu().numpy()
+
+def run_codec(model, x):
+    """Compress and decompress a NxCxHxW batch, returning the cropped reconstruction and bytes per image."""
+    height, width = x.shape[-2:]
+    pad_h = (PAD_MULTIPLE - height % PAD_MULTIPLE) % PAD_MULTIPLE
+    pad_w = (PAD_MULTIPLE - width % PAD_MULTIPLE) % PAD_MULTIPLE
+    if pad_h or pad_w:
+        x = F.pad(x, (0, pad_w, 0, pad_h), mode="replicate")
+
+    with torch.no_grad():
+        # 压缩并解码
+        compressed = model.compress(x)
+        decompressed = model.decompress(compressed["strings"], compressed["shape"])
+
+    x_hat = decompressed["x_hat"][..., :height, :width]
+    num_bytes = [sum(len(strings[i]) for strings in compressed["strings"]) for i in range(x.shape[0])]
+    return x_hat, num_bytes
+
+def tile_starts(length, tile, overlap):
+    if length <= tile:
+        return [0]
+    step = tile - overlap
+    starts = list(range(0, length - tile, step))
+    starts.append(length - tile)
+    return starts
+
+def blend_window(height, width, overlap):
+    # Linear ramp towards tile edges so overlapping tiles fade into each other
+    def ramp(n):
+        idx = torch.arange(n, dtype=torch.float32)
+        edge = torch.minimum(idx + 1, n - idx)
+        return torch.clamp(edge / max(overlap, 1), max=1.0)
+    return ramp(height)[:, None] * ramp(width)[None, :]
+
+def run_codec_tiled(model, img_array, device, tile=TILE_SIZE, overlap=TILE_OVERLAP):
+    """Code an oversized image tile by tile and blend the overlapping seams.
+
+    Source and output stay uint8 (3 bytes/pixel); the float blend buffers only
+    cover one band of tile rows, so extra memory does not grow with image height.
+    """
+    height, width = img_array.shape[:2]
+    output = np.empty((height, width, 3), dtype=np.uint8)
+    band_top = 0
+    band_accum = torch.zeros(3, 0, width)
+    band_weight = torch.zeros(0, width)
+    total_bytes = 0
+
+    row_starts = tile_starts(height, tile, overlap)
+    for i, y0 in enumerate(row_starts):
+        y1 = min(y0 + tile, height)
+        grow = y1 - (band_top + band_weight.shape[0])
+        if grow > 0:
+            band_accum = torch.cat([band_accum, torch.zeros(3, grow, width)], dim=1)
+            band_weight = torch.cat([band_weight, torch.zeros(grow, width)], dim=0)
+
+        for x0 in tile_starts(width, tile, overlap):
+            x1 = min(x0 + tile, width)
+            tile_tensor = to_tensor(np.ascontiguousarray(img_array[y0:y1, x0:x1]), device)
+            x_hat, num_bytes = run_codec(model, tile_tensor)
+            window = blend_window(y1 - y0, x1 - x0, overlap)
+            band_accum[:, y0 - band_top:y1 - band_top, x0:x1] += x_hat[0].cpu() * window
+            band_weight[y0 - band_top:y1 - band_top, x0:x1] += window
+            total_bytes += num_bytes[0]
+
+        # Rows above the next tile row are complete: write them out and drop them from the band
+        done = (row_starts[i + 1] if i + 1 < len(row_starts) else height) - band_top
+        output[band_top:band_top + done] = to_uint8(band_accum[:, :done] / band_weight[:done])
+        band_accum = band_accum[:, done:].clone()
+        band_weight = band_weight[done:].clone()
+        band_top += done
+
+    return output, total_bytes
+
+def load_rgb(image_path):
     # 读取原始图像，转换为 RGB
     try:
-        img = Image.open(image_path).convert("RGB")
+        with Image.open(image_path) as img:
+            # Skip the extra full-size copy when the source is already RGB
+            return np.array(img if img.mode == "RGB" else img.convert("RGB"))
     except Exception as e:
         print(f"Error opening {image_path}: {e}")
         return None
-    
-    img_tensor = torch.from_numpy(np.array(img)).permute(2, 0, 1).float() / 255.0
-    img_tensor = img_tensor.unsqueeze(0).to(device)
-    
-    with torch.no_grad():
-        # 压缩并解码
-        compressed = model.compress(img_tensor)
-        decompressed = model.decompress(compressed["strings"], compressed["shape"])
-    
-    # 处理重建图像
-    decompressed_img = decompressed["x_hat"].squeeze(0).cpu()
-    decompressed_img = torch.clamp(decompressed_img, 0, 1) * 255.0
-    decompressed_img = decompressed_img.byte().permute(1, 2, 0).numpy()
-    
+
+def remove_other_outputs(output_dir, stem, format):
+    # Only one output per stem may exist, otherwise replace_images.py could pick a stale one from an earlier run
+    for other in SWEEP_FINAL_FORMATS:
+        other_path = os.path.join(output_dir, f"{stem}.{other}")
+        if other != format and os.path.exists(other_path):
+            os.remove(other_path)
+
+def save_output(reconstruction, image_path, output_dir, format="webp", quality=50):
     # 生成输出路径，保留原文件名，改为 WebP 格式
     file_name = Path(image_path).stem  # 获取文件名（不含扩展名）
-    output_image_path = os.path.join(output_dir, f"{file_name}.webp")
-    
-    # 保存为 WebP
-    Image.fromarray(decompressed_img).save(output_image_path, "WEBP", quality=quality)
-    
+    output_image_path = os.path.join(output_dir, f"{file_name}.{format}")
+    Image.fromarray(reconstruction).save(output_image_path, format.upper(), quality=quality)
+    remove_other_outputs(output_dir, file_name, format)
     return output_image_path
 
-def compress_all_images(project_name, base_input_dir="images_ai/images_original", base_output_dir="images_ai/images_optimized", quality=50):
+def reconstruct(model, img_array, device):
+    if img_array.shape[0] * img_array.shape[1] > MAX_FULL_PIXELS:
+        return run_codec_tiled(model, img_array, device)
+    x_hat, num_bytes = run_codec(model, to_tensor(img_array, device))
+    return to_uint8(x_hat[0]), num_bytes[0]
+
+def compress_image(image_path, output_dir, format="webp", quality=50):
+    device = get_device()
+    model = get_model(MODEL_QUALITY, device.type)
+
+    img_array = load_rgb(image_path)
+    if img_array is None:
+        return None
+
+    reconstruction, _ = reconstruct(model, img_array, device)
+    return save_output(reconstruction, image_path, output_dir, format=format, quality=quality)
+
+def is_animated(image_path):
+    # Multi-frame GIFs are converted by the media stage; coding them here would keep only the first frame
+    try:
+        with Image.open(image_path) as img:
+            return getattr(img, "n_frames", 1) > 1
+    except Exception:
+        return False
+
+def plan_batches(input_paths, batch_size=BATCH_SIZE):
+    """Group same-size images into batches; oversized images are returned separately for tiling."""
+    by_size = defaultdict(list)
+    oversized = []
+    for path in input_paths:
+        try:
+            with Image.open(path) as img:
+                width, height = img.size  # header only, no pixel decode
+        except Exception as e:
+            print(f"Error opening {path}: {e}")
+            continue
+        if width * height > MAX_FULL_PIXELS:
+            oversized.append(path)
+        else:
+            by_size[(width, height)].append(path)
+
+    batches = []
+    for paths in by_size.values():
+        for i in range(0, len(paths), batch_size):
+            batches.append(paths[i:i + batch_size])
+    return batches, oversized
+
+def compress_all_images(project_name, base_input_dir="images_ai/images_original", base_output_dir="images_ai/images_optimized", quality=50, batch_size=BATCH_SIZE):
     # Define project-specific input and output directories
     input_dir = os.path.join(base_input_dir, project_name)
     output_dir = os.path.join(base_output_dir, project_name)
-    
+
     # 创建输出文件夹
     if not os.path.exists(output_dir):
         os.makedirs(output_dir)
 
     # 支持的图片格式
     supported_extensions = (".png", ".jpg", ".jpeg", ".gif", ".bmp")
-    
-    # 遍历输入文件夹中的所有文件
-    for file_name in os.listdir(input_dir):
+
+    input_paths = [
+        os.path.join(input_dir, file_name) for file_name in sorted(os.listdir(input_dir))
+        if os.path.isfile(os.path.join(input_dir, file_name)) and file_name.lower().endswith(supported_extensions)
+    ]
+    animated = [path for path in input_paths if path.lower().endswith(".gif") and is_animated(path)]
+    if animated:
+        print(f"Skipping {len(animated)} animated GIF(s), handled by the media stage: {', '.join(map(os.path.basename, animated))}")
+        input_paths = [path for path in input_paths if path not in animated]
+
+    device = get_device()
+    model = get_model(MODEL_QUALITY, device.type)
+    batches, oversized = plan_batches(input_paths, batch_size)
+    print(f"Device: {device}, torch threads: {torch.get_num_threads()}, "
+          f"{len(input_paths)} images in {len(batches)} batches + {len(oversized)} tiled")
+
+    report_rows = []
+    start_time = time.perf_counter()
+
+    def finish(input_path, original, reconstruction, num_bytes, elapsed, peak_rss):
+        output_path = save_output(reconstruction, input_path, output_dir, quality=quality)
+        height, width = original.shape[:2]
+        row = {
+            "file": os.path.basename(input_path),
+            "width": width,
+            "height": height,
+            "bpp": round(num_bytes * 8 / (width * height), 4),
+            "psnr_db": round(psnr(original, reconstruction), 2),
+            "original_kb": round(os.path.getsize(input_path) / 1024, 2),
+            "compressed_kb": round(os.path.getsize(output_path) / 1024, 2),
+            "seconds": round(elapsed, 3),
+            "peak_rss_mb": bytes_to_mb(peak_rss),
+        }
+        report_rows.append(row)
+        print(f"Processing: {input_path}")
+        print(f"Original size: {row['original_kb']:.2f} KB")
+        print(f"Compressed WebP size: {row['compressed_kb']:.2f} KB")
+        print(f"bpp: {row['bpp']}, PSNR: {row['psnr_db']} dB, peak RSS: {row['peak_rss_mb']} MB")
+        print(f"Compressed WebP saved at: {output_path}")
+        print("-" * 50)
+
+    for batch_paths in batches:
+        batch_start = time.perf_counter()
+        # Peak RSS is sampled per batch; images in the same batch share the figure
+        with PeakRSSSampler() as sampler:
+            originals = [load_rgb(path) for path in batch_paths]
+            loaded = [(path, arr) for path, arr in zip(batch_paths, originals) if arr is not None]
+            if not loaded:
+                continue
+            x = torch.cat([to_tensor(arr, device) for _, arr in loaded], dim=0)
+            x_hat, num_bytes = run_codec(model, x)
+        elapsed = (time.perf_counter() - batch_start) / len(loaded)
+        for i, (path, arr) in enumerate(loaded):
+            finish(path, arr, to_uint8(x_hat[i]), num_bytes[i], elapsed, sampler.peak_bytes)
+
+    for path in oversized:
+        tile_start = time.perf_counter()
+        with PeakRSSSampler() as sampler:
+            original = load_rgb(path)
+            if original is None:
+                print(f"Failed to compress: {path}")
+                continue
+            reconstruction, num_bytes = run_codec_tiled(model, original, device)
+        finish(path, original, reconstruction, num_bytes, time.perf_counter() - tile_start, sampler.peak_bytes)
+
+    total_elapsed = time.perf_counter() - start_time
+    images_per_sec = len(report_rows) / total_elapsed if total_elapsed > 0 else 0
+    peak_rss_mb = bytes_to_mb(peak_rss_bytes())
+
+    report_path = os.path.join(output_dir, "compression_report.csv")
+    with open(report_path, "w", newline="", encoding="utf-8") as f:
+        writer = csv.DictWriter(f, fieldnames=["file", "width", "height", "bpp", "psnr_db", "original_kb", "compressed_kb", "seconds", "peak_rss_mb"])
+        writer.writeheader()
+        writer.writerows(report_rows)
+
+    print(f"Compressed {len(report_rows)} images in {total_elapsed:.2f}s ({images_per_sec:.2f} images/sec), peak RSS: {peak_rss_mb} MB")
+    print(f"Per-image report saved at: {report_path}")
+    return report_rows
+
+def avif_supported():
+    try:
+        import pillow_avif  # noqa: F401  registers the AVIF plugin on older Pillow
+    except ImportError:
+        pass
+    Image.init()
+    return "AVIF" in Image.SAVE
+
+def encode_candidate(reconstruction, format, quality):
+    buffer = io.BytesIO()
+    Image.fromarray(reconstruction).save(buffer, format.upper(), quality=quality)
+    data = buffer.getvalue()
+    with Image.open(io.BytesIO(data)) as decoded:
+        decoded_array = np.array(decoded.convert("RGB"))
+    return data, decoded_array
+
+def pareto_frontier(candidates):
+    """Mark candidates that no other candidate beats on bytes and MS-SSIM at the same time."""
+    ordered = sorted(candidates, key=lambda c: (c["bytes"], -c["ms_ssim"]))
+    best_ms_ssim = -1.0
+    for candidate in ordered:
+        candidate["on_frontier"] = candidate["ms_ssim"] > best_ms_ssim
+        if candidate["on_frontier"]:
+            best_ms_ssim = candidate["ms_ssim"]
+    return [c for c in ordered if c["on_frontier"]]
+
+def select_candidate(frontier, min_ms_ssim=SWEEP_MIN_MS_SSIM, min_psnr=SWEEP_MIN_PSNR):
+    """Smallest frontier point within the distortion budget, or the best-quality point if none fits."""
+    feasible = [c for c in frontier if c["ms_ssim"] >= min_ms_ssim and c["psnr_db"] >= min_psnr]
+    if feasible:
+        return min(feasible, key=lambda c: c["bytes"])
+    return max(frontier, key=lambda c: c["ms_ssim"])
+
+def sweep_image(image_path, cai_qualities, final_formats, final_qualities, device):
+    original = load_rgb(image_path)
+    if original is None:
+        return []
+    height, width = original.shape[:2]
+    original_luma = downscale_luma(rgb_to_luma(original), SWEEP_METRIC_MAX_SIDE)
+
+    candidates = []
+    for cai_quality in cai_qualities:
+        model = get_model(cai_quality, device.type)
+        reconstruction, latent_bytes = reconstruct(model, original, device)
+        for format in final_formats:
+            for final_quality in final_qualities:
+                data, decoded = encode_candidate(reconstruction, format, final_quality)
+                candidates.append({
+                    "file": os.path.basename(image_path),
+                    "cai_quality": cai_quality,
+                    "format": format,
+                    "final_quality": final_quality,
+                    "bytes": len(data),
+                    "bpp": round(len(data) * 8 / (width * height), 4),
+                    "latent_bpp": round(latent_bytes * 8 / (width * height), 4),
+                    "psnr_db": round(psnr(original, decoded), 2),
+                    "ms_ssim": round(ms_ssim(original_luma, downscale_luma(rgb_to_luma(decoded), SWEEP_METRIC_MAX_SIDE)), 4),
+                    "data": data,
+                })
+    return candidates
+
+def sweep_all_images(project_name, base_input_dir="images_ai/images_original", base_output_dir="images_ai/images_optimized",
+                     cai_qualities=SWEEP_CAI_QUALITIES, final_formats=SWEEP_FINAL_FORMATS, final_qualities=SWEEP_FINAL_QUALITIES,
+                     min_ms_ssim=SWEEP_MIN_MS_SSIM, min_psnr=SWEEP_MIN_PSNR):
+    input_dir = os.path.join(base_input_dir, project_name)
+    output_dir = os.path.join(base_output_dir, project_name)
+    os.makedirs(output_dir, exist_ok=True)
+
+    final_formats = list(final_formats)
+    if "avif" in final_formats and not avif_supported():
+        print("AVIF encoder not available in this Pillow build, skipping AVIF candidates.")
+        final_formats.remove("avif")
+
+    supported_extensions = (".png", ".jpg", ".jpeg", ".gif", ".bmp")
+    device = get_device()
+    frontier_rows = []
+    total_original = 0
+    total_selected = 0
+    start_time = time.perf_counter()
+
+    for file_name in sorted(os.listdir(input_dir)):
         input_path = os.path.join(input_dir, file_name)
-        if os.path.isfile(input_path) and file_name.lower().endswith(supported_extensions):
-            print(f"Processing: {input_path}")
-            output_path = compress_image(input_path, output_dir, format="webp", quality=quality)
-            if output_path:
-                original_size = os.path.getsize(input_path) / 1024
-                compressed_size = os.path.getsize(output_path) / 1024
-                print(f"Original size: {original_size:.2f} KB")
-                print(f"Compressed WebP size: {compressed_size:.2f} KB")
-                print(f"Compressed WebP saved at: {output_path}")
-            else:
-                print(f"Failed to compress: {input_path}")
-            print("-" * 50)
+        if not (os.path.isfile(input_path) and file_name.lower().endswith(supported_extensions)):
+            continue
+        if file_name.lower().endswith(".gif") and is_animated(input_path):
+            print(f"Skipping animated GIF (handled by the media stage): {input_path}")
+            continue
+        print(f"Sweeping: {input_path}")
+        candidates = sweep_image(input_path, cai_qualities, final_formats, final_qualities, device)
+        if not candidates:
+            print(f"Failed to compress: {input_path}")
+            continue
+
+        frontier = pareto_frontier(candidates)
+        selected = select_candidate(frontier, min_ms_ssim, min_psnr)
+        output_path = os.path.join(output_dir, f"{Path(input_path).stem}.{selected['format']}")
+        with open(output_path, "wb") as f:
+            f.write(selected["data"])
+        remove_other_outputs(output_dir, Path(input_path).stem, selected["format"])
+
+        original_size = os.path.getsize(input_path)
+        total_original += original_size
+        total_selected += selected["bytes"]
+        print(f"Selected CompressAI q={selected['cai_quality']} + {selected['format']} q={selected['final_quality']}: "
+              f"{original_size / 1024:.2f} KB -> {selected['bytes'] / 1024:.2f} KB, "
+              f"PSNR {selected['psnr_db']} dB, MS-SSIM {selected['ms_ssim']} ({len(frontier)} frontier points)")
+        print("-" * 50)
+
+        for candidate in frontier:
+            row = {k: v for k, v in candidate.items() if k not in ("data", "on_frontier")}
+            row["original_bytes"] = original_size
+            row["selected"] = candidate is selected
+            frontier_rows.append(row)
+
+    frontier_path = os.path.join(output_dir, "rd_frontier.csv")
+    with open(frontier_path, "w", newline="", encoding="utf-8") as f:
+        writer = csv.DictWriter(f, fieldnames=["file", "cai_quality", "format", "final_quality", "bytes", "original_bytes",
+                                               "bpp", "latent_bpp", "psnr_db", "ms_ssim", "selected"])
+        writer.writeheader()
+        writer.writerows(frontier_rows)
+
+    elapsed = time.perf_counter() - start_time
+    saved = total_original - total_selected
+    print(f"Sweep finished in {elapsed:.2f}s, selected outputs save {saved / 1024:.2f} KB "
+          f"({(saved / total_original * 100) if total_original else 0:.2f}%) under MS-SSIM >= {min_ms_ssim}, PSNR >= {min_psnr} dB")
+    print(f"Rate-distortion frontier saved at: {frontier_path}")
+    return frontier_rows
+
+def parse_int_list(value):
+    return tuple(int(v) for v in value.split(",") if v.strip())
 
 if __name__ == "__main__":
     # Set up argument parser for command-line input
     parser = argparse.ArgumentParser(description="Compress images from a project folder.")
     parser.add_argument("project_name", help="Name of the project folder (e.g., 'grilli')")
+    parser.add_argument("--threads", type=int, default=None, help="Torch intra-op threads when running on CPU")
+    parser.add_argument("--batch-size", type=int, default=BATCH_SIZE, help="Maximum number of same-size images per batch")
+    parser.add_argument("--sweep", action="store_true", help="Sweep CompressAI and final encoder qualities and keep the Pareto-optimal output per image")
+    parser.add_argument("--cai-qualities", type=parse_int_list, default=SWEEP_CAI_QUALITIES, help="CompressAI quality levels to sweep, e.g. 1,3,5")
+    parser.add_argument("--final-formats", default=",".join(SWEEP_FINAL_FORMATS), help="Final encoders to sweep, e.g. webp,avif")
+    parser.add_argument("--final-qualities", type=parse_int_list, default=SWEEP_FINAL_QUALITIES, help="Final encoder qualities to sweep, e.g. 40,60,80")
+    parser.add_argument("--min-ms-ssim", type=float, default=SWEEP_MIN_MS_SSIM, help="Distortion budget: minimum MS-SSIM of the selected output")
+    parser.add_argument("--min-psnr", type=float, default=SWEEP_MIN_PSNR, help="Distortion budget: minimum PSNR (dB) of the selected output")
     args = parser.parse_args()
 
+    if args.threads and get_device().type == "cpu":
+        torch.set_num_threads(args.threads)
+
     # Define input directory based on project name
     input_dir = os.path.join("images_ai/images_original", args.project_name)
-    
+
     if not os.path.exists(input_dir) or not os.listdir(input_dir):
         print(f"Please place images in the '{input_dir}' folder.")
+    elif args.sweep:
+        sweep_all_images(args.project_name, cai_qualities=args.cai_qualities,
+                         final_formats=[f.strip().lower() for f in args.final_formats.split(",") if f.strip()],
+                         final_qualities=args.final_qualities, min_ms_ssim=args.min_ms_ssim, min_psnr=args.min_psnr)
     else:
-        compress_all_images(args.project_name, quality=50)
\ No newline at end of file
+        compress_all_images(args.project_name, quality=50, batch_size=args.batch_size)
@@ -0,0 +1,94 @@
+import os
+import sys
+import csv
+import json
+import time
+import argparse
+from pathlib import Path
+
+import numpy as np
+
+# 动态添加 paths.py 所在目录到 sys.path
+PATHS_DIR = Path("C:/Users/user/Desktop/web_carbon/utils")
+sys.path.append(str(PATHS_DIR))
+
+from paths import WEBSITES_ORIGINAL_DIR, FULL_OPTI_DIR, FULL_CARBON_DIR
+from page_weight import PageWeightEstimator, DEFAULT_VIEWPORT_WIDTH, DEFAULT_DEVICE_PIXEL_RATIO
+from carbon_model import carbon_emissions
+from static_server import SUPPORTED_ENCODINGS
+
+# --- 配置区域 ---
+# 不启动浏览器的页面重量估算，用于在运行 Lighthouse 之前快速比较优化方案
+OPTIMIZED_WEBSITES_DIR = os.path.join(FULL_OPTI_DIR, "websites_optimized")
+OUTPUT_CSV = os.path.join(FULL_CARBON_DIR, "page_weight_estimates.csv")
+OUTPUT_JSON = os.path.join(FULL_CARBON_DIR, "page_weight_estimates.json")
+RESOURCE_TYPE_COLUMNS = ["document", "stylesheet", "script", "font", "image", "media", "other"]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="不启动浏览器，静态估算网站单次加载的传输字节数与碳排放")
+    parser.add_argument("projects", nargs="*", help="项目名称，默认估算 websites_original 下的全部项目")
+    parser.add_argument("--site-dir", action="append", default=[],
+                        help="额外估算的站点目录（例如某个优化方案的输出），可多次指定")
+    parser.add_argument("--viewport", type=int, default=DEFAULT_VIEWPORT_WIDTH, help="视口宽度（CSS 像素）")
+    parser.add_argument("--dpr", type=float, default=DEFAULT_DEVICE_PIXEL_RATIO, help="设备像素比")
+    parser.add_argument("--compression", choices=["none", "gzip", "br"], default="gzip", help="文本资源的传输编码")
+    parser.add_argument("--include-lazy", action="store_true", help="把 loading=lazy 的图片也计入首屏加载")
+    args = parser.parse_args()
+
+    compression = None if args.compression == "none" else args.compression
+    if compression and compression not in SUPPORTED_ENCODINGS:
+        print("错误：brotli 库未安装，无法按 br 编码估算。请运行 'pip install brotli'，或使用 --compression gzip")
+        sys.exit(1)
+    estimator_options = {"viewport_width": args.viewport, "dpr": args.dpr, "compression": compression,
+                         "include_lazy": args.include_lazy}
+
+    projects = args.projects or sorted(d for d in os.listdir(WEBSITES_ORIGINAL_DIR)
+                                       if os.path.isdir(os.path.join(WEBSITES_ORIGINAL_DIR, d)))
+    sites = []
+    for project in projects:
+        sites.append((project, "original", os.path.join(WEBSITES_ORIGINAL_DIR, project)))
+        sites.append((project, "optimized", os.path.join(OPTIMIZED_WEBSITES_DIR, project)))
+    for site_dir in args.site_dir:
+        sites.append((os.path.basename(os.path.normpath(site_dir)), "variant", site_dir))
+
+    rows = []
+    for project, state, site_dir in sites:
+        index_path = os.path.join(site_dir, "index.html")
+        if not os.path.isfile(index_path):
+            print(f"跳过 {project} ({state})：'{index_path}' 不存在")
+            continue
+        started = time.perf_counter()
+        estimate = PageWeightEstimator(site_dir, **estimator_options).estimate(index_path)
+        elapsed = time.perf_counter() - started
+        rows.append({"project": project, "state": state, "site_dir": site_dir, "seconds": round(elapsed, 3), **estimate})
+        print(f"{project} ({state}): {estimate['total_bytes']} 字节，{estimate['requests']} 个请求，"
+              f"远程资源 {len(estimate['remote'])} 个未计入，用时 {elapsed:.3f} 秒")
+
+    if not rows:
+        print("没有可估算的站点。")
+        return
+
+    # 所有站点的碳排放一次性计算
+    carbons = carbon_emissions(np.array([row["total_bytes"] for row in rows], dtype=np.float64))
+    for row, carbon in zip(rows, carbons):
+        row["carbon_g"] = round(float(carbon), 6)
+
+    os.makedirs(FULL_CARBON_DIR, exist_ok=True)
+    with open(OUTPUT_CSV, "w", newline="", encoding="utf-8") as f:
+        writer = csv.writer(f)
+        writer.writerow(["Site Name", "State", "Estimated Bytes", "Requests", "CO2 - Custom (g)"]
+                        + [f"{kind} (bytes)" for kind in RESOURCE_TYPE_COLUMNS]
+                        + ["Remote Resources", "Missing Resources", "Seconds"])
+        for row in rows:
+            writer.writerow([row["project"], row["state"], row["total_bytes"], row["requests"], row["carbon_g"]]
+                            + [row["by_type"].get(kind, {}).get("bytes", 0) for kind in RESOURCE_TYPE_COLUMNS]
+                            + [len(row["remote"]), len(row["missing"]), row["seconds"]])
+    with open(OUTPUT_JSON, "w", encoding="utf-8") as f:
+        json.dump({"options": {"viewport": args.viewport, "dpr": args.dpr, "compression": args.compression,
+                               "include_lazy": args.include_lazy}, "sites": rows}, f, indent=4, ensure_ascii=False)
+    print(f"\n估算结果已保存到 {OUTPUT_CSV} 与 {OUTPUT_JSON}")
+
+
+if __name__ == "__main__":
+    main()
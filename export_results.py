@@ -0,0 +1,47 @@
+import sys
+import argparse
+from pathlib import Path
+
+# 动态添加 paths.py 所在目录到 sys.path
+PATHS_DIR = Path("C:/Users/user/Desktop/web_carbon/utils")
+sys.path.append(str(PATHS_DIR))
+
+from paths import FULL_CARBON_DIR
+from results_store import ResultsStore, RESULTS_DB
+from throttling_profiles import THROTTLING_PROFILES, DEFAULT_PROFILE
+
+
+def main():
+    parser = argparse.ArgumentParser(description="从测量结果库重新生成汇总 CSV / xlsx")
+    parser.add_argument("--list", action="store_true", help="只列出库中的 run")
+    parser.add_argument("--run-id", help="汇总指定的 run，默认为最近一次完整报告")
+    parser.add_argument("--variant", default="full", help="full（完整优化）或单项任务名（html/css/js/image）")
+    parser.add_argument("--profile", default=DEFAULT_PROFILE, choices=list(THROTTLING_PROFILES),
+                        help="汇总哪个节流配置下的测量结果")
+    parser.add_argument("--out-dir", default=str(FULL_CARBON_DIR), help="输出目录")
+    parser.add_argument("--db", default=RESULTS_DB, help="结果库文件")
+    args = parser.parse_args()
+
+    with ResultsStore(args.db) as store:
+        runs = store.runs()
+        if not runs:
+            print(f"{args.db} 中还没有记录。")
+            return
+        if args.list:
+            for run in runs:
+                print(f"{run['run_id']}  {run['kind']:<6} {run['started_at']}  git {(run['git_commit'] or '-')[:12]}"
+                      f"{' (dirty)' if run['git_dirty'] else ''}  node {run['node_version'] or '-'}"
+                      f"  lighthouse {run['lighthouse_version'] or '-'}")
+            return
+        run_id = args.run_id or store.latest_run_id("full" if args.variant == "full" else "action")
+        if run_id is None:
+            print("没有可汇总的 run。")
+            return
+        written = store.export_summary(args.out_dir, run_id, args.variant, args.profile)
+        print(f"已从 run {run_id}（{args.profile}）重新生成:")
+        for path in written:
+            print(f"  {path}")
+
+
+if __name__ == "__main__":
+    main()
@@ -12,6 +12,7 @@ sys.path.append(str(PATHS_DIR))
 
 # 导入 paths 模块中的路径变量
 from paths import WEBSITES_ORIGINAL_DIR, IMAGE_OPTI_DIR, API_BASE_URL, API_KEY
+from image_index import ImageIndex
 
 # API_BASE_URL = "https://api.chatanywhere.org/v1"  # 请替换为实际有效的 API 端点
 # API_KEY = os.getenv("OPENAI_API_KEY")
@@ -157,16 +158,32 @@ def main():
         return
 
     all_suggestions = {}
+    # 跨站点图片索引：内容完全相同的图片直接复用已有的 LLM 建议
+    image_index = ImageIndex()
+    reused_suggestions = 0
 
     for image_file in image_files:
         image_path = os.path.join(SOURCE_IMAGES_DIR, image_file)
         try:
+            content_sha, _ = image_index.add(image_path)
             with Image.open(image_path) as img:
+                # Image.open 只读取文件头，这里顺带记录下游优化需要的元数据，避免 image_optimize 重复探测
                 width, height = img.size
                 img_format = img.format
+                has_alpha = img.mode in ("RGBA", "LA", "PA") or "transparency" in img.info
+                file_size = os.path.getsize(image_path)
                 print(f"\n处理图片: {image_file} (格式: {img_format}, 尺寸: {width}x{height})")
                 
-                suggestion = get_image_optimization_suggestion(image_path, img_format, width, height)
+                suggestion = image_index.get_suggestion(content_sha, LLM_MODEL)
+                if suggestion:
+                    print(f"[Index] 复用内容相同图片的优化建议 (sha256: {content_sha[:12]})")
+                    call_status = "reused from image index"
+                    reused_suggestions += 1
+                else:
+                    suggestion = get_image_optimization_suggestion(image_path, img_format, width, height)
+                    call_status = "success"
+                    if suggestion:
+                        image_index.set_suggestion(content_sha, LLM_MODEL, suggestion)
                 if suggestion:
                     formatted_suggestion = {
                         "project_name": PROJECT_NAME,
@@ -174,8 +191,11 @@ def main():
                         "original_format": img_format,
                         "original_width": width,
                         "original_height": height,
+                        "original_has_alpha": has_alpha,
+                        "original_size_bytes": file_size,
+                        "content_hash": content_sha,
                         "llm_api_call_details": {
-                            "status": "success",
+                            "status": call_status,
                             "request_payload_summary": {
                                 "model": LLM_MODEL,
                                 "image_filename_in_prompt": image_file,
@@ -194,6 +214,9 @@ def main():
                         "original_format": img_format,
                         "original_width": width,
                         "original_height": height,
+                        "original_has_alpha": has_alpha,
+                        "original_size_bytes": file_size,
+                        "content_hash": content_sha,
                         "llm_api_call_details": {
                             "status": "api http error",
                             "request_payload_summary": {
@@ -214,6 +237,9 @@ def main():
             print(f"处理图片 {image_file} 时发生错误: {e}")
             all_suggestions[image_file] = {"error": f"处理时发生未知错误: {e}"}
 
+    image_index.save()
+    print(f"\n共 {len(image_files)} 张图片，其中 {reused_suggestions} 张复用了图片索引中的建议")
+
     print("\n\n--- 所有图片的优化建议汇总 ---")
     print(json.dumps(all_suggestions, indent=4, ensure_ascii=False))
 
@@ -2,6 +2,10 @@ import os
 import json
 import sys
 import csv
+import time
+import shutil
+from contextlib import contextmanager
+import numpy as np
 from wand.image import Image
 from wand.resource import limits
 from wand.color import Color # Import Color for explicit transparent background
@@ -13,10 +17,37 @@ sys.path.append(str(PATHS_DIR))
 
 # 导入 paths 模块中的路径变量
 from paths import IMAGE_OPTI_DIR
+from image_pool import plan_pool_size, run_image_pool
+from image_quality import DEFAULT_MAX_SIDE, QUALITY_METRICS, rgb_to_luma, quality_score
+from image_index import ImageIndex, params_key, store_output, find_cached_output
+from mem_usage import PeakRSSSampler, bytes_to_mb
 
 
 # 限制 ImageMagick 内存使用
-limits['memory'] = 1024 * 1024 * 1024  # 1GB
+WORKER_MEMORY_BYTES = 1024 * 1024 * 1024  # 1GB，每个 worker 的 ImageMagick 内存上限
+limits['memory'] = WORKER_MEMORY_BYTES
+
+# 并行优化配置（可通过环境变量覆盖）
+MAX_WORKERS = int(os.getenv("IMAGE_OPT_WORKERS", "0")) or None  # 未设置时按 CPU 核数
+MEMORY_BUDGET_BYTES = int(os.getenv("IMAGE_OPT_MEMORY_BUDGET_MB", "4096")) * 1024 * 1024  # 所有 worker 合计的内存预算
+PER_IMAGE_TIMEOUT = int(os.getenv("IMAGE_OPT_TIMEOUT", "180"))  # 单张图片超时（秒）
+
+# 感知质量搜索配置：设置 IMAGE_QUALITY_METRIC=ssim 或 psnr 后，对有损格式按图片二分搜索满足目标的最低编码质量，
+# 未设置时沿用 LLM 给出的 quality
+QUALITY_SEARCH_METRIC = os.getenv("IMAGE_QUALITY_METRIC", "").lower()
+if QUALITY_SEARCH_METRIC and QUALITY_SEARCH_METRIC not in QUALITY_METRICS:
+    # 在启动进程池之前检查，否则每个 worker 都会在 quality_score 中失败
+    print(f"错误：不支持的 IMAGE_QUALITY_METRIC '{QUALITY_SEARCH_METRIC}'，可选: {', '.join(QUALITY_METRICS)}")
+    sys.exit(1)
+QUALITY_SEARCH_TARGET = float(os.getenv("IMAGE_QUALITY_TARGET", "38" if QUALITY_SEARCH_METRIC == "psnr" else "0.95"))
+QUALITY_SEARCH_MIN = 30
+QUALITY_SEARCH_MAX = 95
+LOSSY_FORMATS = ("webp", "avif", "jpeg", "jpg")
+
+# 大图处理：像素数超过阈值时收紧 ImageMagick 的内存/映射上限，
+# 超出部分的像素缓存落到磁盘按块读写，单张大图的峰值内存不再随图片尺寸增长
+LARGE_IMAGE_PIXELS = int(os.getenv("IMAGE_OPT_LARGE_PIXELS", str(16 * 1000 * 1000)))
+LARGE_IMAGE_MEMORY_BYTES = int(os.getenv("IMAGE_OPT_LARGE_MEMORY_MB", "256")) * 1024 * 1024
 
 # --- 配置区域 ---
 if len(sys.argv) < 2:
@@ -34,53 +65,159 @@ REPORT_FILE = os.path.join(IMAGE_OPTI_DIR, "optimization_report", PROJECT_NAME,
 CSV_REPORT_FILE = os.path.join(IMAGE_OPTI_DIR, "optimization_report", PROJECT_NAME, "optimization_summary.csv")
 
 # --- 优化函数 ---
+def wand_luma(img, max_side=DEFAULT_MAX_SIDE):
+    """
+    将 Wand 图像降采样后导出为亮度数组，用于质量评估。
+    """
+    with img.clone() as small:
+        if max(small.width, small.height) > max_side:
+            small.transform(resize=f"{max_side}x{max_side}>")
+        pixels = small.export_pixels(channel_map='RGB', storage='char')
+        rgb = np.asarray(pixels, dtype=np.uint8).reshape(small.height, small.width, 3)
+    return rgb_to_luma(rgb)
+
+def search_encoder_quality(img, metric, target, q_min=QUALITY_SEARCH_MIN, q_max=QUALITY_SEARCH_MAX):
+    """
+    在 [q_min, q_max] 区间二分搜索编码质量，返回满足目标分数的最小输出。
+    img 需已完成缩放和格式设置；返回 (blob, quality, score, iterations, target_met)。
+    """
+    reference = wand_luma(img)
+    encoded = {}
+
+    def encode_and_score(q):
+        if q not in encoded:
+            img.quality = q
+            img.compression_quality = q
+            blob = img.make_blob()
+            with Image(blob=blob) as candidate:
+                score = quality_score(metric, reference, wand_luma(candidate))
+            encoded[q] = (blob, score)
+            print(f"    调试: 质量搜索 quality={q}, {metric}={score:.4f}, 大小={len(blob)} 字节")
+        return encoded[q]
+
+    lo, hi = q_min, q_max
+    best = None
+    while lo <= hi:
+        mid = (lo + hi) // 2
+        blob, score = encode_and_score(mid)
+        if score >= target:
+            if best is None or len(blob) <= len(best[0]):
+                best = (blob, mid, score)
+            hi = mid - 1
+        else:
+            lo = mid + 1
+
+    if best is None:
+        # 最高质量仍未达到目标，退回最高质量的输出
+        blob, score = encode_and_score(q_max)
+        return blob, q_max, score, len(encoded), False
+    return best[0], best[1], best[2], len(encoded), True
+
+@contextmanager
+def large_image_limits(enabled):
+    """
+    大图处理期间临时收紧 ImageMagick 资源上限，结束后恢复 worker 原有设置。
+    """
+    if not enabled:
+        yield
+        return
+    saved = {name: limits[name] for name in ("memory", "map")}
+    limits['memory'] = LARGE_IMAGE_MEMORY_BYTES
+    limits['map'] = LARGE_IMAGE_MEMORY_BYTES * 2
+    try:
+        yield
+    finally:
+        for name, value in saved.items():
+            limits[name] = value
+
+def open_source_image(image_path, large_image, resize):
+    """
+    打开原图。大图缩小为 JPEG 源时设置 jpeg:size，让解码器直接按 DCT 缩放解码，不生成全尺寸像素。
+    """
+    if not large_image:
+        return Image(filename=image_path)
+    img = Image()
+    if resize and "width" in resize and "height" in resize and image_path.lower().endswith((".jpg", ".jpeg")):
+        img.options['jpeg:size'] = f"{int(resize['width'])}x{int(resize['height'])}"
+    img.read(filename=image_path)
+    return img
+
+def init_worker(memory_limit):
+    """
+    进程池 worker 初始化：限制每个进程的 ImageMagick 内存，并关闭其内部多线程，避免与进程池争抢 CPU。
+    """
+    limits['memory'] = memory_limit
+    limits['thread'] = 1
+
 def optimize_image(image_path, suggestion):
     """
-    根据 LLM 建议优化图片。
+    根据 LLM 建议优化图片，并记录处理该图片期间 worker 的峰值常驻内存。
+    """
+    with PeakRSSSampler() as sampler:
+        result = optimize_image_bounded(image_path, suggestion)
+    result["peak_rss_mb"] = bytes_to_mb(sampler.peak_bytes)
+    print(f"    调试: 峰值内存 {result['peak_rss_mb']} MB")
+    return result
+
+def optimize_image_bounded(image_path, suggestion):
+    """
+    优化单张图片；超过 LARGE_IMAGE_PIXELS 的大图在受限内存下处理。
     """
     print(f"调试: 开始优化图片 {image_path}")
     try:
         if not os.path.exists(image_path):
             raise FileNotFoundError(f"原始图片文件不存在: {image_path}")
 
-        # 获取原始图片信息
-        original_has_alpha = False
-        with Image(filename=image_path) as img_check:
-            original_size = os.path.getsize(image_path)
-            original_format = img_check.format.lower()
-            original_width = img_check.width
-            original_height = img_check.height
-            original_has_alpha = img_check.alpha_channel # <<< Detect original alpha
-
         llm_suggestion = suggestion.get("llm_suggestion", {})
         if not llm_suggestion:
             raise ValueError("LLM 建议为空，无法优化")
 
-        recommended_format = llm_suggestion.get("recommended_format", original_format).lower()
         params = llm_suggestion.get("parameters", {})
         quality = params.get("quality", 75)
         lossless = params.get("lossless", False)
         resize = params.get("resize", {})
         advanced_options = params.get("advanced_options", {})
 
-        print(f"    应用 LLM 建议: format={recommended_format}, quality={quality}, lossless={lossless}, resize={resize}, advanced_options={advanced_options}, original_has_alpha={original_has_alpha}")
-
         filename = os.path.basename(image_path)
         base_name, _ = os.path.splitext(filename)
-        # Ensure output filename uses the *recommended_format* extension
-        output_filename = f"{base_name}.{recommended_format}"
-        output_path = os.path.join(RESULT_DIR, output_filename)
-
-        if os.path.exists(output_path):
-            try:
-                os.remove(output_path)
-                print(f"    清理旧优化文件: {output_path}")
-            except Exception as e:
-                print(f"    警告: 无法删除旧文件 {output_path}: {e}")
 
         os.makedirs(RESULT_DIR, exist_ok=True)
 
-        with Image(filename=image_path) as img:
+        # 大图判定只读取文件头，不解码像素
+        source_width = suggestion.get("original_width")
+        source_height = suggestion.get("original_height")
+        if not (source_width and source_height):
+            with Image.ping(filename=image_path) as probe:
+                source_width, source_height = probe.width, probe.height
+        large_image = source_width * source_height > LARGE_IMAGE_PIXELS
+        if large_image:
+            print(f"    调试: 大图 {source_width}x{source_height}，ImageMagick 内存上限 {bytes_to_mb(LARGE_IMAGE_MEMORY_BYTES)} MB，超出部分使用磁盘像素缓存")
+
+        # 只解码一次：元数据优先复用建议文件中已记录的值，缺失时再从已解码的图像读取
+        with large_image_limits(large_image), open_source_image(image_path, large_image, resize) as img:
+            original_size = suggestion.get("original_size_bytes") or os.path.getsize(image_path)
+            original_format = (suggestion.get("original_format") or img.format).lower()
+            original_width = source_width
+            original_height = source_height
+            original_has_alpha = suggestion.get("original_has_alpha")
+            if original_has_alpha is None:
+                original_has_alpha = bool(img.alpha_channel) # <<< Detect original alpha
+
+            recommended_format = llm_suggestion.get("recommended_format", original_format).lower()
+
+            print(f"    应用 LLM 建议: format={recommended_format}, quality={quality}, lossless={lossless}, resize={resize}, advanced_options={advanced_options}, original_has_alpha={original_has_alpha}")
+
+            # Ensure output filename uses the *recommended_format* extension
+            output_filename = f"{base_name}.{recommended_format}"
+            output_path = os.path.join(RESULT_DIR, output_filename)
+
+            if os.path.exists(output_path):
+                try:
+                    os.remove(output_path)
+                    print(f"    清理旧优化文件: {output_path}")
+                except Exception as e:
+                    print(f"    警告: 无法删除旧文件 {output_path}: {e}")
+
             # If original image has transparency, set background to transparent
             # This is important before operations like resize.
             if original_has_alpha:
@@ -147,19 +284,36 @@ def optimize_image(image_path, suggestion):
                 # which is default for PNG structure but compression level still matters.
 
             img.strip()  # Remove metadata
-            img.save(filename=output_path)
-
-        optimized_size = os.path.getsize(output_path)
-
-        with Image(filename=output_path) as optimized_img:
-            expected_width = resize.get("width", original_width)
-            expected_height = resize.get("height", original_height)
-            # Convert to int for comparison if they come from JSON as strings
-            if (optimized_img.width, optimized_img.height) != (int(expected_width), int(expected_height)):
-                print(f"    警告：优化后图片尺寸从 {expected_width}x{expected_height} 变为 {optimized_img.width}x{optimized_img.height}")
-                # os.remove(output_path) # Decide if this is a critical failure
-                # For now, let's report it but not fail the optimization entirely for this reason
-                # return { ... failure status ... }
+            # 在内存中编码，输出尺寸从编码结果的头部读取（ping 不解码像素），无需重新读取输出文件
+            quality_search = None
+            if QUALITY_SEARCH_METRIC and recommended_format in LOSSY_FORMATS and not lossless:
+                encoded_blob, quality, achieved_score, iterations, target_met = search_encoder_quality(
+                    img, QUALITY_SEARCH_METRIC, QUALITY_SEARCH_TARGET)
+                quality_search = {
+                    "metric": QUALITY_SEARCH_METRIC,
+                    "target": QUALITY_SEARCH_TARGET,
+                    "achieved_score": round(achieved_score, 4),
+                    "iterations": iterations,
+                    "target_met": target_met
+                }
+                print(f"    调试: 质量搜索完成 quality={quality}, {QUALITY_SEARCH_METRIC}={achieved_score:.4f}, 迭代 {iterations} 次")
+            else:
+                encoded_blob = img.make_blob()
+        with Image.ping(blob=encoded_blob) as encoded:
+            encoded_width, encoded_height = encoded.width, encoded.height
+
+        with open(output_path, "wb") as f_out:
+            f_out.write(encoded_blob)
+        optimized_size = len(encoded_blob)
+
+        expected_width = resize.get("width", original_width)
+        expected_height = resize.get("height", original_height)
+        # Convert to int for comparison if they come from JSON as strings
+        if (encoded_width, encoded_height) != (int(expected_width), int(expected_height)):
+            print(f"    警告：优化后图片尺寸从 {expected_width}x{expected_height} 变为 {encoded_width}x{encoded_height}")
+            # os.remove(output_path) # Decide if this is a critical failure
+            # For now, let's report it but not fail the optimization entirely for this reason
+            # return { ... failure status ... }
 
         size_reduction = original_size - optimized_size
         size_reduction_percent = (size_reduction / original_size * 100) if original_size > 0 else 0
@@ -176,7 +330,12 @@ def optimize_image(image_path, suggestion):
             "final_quality": quality,
             "lossless": lossless,
             "advanced_options": advanced_options,
-            "original_had_alpha": original_has_alpha # Add this for reporting
+            "original_had_alpha": original_has_alpha, # Add this for reporting
+            "original_format": original_format,
+            "original_width": original_width,
+            "original_height": original_height,
+            "quality_search": quality_search,
+            "large_image_mode": large_image
         }
 
     except FileNotFoundError as e:
@@ -211,6 +370,33 @@ def optimize_image(image_path, suggestion):
             "error": str(e)
         }
 
+def reuse_optimized_output(image_path, cached_path, meta):
+    """
+    复制内容相同图片已有的优化结果，生成与 optimize_image 相同结构的结果。
+    """
+    base_name, _ = os.path.splitext(os.path.basename(image_path))
+    extension = os.path.splitext(cached_path)[1]
+    output_path = os.path.join(RESULT_DIR, f"{base_name}{extension}")
+    os.makedirs(RESULT_DIR, exist_ok=True)
+    shutil.copy2(cached_path, output_path)
+
+    original_size = os.path.getsize(image_path)
+    optimized_size = os.path.getsize(output_path)
+    size_reduction = original_size - optimized_size
+    result = dict(meta)
+    result.update({
+        "status": "success",
+        "original_size_bytes": original_size,
+        "optimized_size_bytes": optimized_size,
+        "size_reduction_bytes": size_reduction,
+        "size_reduction_percent": round((size_reduction / original_size * 100) if original_size > 0 else 0, 2),
+        "optimized_format": extension.lstrip(".").lower(),
+        "optimized_path": output_path,
+        "deduplicated_from": cached_path,
+        "peak_rss_mb": None  # 未重新编码，不记录内存峰值
+    })
+    return result
+
 # --- 主逻辑 ---
 def main():
     """
@@ -252,20 +438,86 @@ def main():
     total_optimized_size = 0
     successful_optimizations = 0
 
+    # 先收集待处理的图片，再统一分发到进程池
+    pool_tasks = []
+    skipped_images = set()
     for image_file, suggestion_data in suggestions.items(): # Renamed 'suggestion' to 'suggestion_data'
-        print(f"调试: 处理图片 {image_file}")
         image_path = os.path.join(SOURCE_IMAGES_DIR, image_file)
         if not os.path.exists(image_path):
             print(f"    跳过：图片文件 '{image_path}' 不存在")
+            skipped_images.add(image_file)
+            continue
+        # Pass suggestion_data which contains the "llm_suggestion" dict
+        pool_tasks.append((image_file, (image_path, suggestion_data)))
+
+    # 内容相同且优化参数相同的图片只编码一次：命中共享缓存的直接复制，本次重复出现的等首个完成后复制
+    image_index = ImageIndex()
+    quality_config = {"metric": QUALITY_SEARCH_METRIC, "target": QUALITY_SEARCH_TARGET} if QUALITY_SEARCH_METRIC else None
+    dedup_keys = {}
+    first_by_key = {}
+    duplicate_of = {}
+    cached_outputs = {}
+    unique_tasks = []
+    for image_file, (image_path, suggestion_data) in pool_tasks:
+        llm_sugg = suggestion_data.get("llm_suggestion", {})
+        content_sha = suggestion_data.get("content_hash") or image_index.hash_file(image_path)
+        dedup_key = (content_sha, params_key(llm_sugg, quality_config))
+        dedup_keys[image_file] = dedup_key
+        extension = str(llm_sugg.get("recommended_format", "")).lower()
+        cached_path, cached_meta = find_cached_output(*dedup_key, extension) if extension else (None, None)
+        if cached_path:
+            cached_outputs[image_file] = (image_path, cached_path, cached_meta)
+        elif dedup_key in first_by_key:
+            duplicate_of[image_file] = first_by_key[dedup_key]
+        else:
+            first_by_key[dedup_key] = image_file
+            unique_tasks.append((image_file, (image_path, suggestion_data)))
+    print(f"调试: 待优化图片 {len(pool_tasks)} 张，需编码 {len(unique_tasks)} 张，"
+          f"复用缓存 {len(cached_outputs)} 张，本次重复 {len(duplicate_of)} 张")
+
+    num_workers = plan_pool_size(MEMORY_BUDGET_BYTES, WORKER_MEMORY_BYTES, MAX_WORKERS)
+    pool_start_time = time.perf_counter()
+    pool_results, pool_errors = run_image_pool(
+        unique_tasks, optimize_image, num_workers,
+        timeout=PER_IMAGE_TIMEOUT,
+        initializer=init_worker, initargs=(WORKER_MEMORY_BYTES,)
+    )
+
+    for image_file, result in pool_results.items():
+        if result.get("status") == "success":
+            meta = {k: v for k, v in result.items() if k not in ("optimized_path", "status")}
+            store_output(*dedup_keys[image_file], result["optimized_path"], meta)
+    for image_file, (image_path, cached_path, cached_meta) in cached_outputs.items():
+        pool_results[image_file] = reuse_optimized_output(image_path, cached_path, cached_meta)
+    for image_file, source_file in duplicate_of.items():
+        source_result = pool_results.get(source_file)
+        if source_result and source_result.get("status") == "success":
+            image_path = os.path.join(SOURCE_IMAGES_DIR, image_file)
+            pool_results[image_file] = reuse_optimized_output(image_path, source_result["optimized_path"], source_result)
+        elif source_file in pool_errors:
+            pool_errors[image_file] = pool_errors[source_file]
+        elif source_result:
+            pool_results[image_file] = source_result
+    pool_elapsed = time.perf_counter() - pool_start_time
+
+    # 按建议文件中的顺序汇总结果
+    for image_file, suggestion_data in suggestions.items():
+        if image_file in skipped_images:
             optimization_report[image_file] = {
                 "status": "skipped",
                 "error": "原始图片文件不存在"
             }
             continue
 
-        print(f"\n正在优化图片: {image_file}")
-        # Pass suggestion_data which contains the "llm_suggestion" dict
-        result = optimize_image(image_path, suggestion_data)
+        image_path = os.path.join(SOURCE_IMAGES_DIR, image_file)
+        result = pool_results.get(image_file)
+        if result is None:
+            result = {
+                "status": "failed",
+                "original_size_bytes": os.path.getsize(image_path) if os.path.exists(image_path) else 0,
+                "optimized_size_bytes": 0,
+                "error": pool_errors.get(image_file, "未知错误")
+            }
 
 
         # Populate report with details from suggestion_data for original info
@@ -289,7 +541,11 @@ def main():
             "error": result.get("error", ""),
             "final_quality": result.get("final_quality", llm_sugg_info.get("parameters", {}).get("quality")),
             "lossless": result.get("lossless", llm_sugg_info.get("parameters", {}).get("lossless")),
-            "advanced_options": result.get("advanced_options", llm_sugg_info.get("parameters", {}).get("advanced_options"))
+            "advanced_options": result.get("advanced_options", llm_sugg_info.get("parameters", {}).get("advanced_options")),
+            "quality_search": result.get("quality_search"),
+            "deduplicated_from": result.get("deduplicated_from", ""),
+            "large_image_mode": result.get("large_image_mode", False),
+            "peak_rss_mb": result.get("peak_rss_mb")
         }
 
         if result["status"] == "success":
@@ -315,7 +571,14 @@ def main():
         "total_original_size_bytes_of_successful": total_original_size, # Corresponds to successfully optimized images
         "total_optimized_size_bytes_of_successful": total_optimized_size, # Corresponds to successfully optimized images
         "total_size_reduction_bytes_on_successful": total_size_reduction,
-        "total_size_reduction_percent_on_successful": round(total_size_reduction_percent, 2)
+        "total_size_reduction_percent_on_successful": round(total_size_reduction_percent, 2),
+        "unique_images_encoded": len(unique_tasks),
+        "deduplicated_images": len(cached_outputs) + len(duplicate_of),
+        "worker_count": num_workers,
+        "elapsed_seconds": round(pool_elapsed, 2),
+        "images_per_second": round(len(pool_tasks) / pool_elapsed, 2) if pool_elapsed > 0 else 0,
+        "max_peak_rss_mb": max((r.get("peak_rss_mb") or 0 for r in pool_results.values()), default=0),
+        "large_images": sum(1 for r in pool_results.values() if r.get("large_image_mode"))
     }
 
     os.makedirs(os.path.dirname(REPORT_FILE), exist_ok=True)
@@ -324,7 +587,7 @@ def main():
     print(f"\n优化报告已保存到 {REPORT_FILE}")
 
     # 生成 CSV 报告
-    csv_data = [["Filename", "Original Format", "Original Dimensions", "Original Had Alpha", "Original Size (Bytes)", "Optimized Format", "Optimized Size (Bytes)", "Size Reduction (Bytes)", "Size Reduction (%)", "Final Quality", "Lossless", "Advanced Options", "Status", "Error"]]
+    csv_data = [["Filename", "Original Format", "Original Dimensions", "Original Had Alpha", "Original Size (Bytes)", "Optimized Format", "Optimized Size (Bytes)", "Size Reduction (Bytes)", "Size Reduction (%)", "Final Quality", "Lossless", "Advanced Options", "Quality Search (metric/score/iterations)", "Peak RSS (MB)", "Status", "Error"]]
     for image_file, data in optimization_report.items():
         if image_file == "summary":
             continue
@@ -339,6 +602,9 @@ def main():
         final_quality_csv = str(data.get("final_quality", "N/A"))
         lossless_csv = str(data.get("lossless", "N/A"))
         advanced_options_csv = ", ".join([f"{k}={v}" for k, v in data.get("advanced_options", {}).items()]) if data.get("advanced_options") else "N/A"
+        quality_search = data.get("quality_search")
+        quality_search_csv = f"{quality_search['metric']}/{quality_search['achieved_score']}/{quality_search['iterations']}" if quality_search else "N/A"
+        peak_rss_csv = str(data.get("peak_rss_mb")) if data.get("peak_rss_mb") is not None else "N/A"
         status_csv = data.get("optimization_status", "N/A")
         error_csv = data.get("error", "")
 
@@ -356,6 +622,8 @@ def main():
             final_quality_csv,
             lossless_csv,
             advanced_options_csv,
+            quality_search_csv,
+            peak_rss_csv,
             status_csv,
             error_csv
         ])
@@ -373,6 +641,9 @@ def main():
     print(f"成功优化图片原始总大小: {summary_data.get('total_original_size_bytes_of_successful', 0)} 字节")
     print(f"成功优化图片优化后总大小: {summary_data.get('total_optimized_size_bytes_of_successful', 0)} 字节")
     print(f"成功优化图片总大小减少: {summary_data.get('total_size_reduction_bytes_on_successful', 0)} 字节 ({summary_data.get('total_size_reduction_percent_on_successful', 0):.2f}%)")
+    print(f"实际编码图片数: {summary_data.get('unique_images_encoded', 0)}，去重复用: {summary_data.get('deduplicated_images', 0)}")
+    print(f"单张图片最大峰值内存: {summary_data.get('max_peak_rss_mb', 0)} MB，大图（受限内存处理）: {summary_data.get('large_images', 0)} 张")
+    print(f"并行 worker 数: {summary_data.get('worker_count', 1)}，耗时: {summary_data.get('elapsed_seconds', 0)} 秒，吞吐量: {summary_data.get('images_per_second', 0)} 张/秒")
 
 
 if __name__ == "__main__":
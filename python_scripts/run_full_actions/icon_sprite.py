@@ -0,0 +1,278 @@
+import os
+import re
+import sys
+import json
+import math
+import urllib.parse
+from pathlib import Path
+from PIL import Image
+
+# 动态添加 paths.py 所在目录到 sys.path
+PATHS_DIR = Path("C:/Users/user/Desktop/web_carbon/utils")
+sys.path.append(str(PATHS_DIR))
+
+# 导入 paths 模块中的路径变量
+from paths import FULL_OPTI_DIR
+from image_refs import split_reference, is_local_reference
+
+# 依赖检查
+try:
+    from bs4 import BeautifulSoup
+except ImportError:
+    print("错误：beautifulsoup4 库未安装。请运行 'pip install beautifulsoup4'")
+    sys.exit(1)
+
+# --- 配置区域 ---
+if len(sys.argv) < 2:
+    print("错误：请提供项目名称作为命令行参数，例如：python icon_sprite.py project_name")
+    sys.exit(1)
+PROJECT_NAME = sys.argv[1]
+
+# 雪碧图阶段在图片替换之后运行，直接处理最终站点目录
+SITE_DIR = FULL_OPTI_DIR / "websites_optimized" / PROJECT_NAME
+REPORT_FILE = os.path.join(FULL_OPTI_DIR / "temp" / PROJECT_NAME / "image" / "optimization_report", "icon_sprite_report.json")
+
+ICON_MAX_PIXELS = int(os.getenv("ICON_MAX_PIXELS", "25000"))  # 图标原始像素数上限（约 158x158，长条形的支付图标也在内）
+ICON_MAX_BYTES = int(os.getenv("ICON_MAX_BYTES", "8192"))     # 单个图标文件大小上限
+SPRITE_MIN_ICONS = int(os.getenv("SPRITE_MIN_ICONS", "2"))    # 少于该数量的图标不值得合并
+SPRITE_FORMAT = os.getenv("SPRITE_FORMAT", "webp").lower()    # webp 或 png
+SPRITE_QUALITY = int(os.getenv("SPRITE_QUALITY", "90"))
+SPRITE_PADDING = 2  # 图标之间留白，避免缩放时相邻图标渗色
+SPRITE_FILENAME = f"icon-sprite.{SPRITE_FORMAT}"
+ICON_EXTENSIONS = (".png", ".webp", ".jpg", ".jpeg", ".gif")
+# 检查图标是否仍被引用的文本文件
+REFERENCE_EXTENSIONS = (".html", ".htm", ".css", ".js", ".mjs", ".json", ".svg", ".xml", ".webmanifest")
+# 显示宽高比与原图相差超过该比例时不是等比缩放，背景图无法还原
+MAX_ASPECT_DEVIATION = 0.02
+
+# --- 辅助函数 ---
+def resolve_local_path(ref, html_path):
+    if not ref or not is_local_reference(ref.strip()):
+        return None
+    path_part = urllib.parse.unquote(split_reference(ref.strip())[0])
+    if path_part.startswith("/"):
+        return os.path.normpath(os.path.join(SITE_DIR, path_part.lstrip("/")))
+    return os.path.normpath(os.path.join(os.path.dirname(html_path), path_part))
+
+def parse_dimension(value):
+    try:
+        return int(float(str(value).replace("px", "").strip()))
+    except (TypeError, ValueError):
+        return None
+
+def slugify(name):
+    return re.sub(r"[^a-z0-9_-]+", "-", name.lower()).strip("-")
+
+def remaining_references(icon_paths):
+    """
+    替换完成后，统计站点文本文件中仍提到每个图标文件名的文件数（CSS、JS、未替换的 <img>/<picture> 等）。
+    只按文件名匹配：不同目录下的同名文件也会算作引用，宁可少报节省也不误报。
+    """
+    names = {path: {os.path.basename(path), urllib.parse.quote(os.path.basename(path))} for path in icon_paths}
+    remaining = {path: 0 for path in icon_paths}
+    for root, _, files in os.walk(SITE_DIR):
+        for name in files:
+            if not name.lower().endswith(REFERENCE_EXTENSIONS):
+                continue
+            with open(os.path.join(root, name), "r", encoding="utf-8", errors="ignore") as f:
+                text = f.read()
+            for path, variants in names.items():
+                if any(variant in text for variant in variants):
+                    remaining[path] += 1
+    return remaining
+
+def icon_info(path, cache):
+    """
+    读取候选图标的尺寸和大小，不符合条件时返回 None。
+    """
+    if path in cache:
+        return cache[path]
+    info = None
+    if path.lower().endswith(ICON_EXTENSIONS) and os.path.isfile(path):
+        size = os.path.getsize(path)
+        try:
+            with Image.open(path) as img:
+                if size <= ICON_MAX_BYTES and img.width * img.height <= ICON_MAX_PIXELS and getattr(img, "n_frames", 1) == 1:
+                    info = {"path": path, "width": img.width, "height": img.height, "bytes": size}
+        except Exception:
+            info = None
+    cache[path] = info
+    return info
+
+def find_icon_uses(html_files):
+    """
+    找出以固定宽高显示的小图标 <img>：必须写明 width/height、没有 srcset、不在 <picture> 中，且为等比缩放。
+    返回 ({html 路径: soup}, [(html 路径, img, 图标信息, 显示宽, 显示高)])。
+    """
+    soups, uses, cache = {}, [], {}
+    for html_path in html_files:
+        with open(html_path, "r", encoding="utf-8") as f:
+            soup = BeautifulSoup(f, "html.parser")
+        soups[html_path] = soup
+        for img in soup.find_all("img", src=True):
+            if img.get("srcset") or img.find_parent("picture") is not None:
+                continue
+            width, height = parse_dimension(img.get("width")), parse_dimension(img.get("height"))
+            if not width or not height:
+                continue
+            info = icon_info(resolve_local_path(img["src"], html_path) or "", cache)
+            if not info:
+                continue
+            aspect = (width / height) / (info["width"] / info["height"])
+            if abs(aspect - 1) > MAX_ASPECT_DEVIATION:
+                continue
+            uses.append((html_path, img, info, width, height))
+    return soups, uses
+
+def shelf_pack(icons):
+    """
+    货架式矩形装箱：按高度降序逐行排放，行宽取总面积的平方根附近，返回 (图集宽, 图集高, {路径: (x, y)})。
+    """
+    ordered = sorted(icons, key=lambda i: (-i["height"], -i["width"]))
+    total_area = sum((i["width"] + SPRITE_PADDING) * (i["height"] + SPRITE_PADDING) for i in ordered)
+    shelf_limit = max(max(i["width"] for i in ordered), int(math.sqrt(total_area) * 1.2))
+    positions = {}
+    x = y = shelf_height = atlas_width = 0
+    for icon in ordered:
+        if x > 0 and x + icon["width"] > shelf_limit:
+            y += shelf_height + SPRITE_PADDING
+            x = shelf_height = 0
+        positions[icon["path"]] = (x, y)
+        atlas_width = max(atlas_width, x + icon["width"])
+        x += icon["width"] + SPRITE_PADDING
+        shelf_height = max(shelf_height, icon["height"])
+    return atlas_width, y + shelf_height, positions
+
+def build_atlas(icons, atlas_path):
+    width, height, positions = shelf_pack(icons)
+    atlas = Image.new("RGBA", (width, height), (0, 0, 0, 0))
+    for icon in icons:
+        with Image.open(icon["path"]) as img:
+            atlas.paste(img.convert("RGBA"), positions[icon["path"]])
+    if SPRITE_FORMAT == "webp":
+        atlas.save(atlas_path, "WEBP", quality=SPRITE_QUALITY, method=6)
+    else:
+        atlas.save(atlas_path, "PNG", optimize=True)
+    return width, height, positions
+
+def css_px(value):
+    return f"{round(value, 2) + 0.0:g}px"
+
+def sprite_rules(classes, atlas_url, atlas_width, atlas_height, positions):
+    """
+    生成雪碧图 CSS：按显示尺寸缩放 background-size 和 background-position。
+    """
+    rules = [f".sprite{{display:inline-block;background:url({atlas_url}) no-repeat;vertical-align:middle}}"]
+    for class_name, (info, width, height) in classes.items():
+        scale = width / info["width"]
+        x, y = positions[info["path"]]
+        rules.append(
+            f".{class_name}{{width:{width}px;height:{height}px;"
+            f"background-position:{css_px(-x * scale)} {css_px(-y * scale)};"
+            f"background-size:{css_px(atlas_width * scale)} {css_px(atlas_height * scale)}}}")
+    return "".join(rules)
+
+# --- 主逻辑 ---
+def main():
+    print(f"调试: 启动图标雪碧图构建，项目: {PROJECT_NAME}")
+    if not os.path.exists(SITE_DIR):
+        print(f"错误：站点目录 '{SITE_DIR}' 不存在，请先完成图片替换阶段。")
+        return
+
+    html_files = [os.path.join(root, name) for root, _, files in os.walk(SITE_DIR)
+                  for name in sorted(files) if name.lower().endswith((".html", ".htm"))]
+    soups, uses = find_icon_uses(html_files)
+    icons = {info["path"]: info for _, _, info, _, _ in uses}
+
+    report = {"icons": [], "summary": {}}
+    if len(icons) < SPRITE_MIN_ICONS:
+        print(f"符合条件的图标只有 {len(icons)} 个（少于 {SPRITE_MIN_ICONS}），不生成雪碧图")
+        report["summary"] = {"status": "skipped", "candidate_icons": len(icons)}
+    else:
+        atlas_dir = os.path.dirname(min(icons, key=len))
+        atlas_path = os.path.join(atlas_dir, SPRITE_FILENAME)
+        atlas_width, atlas_height, positions = build_atlas(list(icons.values()), atlas_path)
+        atlas_bytes = os.path.getsize(atlas_path)
+        print(f"已生成雪碧图: {atlas_path}（{len(icons)} 个图标，{atlas_width}x{atlas_height}，{atlas_bytes} 字节）")
+
+        # 每个页面单独生成内联样式，避免为雪碧图 CSS 再多一次请求
+        style_bytes = 0
+        for html_path, soup in soups.items():
+            page_uses = [u for u in uses if u[0] == html_path]
+            if not page_uses:
+                continue
+            classes = {}
+            sizes_by_icon = {}
+            for _, _, info, width, height in page_uses:
+                sizes_by_icon.setdefault(info["path"], set()).add((width, height))
+            for _, img, info, width, height in page_uses:
+                # 包含相对目录与扩展名，不同目录下同名的图标不会共用一个类名
+                slug = slugify(Path(os.path.relpath(info["path"], SITE_DIR)).as_posix())
+                class_name = f"sprite-{slug}" if len(sizes_by_icon[info["path"]]) == 1 else f"sprite-{slug}-{width}x{height}"
+                classes[class_name] = (info, width, height)
+
+                span = soup.new_tag("span")
+                span["class"] = ["sprite", class_name] + [c for c in img.get("class", []) if c]
+                for attr in ("id", "style", "title"):
+                    if img.get(attr):
+                        span[attr] = img[attr]
+                if img.get("alt"):
+                    span["role"] = "img"
+                    span["aria-label"] = img["alt"]
+                else:
+                    span["aria-hidden"] = "true"
+                img.replace_with(span)
+
+            atlas_url = Path(os.path.relpath(atlas_path, os.path.dirname(html_path))).as_posix()
+            css = sprite_rules(classes, atlas_url, atlas_width, atlas_height, positions)
+            style_tag = soup.new_tag("style")
+            style_tag["id"] = "icon-sprite"
+            style_tag.string = css
+            (soup.head or soup).append(style_tag)
+            style_bytes += len(css.encode("utf-8"))
+            with open(html_path, "w", encoding="utf-8") as f:
+                f.write(str(soup))
+            print(f"已更新 HTML 文件: {html_path}（替换 {len(page_uses)} 个图标）")
+
+        # 只有所有引用都被替换的图标才不再被请求，仍被其他文件引用的图标不计入节省
+        remaining = remaining_references(list(icons))
+        replaced_icons = [info for info in icons.values() if remaining[info["path"]] == 0]
+        icon_bytes = sum(info["bytes"] for info in replaced_icons)
+        for info in icons.values():
+            report["icons"].append({
+                "file": os.path.relpath(info["path"], SITE_DIR),
+                "width": info["width"],
+                "height": info["height"],
+                "bytes": info["bytes"],
+                "position": positions[info["path"]],
+                "uses": sum(1 for u in uses if u[2]["path"] == info["path"]),
+                "files_still_referencing": remaining[info["path"]],
+                "fully_replaced": remaining[info["path"]] == 0
+            })
+        report["summary"] = {
+            "status": "success",
+            "sprite_file": os.path.relpath(atlas_path, SITE_DIR),
+            "sprite_bytes": atlas_bytes,
+            "inline_css_bytes": style_bytes,
+            "icons_packed": len(icons),
+            "icons_fully_replaced": len(replaced_icons),
+            "img_tags_replaced": len(uses),
+            "requests_before": len(replaced_icons),
+            "requests_after": 1,
+            "request_delta": 1 - len(replaced_icons),
+            "bytes_before": icon_bytes,
+            "bytes_after": atlas_bytes + style_bytes,
+            "byte_delta": atlas_bytes + style_bytes - icon_bytes
+        }
+        if len(replaced_icons) < len(icons):
+            print(f"警告：{len(icons) - len(replaced_icons)} 个图标仍被其他文件引用，原文件仍会被请求，不计入节省")
+        print(f"请求数: {len(replaced_icons)} → 1，字节: {icon_bytes} → {atlas_bytes + style_bytes}（雪碧图 {atlas_bytes} + 内联 CSS {style_bytes}）")
+
+    os.makedirs(os.path.dirname(REPORT_FILE), exist_ok=True)
+    with open(REPORT_FILE, "w", encoding="utf-8") as f:
+        json.dump(report, f, indent=4, ensure_ascii=False)
+    print(f"雪碧图报告已保存到 {REPORT_FILE}")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,11 +1,11 @@
 import os
 import sys
 import shutil
-import urllib.request
 import urllib.parse
 import argparse
 import re
 from bs4 import BeautifulSoup
+from PIL import Image
 from pathlib import Path
 
 # 动态添加 paths.py 所在目录到 sys.path
@@ -13,6 +13,7 @@ PATHS_DIR = Path("C:/Users/user/Desktop/web_carbon/utils")
 sys.path.append(str(PATHS_DIR))
 
 # 导入 paths 模块中的路径变量
+from http_cache import CachedFetcher
 from paths import WEBSITES_ORIGINAL_DIR, FULL_OPTI_DIR
 
 # ===== 命令行参数检查 =====
@@ -28,12 +29,32 @@ SOURCE_PROJECT_DIR = os.path.join(WEBSITES_ORIGINAL_DIR, PROJECT_NAME)
 HTML_FILE_PATH = os.path.join(SOURCE_PROJECT_DIR, "index.html")
 RESULT_DIR = os.path.join(SOURCE_TEMP_DIR, "images_original",)
 
+# --- 配置区域 ---
+# 远程图片并发下载数、超时（秒）和单个文件大小上限
+REMOTE_FETCH_WORKERS = int(os.environ.get("IMAGE_FETCH_WORKERS", "8"))
+REMOTE_CONNECT_TIMEOUT = float(os.environ.get("IMAGE_FETCH_CONNECT_TIMEOUT", "5"))
+REMOTE_READ_TIMEOUT = float(os.environ.get("IMAGE_FETCH_READ_TIMEOUT", "20"))
+REMOTE_MAX_BYTES = int(os.environ.get("IMAGE_FETCH_MAX_MB", "20")) * 1024 * 1024
+# 离线模式：只使用磁盘缓存中的远程图片，不访问网络（IMAGE_FETCH_OFFLINE=1）
+REMOTE_OFFLINE = os.environ.get("IMAGE_FETCH_OFFLINE", "0") == "1"
+# --- 配置区域结束 ---
+
 # ===== 工具函数 =====
 def sanitize_filename(filename):
     filename = filename.split('?')[0].split('#')[0]
     filename = re.sub(r'[<>:"/\\|?*]', '_', filename)
     return filename[:200]
 
+def is_animated_gif(path):
+    """多帧 GIF 交给媒体阶段（media_optimize.py）转换，图片流水线只会保留第一帧。"""
+    if not str(path).lower().endswith(".gif"):
+        return False
+    try:
+        with Image.open(path) as img:
+            return getattr(img, "n_frames", 1) > 1
+    except Exception:
+        return False
+
 def extract_images_from_site():
     if not os.path.exists(HTML_FILE_PATH):
         print(f"HTML 文件未找到: {HTML_FILE_PATH}")
@@ -43,6 +64,8 @@ def extract_images_from_site():
     print(f"输出目录: {RESULT_DIR}")
 
     processed_image_urls = set()
+    # 远程图片先登记，遍历结束后统一并发下载
+    remote_jobs = {}
 
     def process_image(src_url, reference_base_path):
         if not src_url or src_url.lower().startswith('data:'):
@@ -55,7 +78,7 @@ def extract_images_from_site():
             print(f"  跳过 SVG 图像: {original_src_for_log}")
             return
 
-        if src_url in processed_image_urls:
+        if src_url in processed_image_urls or src_url in remote_jobs:
             return
 
         img_name_from_url = os.path.basename(urllib.parse.unquote(src_url.split('?')[0].split('#')[0]))
@@ -69,13 +92,8 @@ def extract_images_from_site():
         output_path = os.path.join(RESULT_DIR, sanitized_img_name)
 
         if src_url.startswith(('http://', 'https://')):
-            try:
-                print(f"  下载远程图片: {src_url}")
-                urllib.request.urlretrieve(src_url, output_path)
-                print(f"    下载完成: {output_path}")
-                processed_image_urls.add(src_url)
-            except Exception as e:
-                print(f"    下载失败 {src_url}: {e}")
+            print(f"  登记远程图片: {src_url}")
+            remote_jobs[src_url] = output_path
         else:
             relative_src_path = os.path.normpath(os.path.join(os.path.dirname(reference_base_path), src_url))
             abs_src_path = os.path.join(SOURCE_PROJECT_DIR, relative_src_path)
@@ -84,6 +102,9 @@ def extract_images_from_site():
                 abs_src_path = os.path.normpath(os.path.join(os.path.dirname(HTML_FILE_PATH), src_url))
 
             if os.path.exists(abs_src_path) and os.path.isfile(abs_src_path):
+                if is_animated_gif(abs_src_path):
+                    print(f"  跳过动画 GIF（由媒体阶段处理）: {original_src_for_log}")
+                    return
                 try:
                     print(f"  拷贝本地图片: {original_src_for_log} → {abs_src_path}")
                     shutil.copy2(abs_src_path, output_path)
@@ -153,6 +174,25 @@ def extract_images_from_site():
         else:
             print(f"  CSS 文件未找到: {css_path}（href='{css_href}'）")
 
+    if remote_jobs:
+        mode = "离线缓存" if REMOTE_OFFLINE else f"{REMOTE_FETCH_WORKERS} 线程"
+        print(f"\n下载远程图片: {len(remote_jobs)} 张（{mode}）")
+        fetcher = CachedFetcher(
+            connect_timeout=REMOTE_CONNECT_TIMEOUT,
+            read_timeout=REMOTE_READ_TIMEOUT,
+            max_bytes=REMOTE_MAX_BYTES,
+            offline=REMOTE_OFFLINE,
+        )
+        for url, output_path, status, error in fetcher.fetch_many(list(remote_jobs.items()), REMOTE_FETCH_WORKERS):
+            if error:
+                print(f"    下载失败 {url}: {error}")
+            elif is_animated_gif(output_path):
+                os.remove(output_path)
+                print(f"    跳过动画 GIF（由媒体阶段处理）: {url}")
+            else:
+                print(f"    下载完成（{status}）: {output_path}")
+                processed_image_urls.add(url)
+
     if not processed_image_urls:
         print(f"未提取到图片（非 SVG）: {PROJECT_NAME}")
     else:
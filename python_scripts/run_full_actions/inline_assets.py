@@ -0,0 +1,331 @@
+import os
+import re
+import sys
+import json
+import base64
+import mimetypes
+import urllib.parse
+from pathlib import Path
+
+# 动态添加 paths.py 所在目录到 sys.path
+PATHS_DIR = Path("C:/Users/user/Desktop/web_carbon/utils")
+sys.path.append(str(PATHS_DIR))
+
+# 导入 paths 模块中的路径变量
+from paths import FULL_OPTI_DIR
+from image_refs import CSS_URL_PATTERN, split_reference, is_local_reference
+
+# 依赖检查
+try:
+    from bs4 import BeautifulSoup
+except ImportError:
+    print("错误：beautifulsoup4 库未安装。请运行 'pip install beautifulsoup4'")
+    sys.exit(1)
+
+# --- 配置区域 ---
+if len(sys.argv) < 2:
+    print("错误：请提供项目名称作为命令行参数，例如：python inline_assets.py project_name")
+    sys.exit(1)
+PROJECT_NAME = sys.argv[1]
+
+# 内联阶段在其他阶段之后运行，直接处理最终站点目录
+SITE_DIR = FULL_OPTI_DIR / "websites_optimized" / PROJECT_NAME
+REPORT_FILE = os.path.join(FULL_OPTI_DIR / "temp" / PROJECT_NAME / "inline" / "optimization_report", "inline_assets_report.json")
+
+# 单个资源内联后的总开销上限：编码后大小 × 全站引用次数，重复引用的资源因此不会被内联
+INLINE_MAX_BYTES = int(os.getenv("INLINE_MAX_BYTES", "4096"))
+# 每个页面最多新增的内联字节数，避免 HTML 过大影响首屏解析
+INLINE_PAGE_BUDGET_BYTES = int(os.getenv("INLINE_PAGE_BUDGET_BYTES", "24576"))
+IMAGE_EXTENSIONS = (".png", ".jpg", ".jpeg", ".gif", ".webp", ".avif", ".svg", ".ico")
+
+# --- 辅助函数 ---
+def resolve_local_path(ref, base_dir):
+    if not ref or not is_local_reference(ref.strip()):
+        return None
+    path_part = urllib.parse.unquote(split_reference(ref.strip())[0])
+    if not path_part:
+        return None
+    if path_part.startswith("/"):
+        return os.path.normpath(os.path.join(SITE_DIR, path_part.lstrip("/")))
+    return os.path.normpath(os.path.join(base_dir, path_part))
+
+def read_bytes(path):
+    with open(path, "rb") as f:
+        return f.read()
+
+def data_uri(path):
+    """
+    SVG 使用 UTF-8 文本（百分号转义），其他图片使用 base64。
+    """
+    content = read_bytes(path)
+    if path.lower().endswith(".svg"):
+        text = re.sub(r"\s+", " ", content.decode("utf-8")).strip()
+        return "data:image/svg+xml," + urllib.parse.quote(text, safe=" =:/;,'()@!$*+-._~")
+    mime = mimetypes.guess_type(path)[0] or "application/octet-stream"
+    if path.lower().endswith(".webp"):
+        mime = "image/webp"
+    elif path.lower().endswith(".avif"):
+        mime = "image/avif"
+    return f"data:{mime};base64,{base64.b64encode(content).decode('ascii')}"
+
+def rebase_css_urls(css_text, css_dir, html_dir):
+    """
+    样式表内联到 HTML 后，url() 改为相对页面解析。
+    """
+    def replace(match):
+        quote, ref = match.group(1), match.group(2)
+        target = resolve_local_path(ref, css_dir)
+        if target is None:
+            return match.group(0)
+        suffix = split_reference(ref.strip())[1]
+        new_ref = Path(os.path.relpath(target, html_dir)).as_posix() + suffix
+        return f"url({quote}{new_ref}{quote})"
+    return CSS_URL_PATTERN.sub(replace, css_text)
+
+class InlinePlanner:
+    """
+    统计每个资源在全站的引用次数并决定是否内联，记录实际内联情况用于报告。
+    """
+
+    def __init__(self):
+        self.references = {}
+        self.inlined = {}
+        self.encoded = {}
+
+    def count(self, path):
+        if path and os.path.isfile(path):
+            self.references[path] = self.references.get(path, 0) + 1
+
+    def encoded_value(self, path, kind):
+        if path not in self.encoded:
+            if kind == "image":
+                self.encoded[path] = data_uri(path)
+            else:
+                self.encoded[path] = read_bytes(path).decode("utf-8")
+        return self.encoded[path]
+
+    def eligible(self, path, kind):
+        if path not in self.references:
+            return False
+        encoded_size = len(self.encoded_value(path, kind).encode("utf-8"))
+        return encoded_size * self.references[path] <= INLINE_MAX_BYTES
+
+    def record(self, path, kind, page, added_bytes):
+        entry = self.inlined.setdefault(path, {"kind": kind, "inlined_references": 0, "pages": set(), "added_bytes": 0})
+        entry["inlined_references"] += 1
+        entry["pages"].add(page)
+        entry["added_bytes"] += added_bytes
+
+def collect_references(html_files, planner):
+    """
+    第一遍：统计 HTML 与本地样式表中的所有资源引用。返回 {html 路径: soup} 与 {css 路径: 文本}。
+    """
+    soups, stylesheets = {}, {}
+    for html_path in html_files:
+        with open(html_path, "r", encoding="utf-8") as f:
+            soup = BeautifulSoup(f, "html.parser")
+        soups[html_path] = soup
+        html_dir = os.path.dirname(html_path)
+        for img in soup.find_all("img", src=True):
+            planner.count(resolve_local_path(img["src"], html_dir))
+        for link in soup.find_all("link", href=True):
+            rels = [r.lower() for r in link.get("rel") or []]
+            path = resolve_local_path(link["href"], html_dir)
+            planner.count(path)
+            if "stylesheet" in rels and path and os.path.isfile(path) and path not in stylesheets:
+                with open(path, "r", encoding="utf-8") as f:
+                    stylesheets[path] = f.read()
+        for script in soup.find_all("script", src=True):
+            planner.count(resolve_local_path(script["src"], html_dir))
+        for tag in soup.find_all(style=True):
+            for _, ref in CSS_URL_PATTERN.findall(tag["style"]):
+                planner.count(resolve_local_path(ref, html_dir))
+        for style in soup.find_all("style"):
+            for _, ref in CSS_URL_PATTERN.findall(style.string or ""):
+                planner.count(resolve_local_path(ref, html_dir))
+    for css_path, css_text in stylesheets.items():
+        for _, ref in CSS_URL_PATTERN.findall(css_text):
+            planner.count(resolve_local_path(ref, os.path.dirname(css_path)))
+    return soups, stylesheets
+
+def inline_css_images(css_text, base_dir, planner, owner, budget):
+    """
+    把 CSS 中的小图片替换为 data URI。budget 为 None 时不受页面预算限制（外部样式表）。
+    """
+    def replace(match):
+        ref = match.group(2)
+        path = resolve_local_path(ref, base_dir)
+        if not path or not path.lower().endswith(IMAGE_EXTENSIONS) or not planner.eligible(path, "image"):
+            return match.group(0)
+        value = planner.encoded_value(path, "image")
+        if budget is not None:
+            if budget["used"] + len(value) > INLINE_PAGE_BUDGET_BYTES:
+                return match.group(0)
+            budget["used"] += len(value)
+        planner.record(path, "image", owner, len(value))
+        return f'url("{value}")'
+    return CSS_URL_PATTERN.sub(replace, css_text)
+
+def inline_page(html_path, soup, stylesheets, planner):
+    """
+    第二遍：在页面预算内内联小样式表、脚本和图片，返回本页新增的字节数。
+    """
+    html_dir = os.path.dirname(html_path)
+    page = os.path.relpath(html_path, SITE_DIR)
+    budget = {"used": 0}
+
+    def fits(size):
+        return budget["used"] + size <= INLINE_PAGE_BUDGET_BYTES
+
+    for link in soup.find_all("link", href=True):
+        rels = [r.lower() for r in link.get("rel") or []]
+        path = resolve_local_path(link["href"], html_dir)
+        if not path or not os.path.isfile(path):
+            continue
+        if "stylesheet" in rels and path in stylesheets:
+            css_text = stylesheets[path]
+            if "@import" in css_text or link.get("media") not in (None, "all", "screen"):
+                continue
+            css_text = rebase_css_urls(css_text, os.path.dirname(path), html_dir)
+            size = len(css_text.encode("utf-8"))
+            if size * planner.references.get(path, 1) > INLINE_MAX_BYTES or not fits(size):
+                continue
+            style = soup.new_tag("style")
+            style.string = css_text
+            link.replace_with(style)
+            budget["used"] += size
+            planner.record(path, "stylesheet", page, size)
+        elif "icon" in rels and planner.eligible(path, "image"):
+            value = planner.encoded_value(path, "image")
+            if fits(len(value)):
+                link["href"] = value
+                budget["used"] += len(value)
+                planner.record(path, "image", page, len(value))
+
+    # defer 脚本需要保持"解析完成后按顺序执行"：只有页面中所有 defer 脚本都能内联时，才统一移到 body 末尾
+    scripts = soup.find_all("script", src=True)
+    deferred = [s for s in scripts if s.has_attr("defer") and not s.has_attr("async")]
+    deferred_paths = [resolve_local_path(s["src"], html_dir) for s in deferred]
+    deferred_ok = bool(deferred) and all(p and planner.eligible(p, "script") for p in deferred_paths) and \
+        fits(sum(len(planner.encoded_value(p, "script").encode("utf-8")) for p in deferred_paths))
+    for script in scripts:
+        if script.has_attr("async") or script.get("type") == "module":
+            continue
+        is_deferred = script in deferred
+        if is_deferred and not deferred_ok:
+            continue
+        path = resolve_local_path(script["src"], html_dir)
+        if not path or not planner.eligible(path, "script"):
+            continue
+        code = planner.encoded_value(path, "script")
+        size = len(code.encode("utf-8"))
+        if not is_deferred and not fits(size):
+            continue
+        if "</script" in code.lower():
+            continue
+        inline_script = soup.new_tag("script")
+        for attr, value in script.attrs.items():
+            if attr not in ("src", "defer", "async", "integrity", "crossorigin"):
+                inline_script[attr] = value
+        inline_script.string = code
+        if is_deferred and soup.body:
+            script.decompose()
+            soup.body.append(inline_script)
+        else:
+            script.replace_with(inline_script)
+        budget["used"] += size
+        planner.record(path, "script", page, size)
+
+    for img in soup.find_all("img", src=True):
+        path = resolve_local_path(img["src"], html_dir)
+        if not path or not path.lower().endswith(IMAGE_EXTENSIONS) or not planner.eligible(path, "image"):
+            continue
+        value = planner.encoded_value(path, "image")
+        if not fits(len(value)):
+            continue
+        img["src"] = value
+        budget["used"] += len(value)
+        planner.record(path, "image", page, len(value))
+
+    for tag in soup.find_all(style=True):
+        tag["style"] = inline_css_images(tag["style"], html_dir, planner, page, budget)
+    for style in soup.find_all("style"):
+        if style.string:
+            style.string = inline_css_images(style.string, html_dir, planner, page, budget)
+    return budget["used"]
+
+# --- 主逻辑 ---
+def main():
+    print(f"调试: 启动小资源内联，项目: {PROJECT_NAME}，单资源上限 {INLINE_MAX_BYTES} 字节，页面预算 {INLINE_PAGE_BUDGET_BYTES} 字节")
+    if not os.path.exists(SITE_DIR):
+        print(f"错误：站点目录 '{SITE_DIR}' 不存在，请先完成前面的优化阶段。")
+        return
+
+    html_files = [os.path.join(root, name) for root, _, files in os.walk(SITE_DIR)
+                  for name in sorted(files) if name.lower().endswith((".html", ".htm"))]
+    planner = InlinePlanner()
+    soups, stylesheets = collect_references(html_files, planner)
+
+    # 外部样式表被多个页面共享并可缓存，其中的小图片直接内联到样式表里
+    for css_path in list(stylesheets):
+        new_text = inline_css_images(stylesheets[css_path], os.path.dirname(css_path), planner,
+                                     os.path.relpath(css_path, SITE_DIR), None)
+        if new_text != stylesheets[css_path]:
+            stylesheets[css_path] = new_text
+            with open(css_path, "w", encoding="utf-8") as f:
+                f.write(new_text)
+            print(f"已更新 CSS 文件: {css_path}")
+
+    pages = {}
+    for html_path, soup in soups.items():
+        added = inline_page(html_path, soup, stylesheets, planner)
+        if added:
+            with open(html_path, "w", encoding="utf-8") as f:
+                f.write(str(soup))
+            print(f"已更新 HTML 文件: {html_path}（新增内联 {added} 字节）")
+        pages[os.path.relpath(html_path, SITE_DIR)] = added
+
+    assets = []
+    bytes_added = bytes_removed = requests_saved = 0
+    for path, entry in sorted(planner.inlined.items()):
+        # 只有全部引用都被内联时，原文件才不再被请求
+        fully_inlined = entry["inlined_references"] >= planner.references.get(path, 0)
+        original_bytes = os.path.getsize(path)
+        bytes_added += entry["added_bytes"]
+        if fully_inlined:
+            bytes_removed += original_bytes
+            requests_saved += 1
+        assets.append({
+            "asset": os.path.relpath(path, SITE_DIR),
+            "kind": entry["kind"],
+            "original_bytes": original_bytes,
+            "inlined_bytes": entry["added_bytes"],
+            "references": planner.references.get(path, 0),
+            "inlined_references": entry["inlined_references"],
+            "inlined_into": sorted(entry["pages"]),
+            "fully_inlined": fully_inlined
+        })
+
+    report = {
+        "assets": assets,
+        "pages": pages,
+        "summary": {
+            "inline_max_bytes": INLINE_MAX_BYTES,
+            "page_budget_bytes": INLINE_PAGE_BUDGET_BYTES,
+            "assets_inlined": len(assets),
+            "requests_saved": requests_saved,
+            "bytes_added_to_documents": bytes_added,
+            "bytes_no_longer_requested": bytes_removed,
+            "net_transfer_change_bytes": bytes_added - bytes_removed
+        }
+    }
+    os.makedirs(os.path.dirname(REPORT_FILE), exist_ok=True)
+    with open(REPORT_FILE, "w", encoding="utf-8") as f:
+        json.dump(report, f, indent=4, ensure_ascii=False)
+    print(f"\n内联资源 {len(assets)} 个，减少请求 {requests_saved} 个，"
+          f"净传输变化 {bytes_added - bytes_removed:+d} 字节（不含每个请求的协议开销）")
+    print(f"内联报告已保存到 {REPORT_FILE}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,339 @@
+import os
+import sys
+import json
+import csv
+import shutil
+import subprocess
+import urllib.parse
+from pathlib import Path
+from PIL import Image
+
+# 动态添加 paths.py 所在目录到 sys.path
+PATHS_DIR = Path("C:/Users/user/Desktop/web_carbon/utils")
+sys.path.append(str(PATHS_DIR))
+
+# 导入 paths 模块中的路径变量
+from paths import FULL_OPTI_DIR
+from image_refs import split_reference, is_local_reference
+
+# 依赖检查
+try:
+    from bs4 import BeautifulSoup
+except ImportError:
+    print("错误：beautifulsoup4 库未安装。请运行 'pip install beautifulsoup4'")
+    sys.exit(1)
+
+# --- 配置区域 ---
+if len(sys.argv) < 2:
+    print("错误：请提供项目名称作为命令行参数，例如：python media_optimize.py project_name")
+    sys.exit(1)
+PROJECT_NAME = sys.argv[1]
+
+# 媒体阶段在图片替换之后运行，直接处理最终站点目录
+SITE_DIR = FULL_OPTI_DIR / "websites_optimized" / PROJECT_NAME
+REPORT_DIR = FULL_OPTI_DIR / "temp" / PROJECT_NAME / "media" / "optimization_report"
+REPORT_FILE = os.path.join(REPORT_DIR, "media_optimization_report.json")
+CSV_REPORT_FILE = os.path.join(REPORT_DIR, "media_optimization_summary.csv")
+
+FFMPEG_BIN = os.getenv("FFMPEG_BIN") or shutil.which("ffmpeg")
+FFMPEG_TIMEOUT = int(os.getenv("MEDIA_FFMPEG_TIMEOUT", "300"))  # 单个文件转码超时（秒）
+WEBP_QUALITY = int(os.getenv("MEDIA_WEBP_QUALITY", "75"))
+WEBP_METHOD = int(os.getenv("MEDIA_WEBP_METHOD", "4"))  # 0-6，越大越慢、文件越小；多帧动画耗时明显
+MP4_CRF = int(os.getenv("MEDIA_MP4_CRF", "28"))
+WEBM_CRF = int(os.getenv("MEDIA_WEBM_CRF", "40"))
+# 视频（封面 + 首个可播放源）比原 GIF 至少小这么多比例，且比动画 WebP 更小时，才把 <img> 改成 <video>
+VIDEO_MIN_SAVING_RATIO = float(os.getenv("MEDIA_VIDEO_MIN_SAVING", "0.3"))
+
+
+# --- 转码函数 ---
+def run_ffmpeg(args):
+    """
+    运行 ffmpeg，成功返回 True。
+    """
+    try:
+        subprocess.run([FFMPEG_BIN, "-y", "-loglevel", "error", *args],
+                       check=True, capture_output=True, text=True, timeout=FFMPEG_TIMEOUT)
+        return True
+    except subprocess.CalledProcessError as e:
+        print(f"    ffmpeg 失败: {e.stderr.strip()}")
+    except subprocess.TimeoutExpired:
+        print(f"    ffmpeg 超时（{FFMPEG_TIMEOUT} 秒）")
+    return False
+
+def file_size(path):
+    return os.path.getsize(path) if path and os.path.exists(path) else 0
+
+def candidate_paths(gif_path):
+    """
+    convert_animated_gif 会写出的文件。
+    """
+    stem = os.path.splitext(gif_path)[0]
+    return [f"{stem}.webp", f"{stem}.poster.webp", f"{stem}.mp4", f"{stem}.webm"]
+
+def convert_animated_gif(gif_path):
+    """
+    为动画 GIF 生成动画 WebP；有 ffmpeg 时另外生成静音 MP4/WebM 和 WebP 封面帧。
+    返回各候选文件的路径与大小。
+    """
+    stem = os.path.splitext(gif_path)[0]
+    candidates = {"gif_bytes": file_size(gif_path)}
+
+    webp_path = f"{stem}.webp"
+    with Image.open(gif_path) as gif:
+        gif.save(webp_path, "WEBP", save_all=True, loop=gif.info.get("loop", 0),
+                 quality=WEBP_QUALITY, method=WEBP_METHOD)
+        gif.seek(0)
+        poster_path = f"{stem}.poster.webp"
+        gif.convert("RGBA").save(poster_path, "WEBP", quality=WEBP_QUALITY)
+    candidates["webp_path"] = webp_path
+    candidates["webp_bytes"] = file_size(webp_path)
+
+    if not FFMPEG_BIN:
+        os.remove(poster_path)
+        return candidates
+
+    candidates["poster_path"] = poster_path
+    candidates["poster_bytes"] = file_size(poster_path)
+    # H.264/VP9 要求偶数宽高，yuv420p 保证各浏览器都能播放
+    even_scale = "scale=trunc(iw/2)*2:trunc(ih/2)*2"
+    mp4_path = f"{stem}.mp4"
+    if run_ffmpeg(["-i", gif_path, "-an", "-movflags", "+faststart", "-pix_fmt", "yuv420p", "-vf", even_scale,
+                   "-c:v", "libx264", "-preset", "slow", "-crf", str(MP4_CRF), mp4_path]):
+        candidates["mp4_path"] = mp4_path
+        candidates["mp4_bytes"] = file_size(mp4_path)
+    webm_path = f"{stem}.webm"
+    if run_ffmpeg(["-i", gif_path, "-an", "-pix_fmt", "yuv420p", "-vf", even_scale,
+                   "-c:v", "libvpx-vp9", "-b:v", "0", "-crf", str(WEBM_CRF), webm_path]):
+        candidates["webm_path"] = webm_path
+        candidates["webm_bytes"] = file_size(webm_path)
+    return candidates
+
+def choose_gif_replacement(candidates):
+    """
+    选择替换方式：'video'、'webp' 或 'original'，并返回替换后页面实际传输的字节数。
+    浏览器加载 <video> 时只下载封面和第一个可播放的 <source>（WebM 优先）。
+    """
+    gif_bytes = candidates["gif_bytes"]
+    webp_bytes = candidates.get("webp_bytes") or gif_bytes
+    video_source_bytes = candidates.get("webm_bytes") or candidates.get("mp4_bytes")
+    if video_source_bytes and candidates.get("mp4_bytes"):
+        video_bytes = candidates.get("poster_bytes", 0) + video_source_bytes
+        saving_ratio = (gif_bytes - video_bytes) / gif_bytes if gif_bytes else 0
+        if saving_ratio >= VIDEO_MIN_SAVING_RATIO and video_bytes < webp_bytes:
+            return "video", video_bytes
+    if webp_bytes < gif_bytes:
+        return "webp", webp_bytes
+    return "original", gif_bytes
+
+def cleanup_unused(candidates, choice):
+    """
+    删除未被采用的候选文件。
+    """
+    keep = {"video": ("mp4_path", "webm_path", "poster_path"), "webp": ("webp_path",)}.get(choice, ())
+    for key in ("webp_path", "mp4_path", "webm_path", "poster_path"):
+        path = candidates.get(key)
+        if path and key not in keep and os.path.exists(path):
+            os.remove(path)
+
+def reencode_video(video_path):
+    """
+    用 H.264 CRF 重新编码 MP4，只有结果更小时才替换原文件。
+    """
+    original_bytes = file_size(video_path)
+    tmp_path = f"{os.path.splitext(video_path)[0]}.reencode.mp4"
+    ok = run_ffmpeg(["-i", video_path, "-movflags", "+faststart", "-pix_fmt", "yuv420p",
+                     "-c:v", "libx264", "-preset", "slow", "-crf", str(MP4_CRF),
+                     "-c:a", "aac", "-b:a", "96k", tmp_path])
+    new_bytes = file_size(tmp_path) if ok else 0
+    if ok and 0 < new_bytes < original_bytes:
+        os.replace(tmp_path, video_path)
+        return original_bytes, new_bytes, "reencoded"
+    if os.path.exists(tmp_path):
+        os.remove(tmp_path)
+    return original_bytes, original_bytes, "kept" if ok else "failed"
+
+# --- HTML 改写 ---
+def resolve_local_path(ref, html_path):
+    if not ref or not is_local_reference(ref.strip()):
+        return None
+    path_part = urllib.parse.unquote(split_reference(ref.strip())[0])
+    if path_part.startswith("/"):
+        return os.path.normpath(os.path.join(SITE_DIR, path_part.lstrip("/")))
+    return os.path.normpath(os.path.join(os.path.dirname(html_path), path_part))
+
+def swap_extension(ref, new_suffix):
+    path_part, query = split_reference(ref.strip())
+    return os.path.splitext(path_part)[0] + new_suffix + query
+
+def build_video_tag(soup, img, src, candidates):
+    """
+    用 <video autoplay muted loop playsinline> 替换 <img>，保留布局相关属性。
+    """
+    video = soup.new_tag("video", attrs={"autoplay": "", "muted": "", "loop": "", "playsinline": ""})
+    for attr in ("class", "id", "style", "width", "height"):
+        if img.get(attr):
+            video[attr] = img[attr]
+    if img.get("alt"):
+        video["aria-label"] = img["alt"]
+    video["poster"] = swap_extension(src, ".poster.webp")
+    if candidates.get("webm_path"):
+        video.append(soup.new_tag("source", src=swap_extension(src, ".webm"), type="video/webm"))
+    video.append(soup.new_tag("source", src=swap_extension(src, ".mp4"), type="video/mp4"))
+    return video
+
+def rewrite_html_files(decisions):
+    """
+    改写所有 HTML 中引用已转换 GIF 的 <img>/<source>，返回 {gif 路径: 改写次数}。
+    """
+    rewritten = {path: 0 for path in decisions}
+    for root, _, files in os.walk(SITE_DIR):
+        for name in files:
+            if not name.lower().endswith((".html", ".htm")):
+                continue
+            html_path = os.path.join(root, name)
+            with open(html_path, "r", encoding="utf-8") as f:
+                soup = BeautifulSoup(f, "html.parser")
+            changed = False
+
+            for img in soup.find_all("img", src=True):
+                gif_path = resolve_local_path(img["src"], html_path)
+                decision = decisions.get(gif_path)
+                if not decision:
+                    continue
+                choice, candidates = decision
+                if choice == "video":
+                    # <picture> 内的 <img> 只能作为回退图片，不能换成 <video>；WebP 已被删除，保留原 GIF
+                    if img.find_parent("picture") is not None:
+                        continue
+                    img.replace_with(build_video_tag(soup, img, img["src"], candidates))
+                else:
+                    img["src"] = swap_extension(img["src"], ".webp")
+                rewritten[gif_path] += 1
+                changed = True
+
+            for source in soup.find_all("source", srcset=True):
+                gif_path = resolve_local_path(source["srcset"].split()[0], html_path)
+                # 只有采用动画 WebP 时 .webp 文件才保留；选择视频时 <source> 仍指向原 GIF
+                if gif_path in decisions and decisions[gif_path][0] == "webp":
+                    source["srcset"] = swap_extension(source["srcset"].split()[0], ".webp")
+                    if source.get("type") == "image/gif":
+                        source["type"] = "image/webp"
+                    rewritten[gif_path] += 1
+                    changed = True
+
+            if changed:
+                with open(html_path, "w", encoding="utf-8") as f:
+                    f.write(str(soup))
+                print(f"已更新 HTML 文件: {html_path}")
+    return rewritten
+
+# --- 主逻辑 ---
+def main():
+    print(f"调试: 启动媒体优化，项目: {PROJECT_NAME}")
+    if not os.path.exists(SITE_DIR):
+        print(f"错误：站点目录 '{SITE_DIR}' 不存在，请先完成图片替换阶段。")
+        return
+    if not FFMPEG_BIN:
+        print("警告：未找到 ffmpeg，动画 GIF 只转换为动画 WebP，MP4 不重新编码。可设置 FFMPEG_BIN 指定路径。")
+
+    gif_files, video_files = [], []
+    for root, _, files in os.walk(SITE_DIR):
+        for name in sorted(files):
+            lower = name.lower()
+            if lower.endswith(".gif"):
+                gif_files.append(os.path.join(root, name))
+            elif lower.endswith(".mp4") and not lower.endswith(".reencode.mp4"):
+                video_files.append(os.path.join(root, name))
+
+    report = {}
+    decisions = {}
+    generated_videos = set()
+    for gif_path in gif_files:
+        try:
+            with Image.open(gif_path) as gif:
+                frames = getattr(gif, "n_frames", 1)
+        except Exception as e:
+            print(f"    跳过无法读取的 GIF {gif_path}: {e}")
+            continue
+        if frames <= 1:
+            # 静态 GIF 由图片优化阶段处理
+            continue
+        # 同名文件可能是站点自己的资源（如 hero.gif 旁的 hero.mp4），转换会覆盖它，未采用时还会被 cleanup_unused 删除
+        existing = [path for path in candidate_paths(gif_path) if os.path.exists(path)]
+        if existing:
+            print(f"    跳过 {gif_path}：{', '.join(os.path.basename(path) for path in existing)} 已存在")
+            continue
+        print(f"处理动画 GIF（{frames} 帧）: {gif_path}")
+        try:
+            candidates = convert_animated_gif(gif_path)
+        except Exception as e:
+            print(f"    转换失败 {gif_path}: {e}")
+            continue
+        choice, after_bytes = choose_gif_replacement(candidates)
+        cleanup_unused(candidates, choice)
+        if choice != "original":
+            decisions[os.path.normpath(gif_path)] = (choice, candidates)
+        if choice == "video":
+            generated_videos.add(os.path.normpath(candidates["mp4_path"]))
+        print(f"    GIF {candidates['gif_bytes']} 字节 → {choice} {after_bytes} 字节")
+        report[os.path.relpath(gif_path, SITE_DIR)] = {
+            "type": "animated-gif",
+            "frames": frames,
+            "replacement": choice,
+            "before_bytes": candidates["gif_bytes"],
+            "after_bytes": after_bytes,
+            "saving_bytes": candidates["gif_bytes"] - after_bytes,
+            "webp_bytes": candidates.get("webp_bytes"),
+            "mp4_bytes": candidates.get("mp4_bytes"),
+            "webm_bytes": candidates.get("webm_bytes"),
+            "poster_bytes": candidates.get("poster_bytes"),
+        }
+
+    rewritten = rewrite_html_files(decisions)
+    for gif_path, count in rewritten.items():
+        report[os.path.relpath(gif_path, SITE_DIR)]["references_rewritten"] = count
+        if count == 0:
+            print(f"    警告：{gif_path} 未在 HTML 中找到 <img> 引用，已生成的文件不会被加载")
+
+    if FFMPEG_BIN:
+        for video_path in video_files:
+            if os.path.normpath(video_path) in generated_videos:
+                continue
+            print(f"重新编码视频: {video_path}")
+            before, after, status = reencode_video(video_path)
+            print(f"    {status}: {before} 字节 → {after} 字节")
+            report[os.path.relpath(video_path, SITE_DIR)] = {
+                "type": "video",
+                "replacement": status,
+                "before_bytes": before,
+                "after_bytes": after,
+                "saving_bytes": before - after,
+            }
+
+    total_before = sum(item["before_bytes"] for item in report.values())
+    total_after = sum(item["after_bytes"] for item in report.values())
+    report["summary"] = {
+        "assets_processed": len(report),
+        "total_before_bytes": total_before,
+        "total_after_bytes": total_after,
+        "total_saving_bytes": total_before - total_after,
+        "ffmpeg_available": bool(FFMPEG_BIN),
+    }
+
+    os.makedirs(REPORT_DIR, exist_ok=True)
+    with open(REPORT_FILE, "w", encoding="utf-8") as f:
+        json.dump(report, f, indent=4, ensure_ascii=False)
+    with open(CSV_REPORT_FILE, "w", newline="", encoding="utf-8") as f:
+        writer = csv.writer(f)
+        writer.writerow(["Asset", "Type", "Replacement", "Before (Bytes)", "After (Bytes)", "Saving (Bytes)", "References Rewritten"])
+        for asset, data in report.items():
+            if asset == "summary":
+                continue
+            writer.writerow([asset, data["type"], data["replacement"], data["before_bytes"], data["after_bytes"],
+                             data["saving_bytes"], data.get("references_rewritten", "")])
+    print(f"\n媒体优化报告已保存到 {REPORT_FILE}")
+    print(f"媒体资源总大小: {total_before} 字节 → {total_after} 字节（减少 {total_before - total_after} 字节）")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,65 @@
+import os
+import sys
+import json
+from pathlib import Path
+
+# 动态添加 paths.py 所在目录到 sys.path
+PATHS_DIR = Path("C:/Users/user/Desktop/web_carbon/utils")
+sys.path.append(str(PATHS_DIR))
+
+# 导入 paths 模块中的路径变量
+from paths import FULL_OPTI_DIR
+from static_server import SUPPORTED_ENCODINGS, SIDECAR_SUFFIXES, is_compressible, write_sidecars
+
+# --- 配置区域 ---
+if len(sys.argv) < 2:
+    print("错误：请提供项目名称作为命令行参数，例如：python precompress.py project_name")
+    sys.exit(1)
+PROJECT_NAME = sys.argv[1]
+
+# 预压缩是最后一个阶段，必须在所有改写 HTML/CSS/JS 的阶段之后运行
+SITE_DIR = FULL_OPTI_DIR / "websites_optimized" / PROJECT_NAME
+REPORT_FILE = os.path.join(FULL_OPTI_DIR / "temp" / PROJECT_NAME / "precompress", "precompress_report.json")
+
+# --- 主逻辑 ---
+def main():
+    print(f"调试: 启动预压缩，项目: {PROJECT_NAME}，编码: {', '.join(SUPPORTED_ENCODINGS)}")
+    if "br" not in SUPPORTED_ENCODINGS:
+        print("警告：brotli 库未安装，只生成 .gz 文件。请运行 'pip install brotli'")
+    if not os.path.exists(SITE_DIR):
+        print(f"错误：站点目录 '{SITE_DIR}' 不存在，请先完成前面的优化阶段。")
+        return
+
+    sidecar_suffixes = tuple(SIDECAR_SUFFIXES.values())
+    files = {}
+    totals = {"original_bytes": 0, **{f"{encoding}_bytes": 0 for encoding in SUPPORTED_ENCODINGS}}
+    for root, _, names in os.walk(SITE_DIR):
+        for name in sorted(names):
+            file_path = os.path.join(root, name)
+            if name.endswith(sidecar_suffixes) or not is_compressible(file_path):
+                continue
+            relative = os.path.relpath(file_path, SITE_DIR)
+            try:
+                written = write_sidecars(file_path)
+            except Exception as e:
+                print(f"    压缩失败 {relative}: {e}")
+                continue
+            original = os.path.getsize(file_path)
+            files[relative] = {"original_bytes": original, **{f"{k}_bytes": v for k, v in written.items()}}
+            totals["original_bytes"] += original
+            for encoding in SUPPORTED_ENCODINGS:
+                # 没有旁路文件的资源以原始字节传输
+                totals[f"{encoding}_bytes"] += written.get(encoding, original)
+            sizes = "，".join(f"{k} {v}" for k, v in written.items()) or "不压缩"
+            print(f"    {relative}: {original} 字节 → {sizes}")
+
+    report = {"files": files, "summary": {"compressible_files": len(files), **totals}}
+    os.makedirs(os.path.dirname(REPORT_FILE), exist_ok=True)
+    with open(REPORT_FILE, "w", encoding="utf-8") as f:
+        json.dump(report, f, indent=4, ensure_ascii=False)
+    print(f"\n文本资源 {len(files)} 个，" + "，".join(f"{k}: {v}" for k, v in totals.items()))
+    print(f"预压缩报告已保存到 {REPORT_FILE}")
+
+
+if __name__ == "__main__":
+    main()
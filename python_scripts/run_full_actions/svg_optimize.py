@@ -0,0 +1,256 @@
+import os
+import re
+import sys
+import json
+import csv
+import urllib.parse
+from pathlib import Path
+
+# 动态添加 paths.py 所在目录到 sys.path
+PATHS_DIR = Path("C:/Users/user/Desktop/web_carbon/utils")
+sys.path.append(str(PATHS_DIR))
+
+# 导入 paths 模块中的路径变量
+from paths import FULL_OPTI_DIR
+from image_refs import split_reference, is_local_reference
+from svg_optimizer import optimize_svg, svg_has_ids, inline_parts
+
+# 依赖检查
+try:
+    from bs4 import BeautifulSoup
+except ImportError:
+    print("错误：beautifulsoup4 库未安装。请运行 'pip install beautifulsoup4'")
+    sys.exit(1)
+
+# --- 配置区域 ---
+if len(sys.argv) < 2:
+    print("错误：请提供项目名称作为命令行参数，例如：python svg_optimize.py project_name")
+    sys.exit(1)
+PROJECT_NAME = sys.argv[1]
+
+# SVG 阶段在图片替换之后运行，直接处理最终站点目录
+SITE_DIR = FULL_OPTI_DIR / "websites_optimized" / PROJECT_NAME
+SOURCE_TEMP_DIR = FULL_OPTI_DIR / "temp" / PROJECT_NAME / "image"
+# SVG 结果并入图片优化报告
+IMAGE_REPORT_FILE = os.path.join(SOURCE_TEMP_DIR, "optimization_report", "optimization_report.json")
+CSV_REPORT_FILE = os.path.join(SOURCE_TEMP_DIR, "optimization_report", "svg_optimization_summary.csv")
+
+SVG_PRECISION = int(os.getenv("SVG_PRECISION", "2"))  # 路径等数值保留的小数位（viewBox 很小时自动增加）
+# 嵌入方式：none（只优化文件）、inline（单次引用的小 SVG 直接内联）、sprite（小 SVG 合并为页内 <symbol>，以 <use> 引用）
+SVG_EMBED_MODE = os.getenv("SVG_EMBED_MODE", "none").lower()
+SVG_EMBED_MAX_BYTES = int(os.getenv("SVG_EMBED_MAX_BYTES", "2048"))  # 只嵌入优化后不超过该大小的 SVG
+SPRITE_ID_PREFIX = "svg-"
+
+# --- 辅助函数 ---
+def find_fragment_references():
+    """
+    找出以 file.svg#id 形式被引用的 SVG，这些文件需要保留 id。
+    """
+    names = set()
+    for root, _, files in os.walk(SITE_DIR):
+        for name in files:
+            if name.lower().endswith((".html", ".htm", ".css", ".js")):
+                with open(os.path.join(root, name), "r", encoding="utf-8", errors="ignore") as f:
+                    names.update(m.lower() for m in re.findall(r"([\w.-]+\.svg)#", f.read(), re.IGNORECASE))
+    return names
+
+def resolve_local_path(ref, html_path):
+    if not ref or not is_local_reference(ref.strip()):
+        return None
+    path_part = urllib.parse.unquote(split_reference(ref.strip())[0])
+    if path_part.startswith("/"):
+        return os.path.normpath(os.path.join(SITE_DIR, path_part.lstrip("/")))
+    return os.path.normpath(os.path.join(os.path.dirname(html_path), path_part))
+
+def slugify(name):
+    return re.sub(r"[^a-z0-9_-]+", "-", name.lower()).strip("-")
+
+def copy_presentation_attributes(img, svg_tag):
+    for attr in ("class", "id", "style", "width", "height"):
+        if img.get(attr):
+            svg_tag[attr] = img[attr]
+    if img.get("alt"):
+        svg_tag["role"] = "img"
+        svg_tag["aria-label"] = img["alt"]
+    else:
+        svg_tag["aria-hidden"] = "true"
+
+def embed_svgs(optimized):
+    """
+    按 SVG_EMBED_MODE 把 HTML 中引用小 SVG 的 <img> 替换为内联 SVG 或 <use> 引用，返回 {svg 路径: 嵌入次数}。
+    """
+    embedded = {}
+    if SVG_EMBED_MODE not in ("inline", "sprite"):
+        return embedded
+    # 含 id 的 SVG 嵌入同一页面后可能产生 id 冲突，不参与嵌入
+    candidates = {path: data for path, data in optimized.items()
+                  if data["optimized_size_bytes"] <= SVG_EMBED_MAX_BYTES and not svg_has_ids(data["markup"])}
+
+    for root, _, files in os.walk(SITE_DIR):
+        for name in files:
+            if not name.lower().endswith((".html", ".htm")):
+                continue
+            html_path = os.path.join(root, name)
+            with open(html_path, "r", encoding="utf-8") as f:
+                soup = BeautifulSoup(f, "html.parser")
+
+            matches = []
+            for img in soup.find_all("img", src=True):
+                svg_path = resolve_local_path(img["src"], html_path)
+                if svg_path in candidates and img.find_parent("picture") is None:
+                    matches.append((img, svg_path))
+            if not matches:
+                continue
+
+            use_counts = {}
+            for _, svg_path in matches:
+                use_counts[svg_path] = use_counts.get(svg_path, 0) + 1
+
+            symbols = {}
+            for img, svg_path in matches:
+                attributes, inner = inline_parts(candidates[svg_path]["markup"])
+                if SVG_EMBED_MODE == "inline":
+                    # 同一页面多次引用时内联会重复传输，保留外部文件（可被缓存）
+                    if use_counts[svg_path] > 1:
+                        continue
+                    svg_tag = BeautifulSoup(f"<svg>{inner}</svg>", "html.parser").svg
+                    for key, value in attributes.items():
+                        svg_tag[key] = value
+                else:
+                    # 由站点内相对路径生成，不同目录下的同名 SVG 不会共用一个 symbol
+                    symbol_id = f"{SPRITE_ID_PREFIX}{slugify(Path(os.path.relpath(svg_path, SITE_DIR)).as_posix())}"
+                    if symbol_id not in symbols:
+                        view_box = attributes.get("viewBox") or f"0 0 {attributes.get('width', 0)} {attributes.get('height', 0)}"
+                        symbols[symbol_id] = f'<symbol id="{symbol_id}" viewBox="{view_box}">{inner}</symbol>'
+                    svg_tag = soup.new_tag("svg")
+                    if attributes.get("viewBox"):
+                        svg_tag["viewBox"] = attributes["viewBox"]
+                    svg_tag.append(soup.new_tag("use", href=f"#{symbol_id}"))
+                    for size_attr in ("width", "height"):
+                        if attributes.get(size_attr) and not img.get(size_attr):
+                            svg_tag[size_attr] = attributes[size_attr]
+                copy_presentation_attributes(img, svg_tag)
+                img.replace_with(svg_tag)
+                embedded[svg_path] = embedded.get(svg_path, 0) + 1
+
+            if symbols:
+                # 不能用 display:none 隐藏：Chrome 不渲染 display:none 子树中经 <use> 引用的渐变、滤镜、裁剪与遮罩
+                sprite = BeautifulSoup(
+                    f'<svg xmlns="http://www.w3.org/2000/svg" width="0" height="0" style="position:absolute" aria-hidden="true">'
+                    f'{"".join(symbols.values())}</svg>',
+                    "html.parser").svg
+                # 没有 <body> 的文档放在最前面，<use> 引用不会落空
+                (soup.body or soup).insert(0, sprite)
+
+            with open(html_path, "w", encoding="utf-8") as f:
+                f.write(str(soup))
+            print(f"已更新 HTML 文件: {html_path}")
+    return embedded
+
+def merge_into_image_report(entries, summary):
+    """
+    将 SVG 结果并入图片优化报告，没有图片报告时单独创建。
+    """
+    report = {}
+    if os.path.exists(IMAGE_REPORT_FILE):
+        try:
+            with open(IMAGE_REPORT_FILE, "r", encoding="utf-8") as f:
+                report = json.load(f)
+        except Exception as e:
+            print(f"警告：读取图片优化报告失败，将重新创建: {e}")
+    report.update(entries)
+    report["svg_summary"] = summary
+    os.makedirs(os.path.dirname(IMAGE_REPORT_FILE), exist_ok=True)
+    with open(IMAGE_REPORT_FILE, "w", encoding="utf-8") as f:
+        json.dump(report, f, indent=4, ensure_ascii=False)
+
+# --- 主逻辑 ---
+def main():
+    print(f"调试: 启动 SVG 优化，项目: {PROJECT_NAME}，嵌入方式: {SVG_EMBED_MODE}")
+    if not os.path.exists(SITE_DIR):
+        print(f"错误：站点目录 '{SITE_DIR}' 不存在，请先完成图片替换阶段。")
+        return
+
+    fragment_referenced = find_fragment_references()
+    optimized = {}
+    entries = {}
+    for root, _, files in os.walk(SITE_DIR):
+        for name in sorted(files):
+            if not name.lower().endswith(".svg"):
+                continue
+            svg_path = os.path.normpath(os.path.join(root, name))
+            relative = os.path.relpath(svg_path, SITE_DIR)
+            with open(svg_path, "r", encoding="utf-8") as f:
+                original = f.read()
+            original_size = len(original.encode("utf-8"))
+            try:
+                markup = optimize_svg(original, SVG_PRECISION, keep_ids=name.lower() in fragment_referenced)
+            except Exception as e:
+                print(f"    SVG 优化失败 {relative}: {e}")
+                entries[relative] = {
+                    "original_filename": relative, "original_format": "svg", "optimization_status": "failed",
+                    "original_size_bytes": original_size, "optimized_size_bytes": 0, "error": str(e)
+                }
+                continue
+
+            optimized_size = len(markup.encode("utf-8"))
+            if optimized_size < original_size:
+                with open(svg_path, "w", encoding="utf-8") as f:
+                    f.write(markup)
+            else:
+                markup, optimized_size = original, original_size
+            optimized[svg_path] = {"markup": markup, "optimized_size_bytes": optimized_size}
+            reduction = original_size - optimized_size
+            entries[relative] = {
+                "original_filename": relative,
+                "original_format": "svg",
+                "optimization_status": "success",
+                "original_size_bytes": original_size,
+                "optimized_size_bytes": optimized_size,
+                "size_reduction_bytes": reduction,
+                "size_reduction_percent": round(reduction / original_size * 100, 2) if original_size else 0,
+                "optimized_format": "svg",
+                "optimized_path": svg_path,
+                "embedded": None,
+                "embed_count": 0,
+                "error": ""
+            }
+            print(f"    {relative}: {original_size} → {optimized_size} 字节")
+
+    embedded = embed_svgs(optimized)
+    for svg_path, count in embedded.items():
+        relative = os.path.relpath(svg_path, SITE_DIR)
+        entries[relative]["embedded"] = SVG_EMBED_MODE
+        entries[relative]["embed_count"] = count
+
+    successful = [e for e in entries.values() if e["optimization_status"] == "success"]
+    total_original = sum(e["original_size_bytes"] for e in successful)
+    total_optimized = sum(e["optimized_size_bytes"] for e in successful)
+    summary = {
+        "total_svgs": len(entries),
+        "successfully_optimized_svgs": len(successful),
+        "total_original_size_bytes": total_original,
+        "total_optimized_size_bytes": total_optimized,
+        "total_size_reduction_bytes": total_original - total_optimized,
+        "embed_mode": SVG_EMBED_MODE,
+        "embedded_svgs": len(embedded),
+        "embedded_references": sum(embedded.values())
+    }
+    merge_into_image_report(entries, summary)
+
+    with open(CSV_REPORT_FILE, "w", newline="", encoding="utf-8") as f:
+        writer = csv.writer(f)
+        writer.writerow(["Filename", "Original Size (Bytes)", "Optimized Size (Bytes)", "Size Reduction (Bytes)", "Size Reduction (%)", "Embedded", "Status", "Error"])
+        for relative, data in entries.items():
+            writer.writerow([relative, data["original_size_bytes"], data["optimized_size_bytes"],
+                             data.get("size_reduction_bytes", 0), f"{data.get('size_reduction_percent', 0)}%",
+                             f"{data.get('embedded') or 'N/A'} x{data.get('embed_count', 0)}",
+                             data["optimization_status"], data.get("error", "")])
+
+    print(f"\nSVG 优化结果已并入 {IMAGE_REPORT_FILE}")
+    print(f"SVG 总大小: {total_original} → {total_optimized} 字节（减少 {total_original - total_optimized} 字节），"
+          f"嵌入 {summary['embedded_svgs']} 个 SVG / {summary['embedded_references']} 处引用")
+
+
+if __name__ == "__main__":
+    main()
@@ -36,37 +36,64 @@ def replace_image_references(project_name, base_input_dir="original_sites", base
     # Directory containing compressed images
     compressed_project_images_dir = os.path.join(compressed_images_dir, project_name)
 
+    # Index the compressed images once (stem -> file). compress_image.py keeps a
+    # single output per stem (WebP, or AVIF when the rate-distortion sweep picks it);
+    # WebP only wins if both are somehow present
+    compressed_by_stem = {}
+    if os.path.isdir(compressed_project_images_dir):
+        for fname in sorted(os.listdir(compressed_project_images_dir)):
+            stem, ext = os.path.splitext(fname)
+            if ext.lower() == '.webp' or (ext.lower() == '.avif' and stem not in compressed_by_stem):
+                compressed_by_stem[stem] = (os.path.join(compressed_project_images_dir, fname), ext)
+
+    # Directory listings of the destination project, read at most once per directory
+    dir_listings = {}
+    # Each distinct reference is resolved (and its files copied/removed) only once
+    resolved_refs = {}
+
+    def list_dir(directory):
+        if directory not in dir_listings:
+            dir_listings[directory] = os.listdir(directory) if os.path.isdir(directory) else []
+        return dir_listings[directory]
+
     # Function to replace image extension and copy the compressed image
     def replace_image_path(src):
         if not src or src.startswith(('http://', 'https://')):
             return src, False
+        if src not in resolved_refs:
+            resolved_refs[src] = resolve_image_path(src)
+        return resolved_refs[src]
 
+    def resolve_image_path(src):
         # Get the image filename (e.g., hero-slider-1.jpg)
         img_name = os.path.basename(src)
-        # Convert to WebP filename
-        webp_name = f"{Path(img_name).stem}.webp"
-        # Path to the compressed image
-        compressed_img_path = os.path.join(compressed_project_images_dir, webp_name)
-
-        if os.path.exists(compressed_img_path):
-            # Construct the new path by replacing the original extension with .webp
-            new_src = src.rsplit('.', 1)[0] + '.webp'
+        compressed_img_path, ext = compressed_by_stem.get(Path(img_name).stem, (None, None))
+        webp_name = f"{Path(img_name).stem}{ext}"
+
+        if compressed_img_path:
+            # Construct the new path by replacing the original extension with the compressed one
+            new_src = src.rsplit('.', 1)[0] + ext
             # Copy the compressed image to the destination project
             original_img_dir = os.path.dirname(os.path.join(dest_project_dir, src))
             new_img_path = os.path.join(original_img_dir, webp_name)
             os.makedirs(original_img_dir, exist_ok=True)
             shutil.copy2(compressed_img_path, new_img_path)
             print(f"Copied compressed image: {new_img_path}")
+            listing = list_dir(original_img_dir)
+            if webp_name not in listing:
+                listing.append(webp_name)
 
             # Remove the original image file if it exists
             original_img_base_dir = os.path.dirname(os.path.join(dest_project_dir, src))
             original_img_base_name = Path(img_name).stem
             original_removed = False
-            for fname in os.listdir(original_img_base_dir):
+            listing = list_dir(original_img_base_dir)
+            for fname in list(listing):
                 if fname.lower().startswith(original_img_base_name.lower()) and fname.lower().endswith(('.png', '.jpg', '.jpeg', '.gif', '.bmp')):
                     original_img_path = os.path.join(original_img_base_dir, fname)
                     if os.path.exists(original_img_path):
                         os.remove(original_img_path)
+                        listing.remove(fname)
                         print(f"Removed original image: {original_img_path}")
                         original_removed = True
             if not original_removed:
@@ -74,9 +101,23 @@ def replace_image_references(project_name, base_input_dir="original_sites", base
 
             return new_src, True
         else:
-            print(f"Compressed image not found: {compressed_img_path}")
+            print(f"Compressed image not found for: {img_name}")
             return src, False
 
+    css_url_pattern = re.compile(r'url\(([\'"]?)(.*?)\1\)')
+    js_image_pattern = re.compile(r'([\'"])([^\'"]+\.(?:png|jpg|jpeg|gif|bmp))\1')
+
+    # Rewrite every url(...) of a CSS text in a single pass
+    def rewrite_css_text(css_content, label):
+        def replace(match):
+            quote, src = match.group(1), match.group(2)
+            new_src, updated = replace_image_path(src)
+            if not updated:
+                return match.group(0)
+            print(f"Updated {label}: {src} to {new_src}")
+            return f"url({quote}{new_src}{quote})"
+        return css_url_pattern.sub(replace, css_content)
+
     # 1. Replace images in <img> tags
     for img in soup.find_all('img'):
         src = img.get('src')
@@ -122,51 +163,44 @@ def replace_image_references(project_name, base_input_dir="original_sites", base
     for style_tag in soup.find_all('style'):
         css_content = style_tag.string
         if css_content:
-            new_css_content = css_content
-            matches = re.findall(r'url\([\'"]?(.*?)[\'"]?\)', css_content)
-            for src in matches:
-                if not src.startswith(('http://', 'https://')):
-                    new_src, updated = replace_image_path(src)
-                    if updated:
-                        new_css_content = new_css_content.replace(src, new_src)
-                        print(f"Updated <style> tag: {src} to {new_src}")
-            style_tag.string = new_css_content
+            style_tag.string = rewrite_css_text(css_content, "<style> tag")
 
     # 6. Replace images in external CSS files
     css_links = soup.find_all('link', rel='stylesheet')
+    processed_files = set()
     for link in css_links:
         css_href = link.get('href')
         if css_href and not css_href.startswith(('http://', 'https://')):
             css_path = os.path.join(dest_project_dir, css_href)
-            if os.path.exists(css_path):
+            if os.path.exists(css_path) and css_path not in processed_files:
+                processed_files.add(css_path)
                 with open(css_path, 'r', encoding='utf-8') as css_file:
                     css_content = css_file.read()
-                new_css_content = css_content
-                matches = re.findall(r'url\([\'"]?(.*?)[\'"]?\)', css_content)
-                for src in matches:
-                    if not src.startswith(('http://', 'https://')):
-                        new_src, updated = replace_image_path(src)
-                        if updated:
-                            new_css_content = new_css_content.replace(src, new_src)
-                            print(f"Updated CSS file {css_path}: {src} to {new_src}")
-                with open(css_path, 'w', encoding='utf-8') as css_file:
-                    css_file.write(new_css_content)
+                new_css_content = rewrite_css_text(css_content, f"CSS file {css_path}")
+                if new_css_content != css_content:
+                    with open(css_path, 'w', encoding='utf-8') as css_file:
+                        css_file.write(new_css_content)
     # 7. 替换本地 JS 文件中的图片路径
     js_links = [tag.get('src') for tag in soup.find_all('script', src=True) if tag.get('src') and not tag['src'].startswith(('http://', 'https://'))]
     for js_href in js_links:
         js_path = os.path.join(dest_project_dir, js_href)
-        if os.path.exists(js_path):
+        if os.path.exists(js_path) and js_path not in processed_files:
+            processed_files.add(js_path)
             with open(js_path, 'r', encoding='utf-8') as js_file:
                 js_content = js_file.read()
-            new_js_content = js_content
-            matches = re.findall(r'[\'"]([^\'"]+\.(?:png|jpg|jpeg|gif|bmp))[\'"]', js_content)
-            for src in matches:
+
+            def replace_js(match):
+                quote, src = match.group(1), match.group(2)
                 new_src, updated = replace_image_path(src)
-                if updated:
-                    new_js_content = new_js_content.replace(src, new_src)
-                    print(f"Updated JS file {js_path}: {src} -> {new_src}")
-            with open(js_path, 'w', encoding='utf-8') as js_file:
-                js_file.write(new_js_content)
+                if not updated:
+                    return match.group(0)
+                print(f"Updated JS file {js_path}: {src} -> {new_src}")
+                return f"{quote}{new_src}{quote}"
+
+            new_js_content = js_image_pattern.sub(replace_js, js_content)
+            if new_js_content != js_content:
+                with open(js_path, 'w', encoding='utf-8') as js_file:
+                    js_file.write(new_js_content)
 
     # Save the modified HTML file
     with open(html_file, 'w', encoding='utf-8') as file:
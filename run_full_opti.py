@@ -1,5 +1,6 @@
 import os
 import sys
+import json
 import subprocess
 import time
 from pathlib import Path
@@ -9,7 +10,8 @@ PATHS_DIR = Path("C:/Users/user/Desktop/web_carbon/utils")
 sys.path.append(str(PATHS_DIR))
 
 # 导入 paths 模块中的路径变量
-from paths import PYTHON_SCRIPTS_DIR, WEBSITES_ORIGINAL_DIR
+from paths import PYTHON_SCRIPTS_DIR, WEBSITES_ORIGINAL_DIR, FULL_OPTI_DIR
+from results_store import ResultsStore
 
 # 设置 PYTHONUTF8 环境变量以支持 UTF-8 编码
 os.environ["PYTHONUTF8"] = "1"
@@ -22,6 +24,9 @@ TASKS = ["html", "css", "js", "image"]
 # 每个任务的子脚本后缀
 SUB_SCRIPT_SUFFIXES = ["extract", "get_llm_suggestions", "optimize", "replace"]
 
+# 所有任务完成后，在最终站点目录上依次运行的收尾阶段脚本（run_full_actions 下的文件名，不含 .py）
+FINAL_STAGES = ["svg_optimize", "icon_sprite", "media_optimize", "inline_assets", "precompress"]
+
 # --- 辅助函数 ---
 def get_available_projects():
     """从 websites_original 文件夹中获取所有项目名（子文件夹名）"""
@@ -47,7 +52,10 @@ def prompt_project_selection(projects):
 
 def run_script(task, script_suffix, project_name):
     """运行指定任务的子脚本"""
-    script_name = f"{task}_{script_suffix}.py"
+    return run_stage_script(f"{task}_{script_suffix}.py", project_name)
+
+def run_stage_script(script_name, project_name):
+    """运行 run_full_actions 下的指定脚本"""
     script_path = PYTHON_SCRIPTS_DIR / "run_full_actions" / script_name
     if not os.path.exists(script_path):
         print(f"Error: Script '{script_path}' does not exist")
@@ -74,6 +82,26 @@ def run_script(task, script_suffix, project_name):
         print(f"Error: Unknown error occurred while executing '{script_name}': {e}")
         return False
 
+def record_optimization_reports(project_name):
+    """把各阶段写在 temp/<project> 下的 JSON 优化报告逐条追加到结果库"""
+    temp_dir = FULL_OPTI_DIR / "temp" / project_name
+    with ResultsStore() as store:
+        run_id = store.start_run("optimize", {"project": project_name, "tasks": TASKS, "final_stages": FINAL_STAGES})
+        total_rows = 0
+        for root, _, files in os.walk(temp_dir):
+            for name in sorted(files):
+                if not name.endswith("report.json"):
+                    continue
+                report_path = os.path.join(root, name)
+                # 以报告相对 temp/<project> 的路径作为阶段名，例如 css/optimization_report/css_optimization_report
+                stage = os.path.splitext(os.path.relpath(report_path, temp_dir))[0].replace(os.sep, "/")
+                try:
+                    with open(report_path, "r", encoding="utf-8") as f:
+                        total_rows += store.record_optimization_report(run_id, project_name, stage, json.load(f))
+                except Exception as e:
+                    print(f"Warning: Failed to record report '{report_path}': {e}")
+    print(f"Recorded {total_rows} optimization report rows as run {run_id}")
+
 # --- 主逻辑 ---
 def main():
     # 获取可用项目
@@ -102,6 +130,16 @@ def main():
         else:
             print(f"\n[{time.strftime('%Y-%m-%d %H:%M:%S NZST')}] Some scripts for task '{task}' failed, please check the error messages above.")
 
+    for stage in FINAL_STAGES:
+        print(f"\nProcessing final stage: {stage}")
+        if run_stage_script(f"{stage}.py", project_name):
+            print(f"Success: '{stage}.py' completed")
+        else:
+            print(f"Warning: '{stage}.py' failed, the site keeps the output of the previous stages")
+        time.sleep(1)
+
+    record_optimization_reports(project_name)
+
     print(f"\n[{time.strftime('%Y-%m-%d %H:%M:%S NZST')}] All tasks completed for project '{project_name}'!")
 
 if __name__ == "__main__":
@@ -0,0 +1,103 @@
+import readline from "readline";
+import lighthouse from "lighthouse";
+import * as chromeLauncher from "chrome-launcher";
+import puppeteer from "puppeteer-core";
+
+// 常驻测量进程：Chrome 只启动一次，每次测量在新的无痕上下文中运行 Lighthouse。
+// 协议：启动后 stdout 输出 {"ready", "port", "pid"}（Chrome 的调试端口与进程号）；
+// stdin 每行一个 JSON 请求 {"id", "url", "settings"}（settings 为节流与设备模拟配置），stdout 每行一个 JSON 响应 {"id", "report"} 或 {"id", "error"}。
+// 依赖 lighthouse、chrome-launcher、puppeteer-core（项目根目录 npm install，见 package.json）。
+// 用法：node lighthouse_warm.mjs [调试端口] [user-data-dir]
+
+const AUDITS = [
+  "total-byte-weight",
+  "first-contentful-paint",
+  "largest-contentful-paint",
+  "interactive",
+  "speed-index",
+];
+
+const port = Number(process.argv[2] || 0);
+const userDataDir = process.argv[3] || false;
+
+function send(message) {
+  process.stdout.write(JSON.stringify(message) + "\n");
+}
+
+async function newContext(browser) {
+  // puppeteer 22 起改名为 createBrowserContext
+  if (typeof browser.createBrowserContext === "function") {
+    return browser.createBrowserContext();
+  }
+  return browser.createIncognitoBrowserContext();
+}
+
+async function measure(browser, url, settings) {
+  const context = await newContext(browser);
+  try {
+    const page = await context.newPage();
+    const result = await lighthouse(
+      url,
+      { output: "json", onlyCategories: ["performance"], disableStorageReset: true, logLevel: "error", ...settings },
+      undefined,
+      page
+    );
+    const lhr = result.lhr;
+    const audits = {};
+    for (const id of AUDITS) {
+      audits[id] = { numericValue: lhr.audits[id] ? lhr.audits[id].numericValue : null };
+    }
+    // 按资源类型统计只需要每个请求的地址、类型与传输大小
+    const requests = lhr.audits["network-requests"];
+    if (requests && requests.details) {
+      audits["network-requests"] = {
+        details: {
+          items: requests.details.items.map((item) => ({
+            url: item.url,
+            resourceType: item.resourceType,
+            transferSize: item.transferSize,
+          })),
+        },
+      };
+    }
+    return {
+      finalDisplayedUrl: lhr.finalDisplayedUrl || lhr.finalUrl,
+      audits,
+      categories: { performance: { score: lhr.categories.performance.score } },
+    };
+  } finally {
+    await context.close();
+  }
+}
+
+async function main() {
+  const chrome = await chromeLauncher.launch({
+    port: port || undefined,
+    userDataDir,
+    chromeFlags: ["--headless", "--disable-gpu", "--no-sandbox", "--no-zygote"],
+  });
+  const browser = await puppeteer.connect({ browserURL: `http://127.0.0.1:${chrome.port}`, defaultViewport: null });
+  send({ ready: true, port: chrome.port, pid: chrome.pid });
+
+  const rl = readline.createInterface({ input: process.stdin });
+  for await (const line of rl) {
+    if (!line.trim()) continue;
+    const request = JSON.parse(line);
+    if (request.command === "close") break;
+    const started = Date.now();
+    try {
+      const report = await measure(browser, request.url, request.settings || {});
+      send({ id: request.id, report, elapsed_ms: Date.now() - started });
+    } catch (err) {
+      send({ id: request.id, error: String(err && err.stack ? err.stack : err) });
+    }
+  }
+
+  await browser.disconnect();
+  await chrome.kill();
+}
+
+main().catch((err) => {
+  send({ ready: false, error: String(err && err.stack ? err.stack : err) });
+  process.exit(1);
+});
@@ -0,0 +1,84 @@
+import os
+import sys
+import json
+import shutil
+import tempfile
+import subprocess
+import numpy as np
+
+# --- 碳排放模型 ---
+# 与 scripts/compute_emission.mjs 中 calculateCarbonEmissions 相同的公式，直接在 NumPy 数组上计算：
+#   数据传输: bytes / 1024^3 × 每 GB 能耗 (kWh) × 电网碳强度 (g/kWh)
+#   用户设备: 设备功率 (kW) × 停留时间 (h) × 电网碳强度
+# 运算顺序与 .mjs 保持一致，float64 结果与 Node 输出逐位相同。
+
+DEFAULT_ENERGY_PER_GB_KWH = 0.055 + 0.059
+DEFAULT_CARBON_INTENSITY_G_PER_KWH = 494
+DEFAULT_DEVICE_POWER_KW = 0.076
+DEFAULT_DWELL_SECONDS = 50
+
+COMPUTE_EMISSION_SCRIPT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "scripts", "compute_emission.mjs")
+
+
+def data_transfer_emissions(total_bytes, energy_per_gb=DEFAULT_ENERGY_PER_GB_KWH,
+                            carbon_intensity=DEFAULT_CARBON_INTENSITY_G_PER_KWH):
+    """传输 total_bytes 产生的碳排放（g）。参数可以是标量或可广播的数组。"""
+    bytes_to_gb = np.asarray(total_bytes, dtype=np.float64) / 1024 ** 3
+    return bytes_to_gb * energy_per_gb * carbon_intensity
+
+
+def device_emissions(device_power=DEFAULT_DEVICE_POWER_KW, dwell_seconds=DEFAULT_DWELL_SECONDS,
+                     carbon_intensity=DEFAULT_CARBON_INTENSITY_G_PER_KWH):
+    """用户设备在停留时间内的碳排放（g），与页面大小无关。"""
+    user_time_hours = np.asarray(dwell_seconds, dtype=np.float64) / 3600
+    return device_power * user_time_hours * carbon_intensity
+
+
+def carbon_emissions(total_bytes, energy_per_gb=DEFAULT_ENERGY_PER_GB_KWH,
+                     carbon_intensity=DEFAULT_CARBON_INTENSITY_G_PER_KWH,
+                     device_power=DEFAULT_DEVICE_POWER_KW, dwell_seconds=DEFAULT_DWELL_SECONDS):
+    """
+    单次页面访问的碳排放（g）。total_bytes 可以是任意形状的数组（例如 站点 × 运行 × 前/后），
+    其他参数可以是标量或可与之广播的数组，返回 float64 数组（标量输入返回 0 维数组）。
+    """
+    return (data_transfer_emissions(total_bytes, energy_per_gb, carbon_intensity)
+            + device_emissions(device_power, dwell_seconds, carbon_intensity))
+
+
+def node_carbon_emissions(total_bytes):
+    """
+    在临时目录中运行原始的 compute_emission.mjs，返回其输出，用于与本模块核对。
+    使用临时目录避免与正在运行的报告争用 data/ 下的共享文件。
+    """
+    with tempfile.TemporaryDirectory() as work_dir:
+        os.makedirs(os.path.join(work_dir, "scripts"))
+        os.makedirs(os.path.join(work_dir, "data"))
+        script = os.path.join(work_dir, "scripts", "compute_emission.mjs")
+        shutil.copyfile(COMPUTE_EMISSION_SCRIPT, script)
+        with open(os.path.join(work_dir, "data", "lh_data_got.json"), "w", encoding="utf-8") as f:
+            json.dump({"total_byte_weight": total_bytes}, f)
+        subprocess.run(["node", script], capture_output=True, check=True, timeout=30)
+        with open(os.path.join(work_dir, "data", "carbon_emission.json"), "r", encoding="utf-8") as f:
+            return json.load(f)["carbon_emissions"]
+
+
+def check_parity(byte_weights):
+    """逐个比较 Node 与 NumPy 的结果，返回 [(字节数, node 结果, python 结果)] 中不一致的项。"""
+    python_values = carbon_emissions(byte_weights)
+    mismatches = []
+    for total_bytes, python_value in zip(byte_weights, python_values):
+        node_value = node_carbon_emissions(total_bytes)
+        if node_value != float(python_value):
+            mismatches.append((total_bytes, node_value, float(python_value)))
+    return mismatches
+
+
+if __name__ == "__main__":
+    # 与 compute_emission.mjs 的一致性自检：python carbon_model.py
+    samples = [1, 1024, 460_000, 1_234_567.8, 3_141_592.65, 25_000_000, 2.5e9]
+    mismatches = check_parity(samples)
+    if mismatches:
+        for total_bytes, node_value, python_value in mismatches:
+            print(f"不一致: {total_bytes} 字节 → node {node_value!r}，python {python_value!r}")
+        sys.exit(1)
+    print(f"{len(samples)} 个样本与 compute_emission.mjs 的输出完全一致")
@@ -0,0 +1,101 @@
+import os
+import json
+import numpy as np
+
+from carbon_model import (carbon_emissions, DEFAULT_ENERGY_PER_GB_KWH, DEFAULT_CARBON_INTENSITY_G_PER_KWH,
+                          DEFAULT_DEVICE_POWER_KW, DEFAULT_DWELL_SECONDS)
+
+# --- 碳排放估算的不确定性 ---
+# carbon_model 中的四个参数都是点估计。这里按给定分布对参数做蒙特卡洛抽样，所有站点、优化前后一次性广播计算，
+# 得到均值与百分位区间。同一次抽样同时用于优化前后（配对抽样），因此减排量的区间只反映传输部分的不确定性。
+
+MC_SAMPLES = int(os.getenv("CARBON_MC_SAMPLES", "20000"))
+MC_SEED = int(os.getenv("CARBON_MC_SEED", "0"))
+PERCENTILES = (5, 50, 95)
+# JSON 文件，格式与 DEFAULT_DISTRIBUTIONS 相同，可只覆盖部分参数
+DISTRIBUTIONS_FILE = os.getenv("CARBON_DISTRIBUTIONS_FILE")
+
+# 每个参数的分布：
+#   triangular: low / mode / high      normal: mean / std（截断在 min 以上）
+#   lognormal: median / sigma          uniform: low / high
+DEFAULT_DISTRIBUTIONS = {
+    # 网络传输能耗各研究差异很大，取点估计为众数的偏右三角分布
+    "energy_per_gb": {"type": "triangular", "low": 0.05, "mode": DEFAULT_ENERGY_PER_GB_KWH, "high": 0.2},
+    "carbon_intensity": {"type": "normal", "mean": DEFAULT_CARBON_INTENSITY_G_PER_KWH, "std": 60, "min": 0},
+    # 从手机到台式机的功率范围
+    "device_power": {"type": "triangular", "low": 0.01, "mode": DEFAULT_DEVICE_POWER_KW, "high": 0.12},
+    # 停留时间右偏，中位数为点估计
+    "dwell_seconds": {"type": "lognormal", "median": DEFAULT_DWELL_SECONDS, "sigma": 0.5},
+}
+
+
+def load_distributions(path=DISTRIBUTIONS_FILE):
+    distributions = {name: dict(spec) for name, spec in DEFAULT_DISTRIBUTIONS.items()}
+    if path:
+        with open(path, "r", encoding="utf-8") as f:
+            overrides = json.load(f)
+        unknown = set(overrides) - set(distributions)
+        if unknown:
+            raise ValueError(f"未知的碳排放参数: {', '.join(sorted(unknown))}")
+        distributions.update(overrides)
+    return distributions
+
+
+def draw(spec, size, rng):
+    kind = spec["type"]
+    if kind == "triangular":
+        return rng.triangular(spec["low"], spec["mode"], spec["high"], size)
+    if kind == "normal":
+        return np.maximum(rng.normal(spec["mean"], spec["std"], size), spec.get("min", -np.inf))
+    if kind == "lognormal":
+        return rng.lognormal(np.log(spec["median"]), spec["sigma"], size)
+    if kind == "uniform":
+        return rng.uniform(spec["low"], spec["high"], size)
+    if kind == "fixed":
+        return np.full(size, float(spec["value"]))
+    raise ValueError(f"不支持的分布类型: {kind}")
+
+
+def sample_parameters(samples=MC_SAMPLES, seed=MC_SEED, distributions=None):
+    """返回 {参数名: 形状为 (samples,) 的数组}。固定 seed 使同一输入的结果可复现。"""
+    rng = np.random.default_rng(seed)
+    distributions = distributions or load_distributions()
+    return {name: draw(distributions[name], samples, rng) for name in DEFAULT_DISTRIBUTIONS}
+
+
+def band(values):
+    """沿抽样维度（第 0 维）求均值与 PERCENTILES 百分位。"""
+    result = {"mean": values.mean(axis=0)}
+    for p, value in zip(PERCENTILES, np.percentile(values, PERCENTILES, axis=0)):
+        result[f"p{p}"] = value
+    return result
+
+
+def carbon_bands(before_bytes, after_bytes, samples=MC_SAMPLES, seed=MC_SEED, distributions=None):
+    """
+    before_bytes / after_bytes 为等长的一维数组（每个站点一个值）。
+    返回 {"before" | "after" | "reduction": {"mean", "p5", "p50", "p95": 每个站点一个值的数组}}。
+    """
+    page_bytes = np.stack([np.asarray(before_bytes, dtype=np.float64), np.asarray(after_bytes, dtype=np.float64)], axis=-1)
+    params = {name: values[:, None, None] for name, values in sample_parameters(samples, seed, distributions).items()}
+    # (抽样, 站点, 前/后)
+    emissions = carbon_emissions(page_bytes, params["energy_per_gb"], params["carbon_intensity"],
+                                 params["device_power"], params["dwell_seconds"])
+    return {
+        "before": band(emissions[..., 0]),
+        "after": band(emissions[..., 1]),
+        "reduction": band(emissions[..., 0] - emissions[..., 1]),
+    }
+
+
+def band_columns(bands, index, digits=4):
+    """把一个站点的区间展开为 [before mean, p5, p50, p95, after ..., reduction ...]，用于写 CSV。"""
+    return [round(float(bands[group][stat][index]), digits)
+            for group in ("before", "after", "reduction")
+            for stat in ["mean"] + [f"p{p}" for p in PERCENTILES]]
+
+
+def band_header(unit="g"):
+    return [f"CO2 {group.capitalize()} {stat} ({unit})"
+            for group in ("before", "after", "reduction")
+            for stat in ["Mean"] + [f"P{p}" for p in PERCENTILES]]
@@ -0,0 +1,146 @@
+import os
+import json
+import shutil
+import hashlib
+import urllib.request
+import urllib.error
+from concurrent.futures import ThreadPoolExecutor
+
+from paths import IMAGE_CACHE_DIR
+
+# --- 远程资源下载缓存 ---
+# 远程图片通过有界线程池并发下载，按 URL 缓存在磁盘上，并利用 ETag / Last-Modified 做条件请求。
+# 离线模式下只从缓存读取，不发起任何网络请求。
+
+HTTP_CACHE_DIR = os.path.join(IMAGE_CACHE_DIR, "http")
+DEFAULT_CONNECT_TIMEOUT = 5    # 秒
+DEFAULT_READ_TIMEOUT = 20      # 秒
+DEFAULT_MAX_BYTES = 20 * 1024 * 1024  # 单个资源大小上限
+DEFAULT_MAX_WORKERS = 8
+USER_AGENT = "NWCE-WebCarbon/1.0"
+
+
+class FetchError(Exception):
+    pass
+
+
+class CachedFetcher:
+    """
+    带磁盘缓存的远程资源下载器。
+    缓存目录中每个 URL 对应 <sha1>.body 与 <sha1>.json（保存 ETag、Last-Modified 等响应头）。
+    """
+
+    def __init__(self, cache_dir=HTTP_CACHE_DIR, connect_timeout=DEFAULT_CONNECT_TIMEOUT,
+                 read_timeout=DEFAULT_READ_TIMEOUT, max_bytes=DEFAULT_MAX_BYTES, offline=False):
+        self.cache_dir = cache_dir
+        self.connect_timeout = connect_timeout
+        self.read_timeout = read_timeout
+        self.max_bytes = max_bytes
+        self.offline = offline
+        os.makedirs(cache_dir, exist_ok=True)
+
+    def _cache_paths(self, url):
+        key = hashlib.sha1(url.encode("utf-8")).hexdigest()
+        return os.path.join(self.cache_dir, f"{key}.body"), os.path.join(self.cache_dir, f"{key}.json")
+
+    def _load_meta(self, meta_path):
+        try:
+            with open(meta_path, "r", encoding="utf-8") as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return None
+
+    def fetch(self, url, output_path):
+        """
+        下载 url 到 output_path，返回状态字符串：
+        'downloaded'（新下载）、'not-modified'（304，使用缓存）、'cache'（离线模式读取缓存）。
+        失败时抛出 FetchError。
+        """
+        body_path, meta_path = self._cache_paths(url)
+        meta = self._load_meta(meta_path) if os.path.exists(body_path) else None
+
+        if self.offline:
+            if meta is None:
+                raise FetchError(f"离线模式下缓存未命中: {url}")
+            shutil.copyfile(body_path, output_path)
+            return "cache"
+
+        request = urllib.request.Request(url, headers={"User-Agent": USER_AGENT})
+        if meta:
+            if meta.get("etag"):
+                request.add_header("If-None-Match", meta["etag"])
+            if meta.get("last_modified"):
+                request.add_header("If-Modified-Since", meta["last_modified"])
+
+        try:
+            # urlopen 的 timeout 用于建立连接，读取阶段再把 socket 超时调整为 read_timeout
+            response = urllib.request.urlopen(request, timeout=self.connect_timeout)
+        except urllib.error.HTTPError as e:
+            if e.code == 304 and meta is not None:
+                shutil.copyfile(body_path, output_path)
+                return "not-modified"
+            raise FetchError(f"HTTP {e.code}: {url}") from e
+        except (urllib.error.URLError, OSError) as e:
+            raise FetchError(f"连接失败 {url}: {e}") from e
+
+        with response:
+            self._set_read_timeout(response)
+            declared_length = response.headers.get("Content-Length")
+            if declared_length and declared_length.isdigit() and int(declared_length) > self.max_bytes:
+                raise FetchError(f"资源大小 {declared_length} 字节超过上限 {self.max_bytes}: {url}")
+
+            tmp_path = f"{body_path}.{os.getpid()}.part"
+            received = 0
+            try:
+                with open(tmp_path, "wb") as f:
+                    while True:
+                        chunk = response.read(64 * 1024)
+                        if not chunk:
+                            break
+                        received += len(chunk)
+                        if received > self.max_bytes:
+                            raise FetchError(f"资源超过大小上限 {self.max_bytes} 字节: {url}")
+                        f.write(chunk)
+            except (OSError, FetchError) as e:
+                if os.path.exists(tmp_path):
+                    os.remove(tmp_path)
+                if isinstance(e, FetchError):
+                    raise
+                raise FetchError(f"读取失败 {url}: {e}") from e
+
+            os.replace(tmp_path, body_path)
+            with open(meta_path, "w", encoding="utf-8") as f:
+                json.dump({
+                    "url": url,
+                    "etag": response.headers.get("ETag"),
+                    "last_modified": response.headers.get("Last-Modified"),
+                    "content_type": response.headers.get("Content-Type"),
+                    "size": received,
+                }, f, indent=2)
+
+        shutil.copyfile(body_path, output_path)
+        return "downloaded"
+
+    def _set_read_timeout(self, response):
+        sock = getattr(getattr(getattr(response, "fp", None), "raw", None), "_sock", None)
+        if sock is not None:
+            try:
+                sock.settimeout(self.read_timeout)
+            except OSError:
+                pass
+
+    def fetch_many(self, jobs, max_workers=DEFAULT_MAX_WORKERS):
+        """
+        并发下载 [(url, output_path), ...]，按输入顺序返回 [(url, output_path, status, error), ...]。
+        """
+        def run(job):
+            url, output_path = job
+            try:
+                return url, output_path, self.fetch(url, output_path), None
+            except FetchError as e:
+                return url, output_path, "failed", str(e)
+
+        if not jobs:
+            return []
+        with ThreadPoolExecutor(max_workers=max(1, min(max_workers, len(jobs)))) as executor:
+            return list(executor.map(run, jobs))
@@ -0,0 +1,242 @@
+import os
+import sys
+import csv
+import json
+import shutil
+import hashlib
+import threading
+import numpy as np
+from PIL import Image
+
+from paths import IMAGE_CACHE_DIR, WEBSITES_ORIGINAL_DIR
+
+# --- 跨站点图片索引 ---
+# 以内容哈希（sha256）识别完全相同的图片，以感知哈希（dHash/pHash）发现近似重复的图片。
+# 相同图片的 LLM 建议和优化结果只生成一次，之后在所有站点间复用。
+
+INDEX_FILE = os.path.join(IMAGE_CACHE_DIR, "image_index.json")
+OPTIMIZED_CACHE_DIR = os.path.join(IMAGE_CACHE_DIR, "optimized")
+NEAR_DUPLICATES_CSV = os.path.join(IMAGE_CACHE_DIR, "near_duplicates.csv")
+EXACT_DUPLICATES_CSV = os.path.join(IMAGE_CACHE_DIR, "exact_duplicates.csv")
+
+RASTER_EXTENSIONS = (".png", ".jpg", ".jpeg", ".gif", ".bmp", ".webp", ".avif")
+# 近似重复判定阈值（64 位哈希的汉明距离）
+NEAR_DUPLICATE_MAX_DISTANCE = 6
+
+# 8x8 pHash 使用的 32 点 DCT-II 矩阵
+_DCT_SIZE = 32
+_DCT_MATRIX = np.cos(np.pi / _DCT_SIZE * (np.arange(_DCT_SIZE)[:, None]) * (np.arange(_DCT_SIZE)[None, :] + 0.5))
+
+
+def content_hash(path, chunk_size=1024 * 1024):
+    """文件内容的 sha256。"""
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(chunk_size), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def _bits_to_hex(bits):
+    value = 0
+    for bit in bits.flatten():
+        value = (value << 1) | int(bit)
+    return f"{value:016x}"
+
+
+def dhash(img):
+    """差异哈希：比较 9x8 灰度图中相邻像素的明暗。"""
+    small = np.asarray(img.convert("L").resize((9, 8), Image.LANCZOS), dtype=np.int16)
+    return _bits_to_hex(small[:, 1:] > small[:, :-1])
+
+
+def phash(img):
+    """感知哈希：32x32 灰度图 DCT 的低频 8x8 系数与中位数比较。"""
+    small = np.asarray(img.convert("L").resize((_DCT_SIZE, _DCT_SIZE), Image.LANCZOS), dtype=np.float64)
+    dct = _DCT_MATRIX @ small @ _DCT_MATRIX.T
+    low = dct[:8, :8].flatten()
+    return _bits_to_hex(low > np.median(low[1:]))
+
+
+def hamming(hex_a, hex_b):
+    return bin(int(hex_a, 16) ^ int(hex_b, 16)).count("1")
+
+
+def params_key(llm_suggestion, extra=None):
+    """优化参数的稳定短哈希，相同图片 + 相同参数才复用优化结果。"""
+    payload = json.dumps({"suggestion": llm_suggestion, "extra": extra}, sort_keys=True, ensure_ascii=False)
+    return hashlib.sha1(payload.encode("utf-8")).hexdigest()[:12]
+
+
+class ImageIndex:
+    """
+    基于 JSON 文件的图片索引：{sha256: {dhash, phash, width, height, format, paths, llm_suggestions}}。
+    另外按 (路径, 大小, 修改时间) 缓存 sha256，避免重复读取未变化的文件。
+    """
+
+    def __init__(self, index_file=INDEX_FILE):
+        self.index_file = index_file
+        self.images = {}
+        self.files = {}
+        if os.path.exists(index_file):
+            try:
+                with open(index_file, "r", encoding="utf-8") as f:
+                    data = json.load(f)
+                self.images = data.get("images", {})
+                self.files = data.get("files", {})
+            except Exception as e:
+                print(f"警告: 图片索引 '{index_file}' 读取失败，将重新建立: {e}")
+
+    def save(self):
+        os.makedirs(os.path.dirname(self.index_file), exist_ok=True)
+        tmp_file = f"{self.index_file}.tmp"
+        with open(tmp_file, "w", encoding="utf-8") as f:
+            json.dump({"images": self.images, "files": self.files}, f, indent=2, ensure_ascii=False)
+        os.replace(tmp_file, self.index_file)
+
+    def hash_file(self, path):
+        path = os.path.abspath(path)
+        stat = os.stat(path)
+        cached = self.files.get(path)
+        if cached and cached["size"] == stat.st_size and cached["mtime"] == stat.st_mtime:
+            return cached["sha256"]
+        sha = content_hash(path)
+        self.files[path] = {"size": stat.st_size, "mtime": stat.st_mtime, "sha256": sha}
+        return sha
+
+    def add(self, path):
+        """登记一张图片并返回 (sha256, entry)；已知内容不会重新计算感知哈希。"""
+        sha = self.hash_file(path)
+        entry = self.images.get(sha)
+        if entry is None:
+            entry = {"paths": []}
+            try:
+                with Image.open(path) as img:
+                    entry.update({
+                        "dhash": dhash(img),
+                        "phash": phash(img),
+                        "width": img.width,
+                        "height": img.height,
+                        "format": img.format,
+                    })
+            except Exception as e:
+                entry["error"] = str(e)
+            self.images[sha] = entry
+        abs_path = os.path.abspath(path)
+        if abs_path not in entry["paths"]:
+            entry["paths"].append(abs_path)
+        return sha, entry
+
+    # --- LLM 建议复用（按模型区分，不同流水线使用的模型和提示词不同） ---
+    def get_suggestion(self, sha, model):
+        return self.images.get(sha, {}).get("llm_suggestions", {}).get(model)
+
+    def set_suggestion(self, sha, model, llm_suggestion):
+        if sha in self.images:
+            self.images[sha].setdefault("llm_suggestions", {})[model] = llm_suggestion
+
+    # --- 去重报告 ---
+    def exact_duplicates(self):
+        return {sha: entry["paths"] for sha, entry in self.images.items() if len(entry.get("paths", [])) > 1}
+
+    def near_duplicates(self, max_distance=NEAR_DUPLICATE_MAX_DISTANCE):
+        """内容不同但 dHash 与 pHash 距离都不超过阈值的图片对。"""
+        shas = [sha for sha, entry in self.images.items() if "dhash" in entry]
+        if len(shas) < 2:
+            return []
+        dhashes = np.array([int(self.images[s]["dhash"], 16) for s in shas], dtype=np.uint64)
+        phashes = np.array([int(self.images[s]["phash"], 16) for s in shas], dtype=np.uint64)
+
+        def popcount(values):
+            return np.unpackbits(values.view(np.uint8).reshape(-1, 8), axis=1).sum(axis=1)
+
+        pairs = []
+        for i in range(len(shas) - 1):
+            d_dist = popcount(dhashes[i] ^ dhashes[i + 1:])
+            p_dist = popcount(phashes[i] ^ phashes[i + 1:])
+            for offset in np.nonzero((d_dist <= max_distance) & (p_dist <= max_distance))[0]:
+                j = i + 1 + int(offset)
+                pairs.append((shas[i], shas[j], int(d_dist[offset]), int(p_dist[offset])))
+        return pairs
+
+
+# --- 优化结果缓存 ---
+def cached_output_path(sha, key, extension):
+    return os.path.join(OPTIMIZED_CACHE_DIR, f"{sha}_{key}.{extension}")
+
+
+def store_output(sha, key, output_path, meta=None):
+    """将优化结果（及其报告字段）存入共享缓存，供其他站点的相同图片直接复用。"""
+    extension = os.path.splitext(output_path)[1].lstrip(".")
+    target = cached_output_path(sha, key, extension)
+    os.makedirs(OPTIMIZED_CACHE_DIR, exist_ok=True)
+    if not os.path.exists(target):
+        # 多个站点可能同时写同一条缓存：先写临时文件再 os.replace，且报告字段先于图片就位，
+        # find_cached_output 看到图片时其 .json 一定已完整
+        suffix = f".{os.getpid()}-{threading.get_ident()}.tmp"
+        with open(f"{target}.json{suffix}", "w", encoding="utf-8") as f:
+            json.dump(meta or {}, f, indent=2, ensure_ascii=False)
+        os.replace(f"{target}.json{suffix}", f"{target}.json")
+        shutil.copy2(output_path, f"{target}{suffix}")
+        os.replace(f"{target}{suffix}", target)
+    return target
+
+
+def find_cached_output(sha, key, extension):
+    """返回 (缓存文件路径, 报告字段)，未命中时返回 (None, None)。"""
+    path = cached_output_path(sha, key, extension)
+    if not os.path.exists(path):
+        return None, None
+    meta = {}
+    if os.path.exists(f"{path}.json"):
+        try:
+            with open(f"{path}.json", "r", encoding="utf-8") as f:
+                meta = json.load(f)
+        except Exception:
+            meta = {}
+    return path, meta
+
+
+def scan_sites(websites_dir=WEBSITES_ORIGINAL_DIR, index=None):
+    """遍历所有站点的位图并登记到索引。"""
+    index = index or ImageIndex()
+    total_files = 0
+    for root, _, files in os.walk(websites_dir):
+        for name in files:
+            if name.lower().endswith(RASTER_EXTENSIONS):
+                index.add(os.path.join(root, name))
+                total_files += 1
+    return index, total_files
+
+
+def write_duplicate_reports(index, max_distance=NEAR_DUPLICATE_MAX_DISTANCE):
+    os.makedirs(IMAGE_CACHE_DIR, exist_ok=True)
+    exact = index.exact_duplicates()
+    with open(EXACT_DUPLICATES_CSV, "w", newline="", encoding="utf-8") as f:
+        writer = csv.writer(f)
+        writer.writerow(["sha256", "copies", "paths"])
+        for sha, paths in sorted(exact.items(), key=lambda item: -len(item[1])):
+            writer.writerow([sha, len(paths), " | ".join(paths)])
+
+    near = index.near_duplicates(max_distance)
+    with open(NEAR_DUPLICATES_CSV, "w", newline="", encoding="utf-8") as f:
+        writer = csv.writer(f)
+        writer.writerow(["path_a", "path_b", "dhash_distance", "phash_distance", "size_a", "size_b"])
+        for sha_a, sha_b, d_dist, p_dist in near:
+            entry_a, entry_b = index.images[sha_a], index.images[sha_b]
+            writer.writerow([
+                entry_a["paths"][0], entry_b["paths"][0], d_dist, p_dist,
+                f"{entry_a.get('width')}x{entry_a.get('height')}", f"{entry_b.get('width')}x{entry_b.get('height')}"
+            ])
+    return exact, near
+
+
+if __name__ == "__main__":
+    websites_dir = sys.argv[1] if len(sys.argv) > 1 else WEBSITES_ORIGINAL_DIR
+    print(f"开始建立图片索引: {websites_dir}")
+    image_index, total = scan_sites(websites_dir)
+    image_index.save()
+    exact_groups, near_pairs = write_duplicate_reports(image_index)
+    print(f"共扫描 {total} 个图片文件，唯一内容 {len(image_index.images)} 个")
+    print(f"完全相同的图片组: {len(exact_groups)}，已保存到 {EXACT_DUPLICATES_CSV}")
+    print(f"近似重复候选: {len(near_pairs)} 对，已保存到 {NEAR_DUPLICATES_CSV}")
@@ -0,0 +1,192 @@
+import os
+import time
+import multiprocessing
+from multiprocessing.connection import wait
+
+# --- 默认配置 ---
+# 单个 worker 允许 ImageMagick 使用的内存上限（与原串行版本的 1GB 保持一致）
+DEFAULT_WORKER_MEMORY_BYTES = 1024 * 1024 * 1024
+# 所有 worker 合计的内存预算，决定进程池的最大规模
+DEFAULT_MEMORY_BUDGET_BYTES = 4 * 1024 * 1024 * 1024
+# 单张图片的超时时间（秒）
+DEFAULT_PER_IMAGE_TIMEOUT = 180
+# 轮询间隔（秒），用于检查超时和刷新吞吐量
+POLL_INTERVAL = 0.5
+# 结束超时 worker 时等待其退出的时间（秒）
+TERMINATE_GRACE_SECONDS = 5
+
+
+def plan_pool_size(memory_budget_bytes=DEFAULT_MEMORY_BUDGET_BYTES,
+                   worker_memory_bytes=DEFAULT_WORKER_MEMORY_BYTES,
+                   max_workers=None):
+    """根据 CPU 核数和全局内存预算计算进程池大小。"""
+    cpu_workers = os.cpu_count() or 1
+    if max_workers:
+        cpu_workers = min(cpu_workers, max_workers)
+    memory_workers = max(1, int(memory_budget_bytes // max(1, worker_memory_bytes)))
+    return max(1, min(cpu_workers, memory_workers))
+
+
+def _worker_loop(worker, initializer, initargs, conn):
+    """
+    worker 进程主循环：从自己的管道逐个接收任务，开始时发送 ("start", key, 开始时间)，
+    结束时发送 ("done", key, 是否成功, 返回值或错误信息)。收到 None 或管道关闭时退出。
+    """
+    if initializer is not None:
+        initializer(*initargs)
+    while True:
+        try:
+            item = conn.recv()
+        except EOFError:
+            return
+        if item is None:
+            return
+        key, args = item
+        conn.send(("start", key, time.time()))
+        try:
+            outcome = (True, worker(*args))
+        except Exception as e:
+            outcome = (False, f"{type(e).__name__}: {e}")
+        conn.send(("done", key) + outcome)
+
+
+class _WorkerSlot:
+    """
+    进程池中的一个槽位，与主进程之间使用独占的管道。worker 超时或异常退出时结束该进程，
+    连同管道一起丢弃（被结束的进程可能正写到一半），在同一槽位用新管道启动新进程，不影响其他槽位。
+    """
+
+    def __init__(self, index, worker, initializer, initargs):
+        self.index = index
+        self._spawn_args = (worker, initializer, initargs)
+        self.process = None
+        self.conn = None
+        self.key = None
+        self.started_at = None
+        self.start()
+
+    def start(self):
+        self.conn, child_conn = multiprocessing.Pipe()
+        self.process = multiprocessing.Process(
+            target=_worker_loop, args=(*self._spawn_args, child_conn), daemon=True)
+        self.process.start()
+        # 主进程不再持有子进程一端，子进程退出后 self.conn 上会读到 EOF
+        child_conn.close()
+
+    def assign(self, key, args):
+        self.key, self.started_at = key, None
+        self.conn.send((key, args))
+
+    def release(self):
+        self.key = self.started_at = None
+
+    def replace(self):
+        """强制结束当前进程（放弃正在处理的任务）并启动新进程。"""
+        self.kill()
+        self.release()
+        self.start()
+
+    def kill(self):
+        if self.process.is_alive():
+            self.process.terminate()
+            self.process.join(TERMINATE_GRACE_SECONDS)
+            if self.process.is_alive():
+                self.process.kill()
+                self.process.join()
+        self.conn.close()
+
+    def close(self):
+        if self.process.is_alive():
+            try:
+                self.conn.send(None)
+            except OSError:
+                pass
+            self.process.join(TERMINATE_GRACE_SECONDS)
+        self.kill()
+
+
+def run_image_pool(tasks, worker, num_workers, timeout=DEFAULT_PER_IMAGE_TIMEOUT,
+                   initializer=None, initargs=(), label="图片"):
+    """
+    将图片任务分发到进程池执行，按提交顺序返回结果。
+
+    tasks 为 [(key, args_tuple), ...]，worker 必须是模块顶层函数（可被 pickle）。
+    返回 (results, errors)：results 为 {key: worker 返回值}，
+    errors 为 {key: 错误信息}，包含超时、worker 进程异常退出和 worker 内部未捕获的异常。
+    超时从 worker 上报开始处理该任务时开始计时；超时的 worker 被结束并替换，不再占用槽位。
+    """
+    results = {}
+    errors = {}
+    total = len(tasks)
+    if total == 0:
+        return results, errors
+
+    num_workers = max(1, min(num_workers, total))
+    print(f"调试: 启动进程池，worker 数: {num_workers}，{label}数: {total}，单张超时: {timeout}s")
+
+    start_time = time.perf_counter()
+    slots = [_WorkerSlot(index, worker, initializer, initargs) for index in range(num_workers)]
+    todo = list(reversed(tasks))
+    done_count = 0
+
+    def finish(slot, key, error=None):
+        nonlocal done_count
+        if error is not None:
+            errors[key] = error
+        slot.release()
+        done_count += 1
+
+    def fail(slot, message, error):
+        key = slot.key
+        print(message)
+        slot.replace()
+        finish(slot, key, error)
+
+    try:
+        while done_count < total:
+            for slot in slots:
+                if slot.key is None and todo:
+                    slot.assign(*todo.pop())
+
+            completed = False
+            by_conn = {slot.conn: slot for slot in slots if slot.key is not None}
+            for conn in wait(list(by_conn), timeout=POLL_INTERVAL):
+                slot = by_conn[conn]
+                try:
+                    message = conn.recv()
+                except (EOFError, OSError):
+                    # 子进程退出，管道另一端已关闭
+                    slot.process.join(TERMINATE_GRACE_SECONDS)
+                    exitcode = slot.process.exitcode
+                    fail(slot, f"    警告: worker {slot.index} 处理 {label} {slot.key} 时异常退出（退出码 {exitcode}），已替换",
+                         f"worker 进程异常退出（退出码 {exitcode}）")
+                    completed = True
+                    continue
+                if message[0] == "start":
+                    slot.started_at = message[2]
+                else:
+                    _, key, ok, value = message
+                    if ok:
+                        results[key] = value
+                    finish(slot, key, None if ok else value)
+                    completed = True
+
+            now = time.time()
+            for slot in slots:
+                if slot.key is not None and slot.started_at is not None and now - slot.started_at > timeout:
+                    fail(slot, f"    警告: {label} {slot.key} 处理超时，已结束并替换 worker {slot.index}",
+                         f"处理超时（超过 {timeout} 秒）")
+                    completed = True
+
+            if completed:
+                elapsed = time.perf_counter() - start_time
+                rate = done_count / elapsed if elapsed > 0 else 0.0
+                print(f"[进度] {done_count}/{total} 张{label}已完成，吞吐量 {rate:.2f} 张/秒")
+    finally:
+        for slot in slots:
+            slot.close()
+
+    elapsed = time.perf_counter() - start_time
+    rate = total / elapsed if elapsed > 0 else 0.0
+    print(f"调试: 进程池完成，共 {total} 张{label}，耗时 {elapsed:.2f}s，平均 {rate:.2f} 张/秒")
+    return {key: results[key] for key, _ in tasks if key in results}, errors
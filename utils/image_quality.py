@@ -0,0 +1,123 @@
+import numpy as np
+
+# --- 图像质量评估（纯 NumPy 实现） ---
+# 所有函数接收二维亮度数组（float，取值 0-255），用于快速比较优化前后的图像。
+
+# PSNR 上限：两张图完全一致时 MSE 为 0，用固定值代替无穷大，便于写入 JSON/CSV
+PSNR_CAP = 100.0
+# 质量评估时亮度图的最长边，降采样后计算可显著减少耗时
+DEFAULT_MAX_SIDE = 256
+# quality_score 支持的指标名
+QUALITY_METRICS = ("ssim", "ms-ssim", "psnr")
+
+
+def rgb_to_luma(rgb):
+    """将 HxWx3 的 RGB 数组转换为 BT.601 亮度。"""
+    rgb = np.asarray(rgb, dtype=np.float64)
+    return rgb[..., 0] * 0.299 + rgb[..., 1] * 0.587 + rgb[..., 2] * 0.114
+
+
+def downscale_luma(luma, max_side=DEFAULT_MAX_SIDE):
+    """按整数块均值降采样，使最长边不超过 max_side。"""
+    luma = np.asarray(luma, dtype=np.float64)
+    factor = int(np.ceil(max(luma.shape) / float(max_side)))
+    if factor <= 1:
+        return luma
+    h = (luma.shape[0] // factor) * factor
+    w = (luma.shape[1] // factor) * factor
+    if h == 0 or w == 0:
+        return luma
+    cropped = luma[:h, :w]
+    return cropped.reshape(h // factor, factor, w // factor, factor).mean(axis=(1, 3))
+
+
+def psnr(reference, test, data_range=255.0, block_rows=256):
+    """峰值信噪比（dB）。按行分块累加误差，大图不会整体转换为 float64。"""
+    reference = np.asarray(reference)
+    test = np.asarray(test)
+    squared_error = 0.0
+    for start in range(0, reference.shape[0], block_rows):
+        diff = reference[start:start + block_rows].astype(np.float64) - test[start:start + block_rows]
+        squared_error += float(np.sum(diff * diff))
+    mse = squared_error / reference.size if reference.size else 0.0
+    if mse <= 0:
+        return PSNR_CAP
+    return float(min(PSNR_CAP, 10.0 * np.log10((data_range ** 2) / mse)))
+
+
+def _box_mean(x, win):
+    """利用积分图计算 win x win 窗口均值（仅保留完整窗口）。"""
+    integral = np.pad(x, ((1, 0), (1, 0))).cumsum(axis=0).cumsum(axis=1)
+    window_sum = (integral[win:, win:] - integral[:-win, win:]
+                  - integral[win:, :-win] + integral[:-win, :-win])
+    return window_sum / float(win * win)
+
+
+def _ssim_components(reference, test, data_range=255.0, win=7):
+    x = np.asarray(reference, dtype=np.float64)
+    y = np.asarray(test, dtype=np.float64)
+    win = max(1, min(win, x.shape[0], x.shape[1]))
+    c1 = (0.01 * data_range) ** 2
+    c2 = (0.03 * data_range) ** 2
+
+    mu_x = _box_mean(x, win)
+    mu_y = _box_mean(y, win)
+    sigma_xx = _box_mean(x * x, win) - mu_x ** 2
+    sigma_yy = _box_mean(y * y, win) - mu_y ** 2
+    sigma_xy = _box_mean(x * y, win) - mu_x * mu_y
+
+    luminance = (2 * mu_x * mu_y + c1) / (mu_x ** 2 + mu_y ** 2 + c1)
+    contrast_structure = (2 * sigma_xy + c2) / (sigma_xx + sigma_yy + c2)
+    return luminance, contrast_structure
+
+
+def ssim(reference, test, data_range=255.0, win=7):
+    """单尺度 SSIM（均匀窗口），取值通常在 0-1 之间。"""
+    luminance, contrast_structure = _ssim_components(reference, test, data_range, win)
+    return float(np.mean(luminance * contrast_structure))
+
+
+# MS-SSIM 各尺度权重（Wang et al. 2003）
+MS_SSIM_WEIGHTS = (0.0448, 0.2856, 0.3001, 0.2363, 0.1333)
+
+
+def _halve(x):
+    """2x2 均值降采样。"""
+    h = (x.shape[0] // 2) * 2
+    w = (x.shape[1] // 2) * 2
+    return x[:h, :w].reshape(h // 2, 2, w // 2, 2).mean(axis=(1, 3))
+
+
+def ms_ssim(reference, test, data_range=255.0, win=7):
+    """多尺度 SSIM；图像过小时自动减少尺度数。"""
+    x = np.asarray(reference, dtype=np.float64)
+    y = np.asarray(test, dtype=np.float64)
+    levels = len(MS_SSIM_WEIGHTS)
+    while levels > 1 and min(x.shape[:2]) / (2 ** (levels - 1)) < win:
+        levels -= 1
+    weights = np.array(MS_SSIM_WEIGHTS[:levels])
+    weights = weights / weights.sum()
+
+    values = []
+    for level in range(levels):
+        luminance, contrast_structure = _ssim_components(x, y, data_range, win)
+        if level == levels - 1:
+            values.append(np.mean(luminance * contrast_structure))
+        else:
+            values.append(np.mean(contrast_structure))
+            x = _halve(x)
+            y = _halve(y)
+    values = np.clip(np.array(values), 0.0, None)
+    return float(np.prod(values ** weights))
+
+
+def quality_score(metric, reference, test):
+    """按名称计算质量分数，metric 取 QUALITY_METRICS 之一。"""
+    metric = metric.lower()
+    if metric == "ssim":
+        return ssim(reference, test)
+    if metric == "psnr":
+        return psnr(reference, test)
+    if metric == "ms-ssim":
+        return ms_ssim(reference, test)
+    raise ValueError(f"不支持的质量指标: {metric}")
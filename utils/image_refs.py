@@ -0,0 +1,222 @@
+import os
+import re
+import shutil
+import urllib.parse
+from pathlib import Path
+
+# --- 图片引用替换 ---
+# 优化目录只扫描一次，建立 文件名主干(stem) → 优化后文件 的映射；
+# 所有引用（HTML 属性、srcset、内联 style、<style>、外部 CSS、JS 字符串）都从映射中解析，
+# 同一引用只解析和复制一次。
+
+CSS_URL_PATTERN = re.compile(r'url\(\s*([\'"]?)(.*?)\1\s*\)', re.IGNORECASE)
+JS_IMAGE_PATTERN = re.compile(r'([\'"])([^\'"]+\.(?:png|jpg|jpeg|gif|bmp))\1', re.IGNORECASE)
+# 优化目录中可能同时存放报告文件，只有图片才参与映射
+OPTIMIZED_EXTENSIONS = (".webp", ".avif", ".png", ".jpg", ".jpeg", ".gif", ".bmp", ".svg")
+
+
+def build_stem_map(optimized_dir, preferred_extensions=None):
+    """
+    扫描一次优化目录，返回 {stem: 文件路径}。
+    同一 stem 有多个文件时按 preferred_extensions 的顺序选取，否则取文件名排序后的第一个。
+    """
+    stem_map = {}
+    if not os.path.isdir(optimized_dir):
+        return stem_map
+    order = {ext: i for i, ext in enumerate(preferred_extensions or ())}
+    with os.scandir(optimized_dir) as entries:
+        files = sorted(entry.name for entry in entries
+                       if entry.is_file() and entry.name.lower().endswith(OPTIMIZED_EXTENSIONS))
+    for name in files:
+        stem, ext = os.path.splitext(name)
+        current = stem_map.get(stem)
+        if current is None:
+            stem_map[stem] = os.path.join(optimized_dir, name)
+        elif order:
+            current_rank = order.get(os.path.splitext(current)[1].lower(), len(order))
+            if order.get(ext.lower(), len(order)) < current_rank:
+                stem_map[stem] = os.path.join(optimized_dir, name)
+    return stem_map
+
+
+def split_reference(ref):
+    """拆分为 (路径部分, ?query#fragment 后缀)。"""
+    cut = len(ref)
+    for mark in ("?", "#"):
+        pos = ref.find(mark)
+        if pos != -1:
+            cut = min(cut, pos)
+    return ref[:cut], ref[cut:]
+
+
+def is_local_reference(ref):
+    lowered = ref.lower()
+    return bool(ref) and not lowered.startswith(("http://", "https://", "//", "data:", "blob:", "#"))
+
+
+class ImageReferenceRewriter:
+    """
+    把站点中的图片引用改写为优化后的文件，并将优化文件复制到原图所在位置。
+    base_dir 为引用所在文件的目录（CSS 中的 url() 相对 CSS 文件，HTML/JS 中的路径相对页面）。
+    """
+
+    def __init__(self, optimized_dir, site_root, remove_originals=True, preferred_extensions=None):
+        self.site_root = os.path.abspath(site_root)
+        self.stem_map = build_stem_map(optimized_dir, preferred_extensions)
+        self.remove_originals = remove_originals
+        self._resolved = {}
+        self._copied = set()
+        self.replaced_references = 0
+        self.missing = set()
+
+    def local_path(self, fs_path, base_dir):
+        """本地文件路径：以 / 开头的引用相对站点根目录，其余相对 base_dir。"""
+        if fs_path.startswith("/"):
+            return os.path.normpath(os.path.join(self.site_root, fs_path.lstrip("/")))
+        return os.path.normpath(os.path.join(base_dir, fs_path))
+
+    def resolve(self, ref, base_dir):
+        """返回改写后的引用；无需改写或找不到优化文件时返回 None。"""
+        if not ref:
+            return None
+        ref = ref.strip()
+        if not is_local_reference(ref):
+            return None
+        key = (base_dir, ref)
+        if key in self._resolved:
+            return self._resolved[key]
+
+        path_part, suffix = split_reference(ref)
+        fs_path = urllib.parse.unquote(path_part)
+        stem = Path(fs_path).stem
+        optimized_file = self.stem_map.get(stem)
+        if optimized_file is None:
+            if stem not in self.missing:
+                self.missing.add(stem)
+                print(f"未找到压缩图像: {os.path.basename(fs_path)}")
+            self._resolved[key] = None
+            return None
+
+        new_ext = os.path.splitext(optimized_file)[1]
+        original_path = self.local_path(fs_path, base_dir)
+        new_path = os.path.splitext(original_path)[0] + new_ext
+        self._place(optimized_file, original_path, new_path)
+
+        new_ref = os.path.splitext(path_part)[0] + new_ext + suffix
+        self._resolved[key] = new_ref
+        return new_ref
+
+    def _place(self, optimized_file, original_path, new_path):
+        if new_path in self._copied:
+            return
+        self._copied.add(new_path)
+        os.makedirs(os.path.dirname(new_path), exist_ok=True)
+        shutil.copy2(optimized_file, new_path)
+        print(f"复制压缩图像: {new_path}")
+        if self.remove_originals and original_path != new_path and os.path.exists(original_path):
+            os.remove(original_path)
+            print(f"已删除原始图像: {original_path}")
+
+    def _count(self, old, new):
+        if new is not None and new != old:
+            self.replaced_references += 1
+            return new
+        return old
+
+    def rewrite_url(self, ref, base_dir):
+        return self._count(ref, self.resolve(ref, base_dir))
+
+    def rewrite_srcset(self, srcset, base_dir):
+        """逐项改写 srcset（"url 描述符, url 描述符"）。"""
+        items = []
+        for item in srcset.split(","):
+            parts = item.strip().split(None, 1)
+            if not parts:
+                continue
+            parts[0] = self.rewrite_url(parts[0], base_dir)
+            items.append(" ".join(parts))
+        return ", ".join(items)
+
+    def rewrite_css(self, css_text, base_dir):
+        """单次扫描改写 CSS 文本中的全部 url(...)。"""
+        def replace(match):
+            quote, ref = match.group(1), match.group(2)
+            new_ref = self.rewrite_url(ref, base_dir)
+            if new_ref == ref:
+                return match.group(0)
+            return f"url({quote}{new_ref}{quote})"
+        return CSS_URL_PATTERN.sub(replace, css_text)
+
+    def rewrite_js(self, js_text, base_dir):
+        """单次扫描改写 JS 中以引号包裹的图片路径。"""
+        def replace(match):
+            quote, ref = match.group(1), match.group(2)
+            return f"{quote}{self.rewrite_url(ref, base_dir)}{quote}"
+        return JS_IMAGE_PATTERN.sub(replace, js_text)
+
+    def rewrite_text_file(self, file_path, kind, base_dir=None):
+        """就地改写外部 CSS/JS 文件，返回本文件中替换的引用数。"""
+        with open(file_path, "r", encoding="utf-8") as f:
+            content = f.read()
+        before = self.replaced_references
+        if kind == "css":
+            new_content = self.rewrite_css(content, base_dir or os.path.dirname(file_path))
+        else:
+            new_content = self.rewrite_js(content, base_dir or os.path.dirname(file_path))
+        if new_content != content:
+            with open(file_path, "w", encoding="utf-8") as f:
+                f.write(new_content)
+        return self.replaced_references - before
+
+
+def rewrite_html_document(soup, rewriter, html_path):
+    """
+    一次遍历 HTML 文档，改写其中的图片引用，并就地改写引用的本地 CSS / JS 文件。
+    返回被改写过的外部文件列表。
+    """
+    base_dir = os.path.dirname(os.path.abspath(html_path))
+
+    for tag in soup.find_all(True):
+        name = tag.name
+        if name == "img":
+            if tag.get("src"):
+                tag["src"] = rewriter.rewrite_url(tag["src"], base_dir)
+            if tag.get("srcset"):
+                tag["srcset"] = rewriter.rewrite_srcset(tag["srcset"], base_dir)
+        elif name == "source" and tag.get("srcset"):
+            tag["srcset"] = rewriter.rewrite_srcset(tag["srcset"], base_dir)
+        elif name == "link" and tag.get("href") and tag.get("as") == "image":
+            tag["href"] = rewriter.rewrite_url(tag["href"], base_dir)
+        elif name == "style" and tag.string:
+            tag.string = rewriter.rewrite_css(tag.string, base_dir)
+
+        style = tag.get("style")
+        if style and "url(" in style.lower():
+            tag["style"] = rewriter.rewrite_css(style, base_dir)
+
+    external_files = []
+    seen = set()
+    for tag in soup.find_all(["link", "script"]):
+        if tag.name == "link":
+            rels = tag.get("rel") or []
+            ref = tag.get("href") if "stylesheet" in rels else None
+            kind = "css"
+        else:
+            ref = tag.get("src")
+            kind = "js"
+        if not ref or not is_local_reference(ref):
+            continue
+        file_path = rewriter.local_path(urllib.parse.unquote(split_reference(ref)[0]), base_dir)
+        if file_path in seen:
+            continue
+        if not os.path.isfile(file_path):
+            print(f"未找到引用的 {kind.upper()} 文件: {ref}（{file_path}）")
+            seen.add(file_path)
+            continue
+        seen.add(file_path)
+        # JS 中的图片路径在运行时相对页面解析，CSS 中的 url() 相对样式表自身
+        count = rewriter.rewrite_text_file(file_path, kind, base_dir if kind == "js" else None)
+        if count:
+            print(f"已更新 {kind.upper()} 文件: {file_path}（{count} 处）")
+            external_files.append(file_path)
+    return external_files
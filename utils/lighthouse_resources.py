@@ -0,0 +1,83 @@
+import urllib.parse
+
+import numpy as np
+
+from carbon_model import data_transfer_emissions
+
+# --- 按资源类型拆分 Lighthouse 传输字节与碳排放 ---
+# 从 network-requests 审计中读取每个请求的 transferSize、resourceType 与来源，按类型汇总；
+# 与页面不同源的请求单独归入 third-party，因为它们不受本地优化流程影响。
+
+RESOURCE_BUCKETS = ["document", "stylesheet", "script", "font", "image", "media", "other", "third-party"]
+# Lighthouse resourceType → 汇总类型
+RESOURCE_TYPE_BUCKETS = {
+    "Document": "document",
+    "Stylesheet": "stylesheet",
+    "Script": "script",
+    "Font": "font",
+    "Image": "image",
+    "Media": "media",
+}
+# 每类资源主要由哪个优化阶段负责
+BUCKET_PIPELINE_STAGES = {
+    "document": "html",
+    "stylesheet": "css",
+    "font": "css",
+    "script": "js",
+    "image": "image",
+    "media": "image",
+    "other": None,
+    "third-party": None,
+}
+METRIC_PREFIX = "resource_bytes_"
+
+
+def request_origin(url):
+    parsed = urllib.parse.urlsplit(url or "")
+    return f"{parsed.scheme}://{parsed.netloc}"
+
+
+def resource_breakdown(report):
+    """
+    返回 {f"resource_bytes_{类型}": 字节数}，报告中没有 network-requests 审计时返回空字典。
+    扁平的数值键可以直接并入单次运行的指标，跟其他指标一起求平均。
+    """
+    items = (((report or {}).get("audits", {}).get("network-requests") or {}).get("details") or {}).get("items") or []
+    if not items:
+        return {}
+    page_url = report.get("finalDisplayedUrl") or report.get("finalUrl") or report.get("requestedUrl") or items[0].get("url")
+    page_origin = request_origin(page_url)
+    totals = {bucket: 0 for bucket in RESOURCE_BUCKETS}
+    for item in items:
+        url = item.get("url", "")
+        if url.startswith("data:"):
+            continue
+        if request_origin(url) != page_origin:
+            bucket = "third-party"
+        else:
+            bucket = RESOURCE_TYPE_BUCKETS.get(item.get("resourceType"), "other")
+        totals[bucket] += item.get("transferSize") or 0
+    return {f"{METRIC_PREFIX}{bucket}": value for bucket, value in totals.items()}
+
+
+def attribute_carbon(before_metrics, after_metrics):
+    """
+    根据优化前后的平均指标按资源类型分摊数据传输碳排放（g）。用户设备部分与页面大小无关，不参与分摊。
+    返回 {类型: {"pipeline_stage", "before_bytes", "after_bytes", "before_g", "after_g", "reduction_g"}}。
+    """
+    if not any(key.startswith(METRIC_PREFIX) for key in before_metrics):
+        return {}
+    before = np.array([before_metrics.get(f"{METRIC_PREFIX}{b}", 0) for b in RESOURCE_BUCKETS], dtype=np.float64)
+    after = np.array([after_metrics.get(f"{METRIC_PREFIX}{b}", 0) for b in RESOURCE_BUCKETS], dtype=np.float64)
+    before_g, after_g = data_transfer_emissions(np.stack([before, after]))
+    return {
+        bucket: {
+            "pipeline_stage": BUCKET_PIPELINE_STAGES[bucket],
+            "before_bytes": round(float(before[i]), 2),
+            "after_bytes": round(float(after[i]), 2),
+            "before_g": round(float(before_g[i]), 6),
+            "after_g": round(float(after_g[i]), 6),
+            "reduction_g": round(float(before_g[i] - after_g[i]), 6)
+        }
+        for i, bucket in enumerate(RESOURCE_BUCKETS)
+    }
@@ -0,0 +1,84 @@
+import os
+import sys
+import threading
+
+# --- 进程内存统计 ---
+# 优先使用 psutil（Windows/Linux/macOS 均可用），缺失时退回标准库实现。
+try:
+    import psutil
+except ImportError:
+    psutil = None
+
+
+def current_rss_bytes():
+    """当前进程的常驻内存（字节），无法获取时返回 0。"""
+    if psutil is not None:
+        return psutil.Process().memory_info().rss
+    try:
+        with open("/proc/self/statm", "r") as f:
+            resident_pages = int(f.read().split()[1])
+        return resident_pages * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError, AttributeError):
+        return 0
+
+
+def peak_rss_bytes():
+    """进程启动以来的峰值常驻内存（字节），无法获取时返回当前值。"""
+    if psutil is not None:
+        info = psutil.Process().memory_info()
+        peak = getattr(info, "peak_wset", None)  # 仅 Windows 提供
+        if peak:
+            return peak
+    try:
+        import resource
+        max_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        # Linux 以 KB 为单位，macOS 以字节为单位
+        return max_rss if sys.platform == "darwin" else max_rss * 1024
+    except ImportError:
+        return current_rss_bytes()
+
+
+def bytes_to_mb(num_bytes):
+    return round(num_bytes / (1024 * 1024), 2)
+
+
+class PeakRSSSampler:
+    """
+    在 with 块内由后台线程定期采样常驻内存，记录该段代码执行期间的峰值。
+    ru_maxrss 只能反映进程启动以来的峰值，进程池 worker 处理多张图片时需要按图片分别统计。
+    """
+
+    def __init__(self, interval=0.02):
+        self.interval = interval
+        self.start_bytes = 0
+        self.peak_bytes = 0
+        self._stop = threading.Event()
+        self._thread = None
+
+    def _sample(self):
+        rss = current_rss_bytes()
+        if rss > self.peak_bytes:
+            self.peak_bytes = rss
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            self._sample()
+
+    def __enter__(self):
+        self.start_bytes = current_rss_bytes()
+        self.peak_bytes = self.start_bytes
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self._stop.set()
+        self._thread.join()
+        self._sample()
+        return False
+
+    @property
+    def growth_bytes(self):
+        """相对进入 with 块时增加的峰值内存。"""
+        return max(0, self.peak_bytes - self.start_bytes)
@@ -0,0 +1,246 @@
+import os
+import re
+import urllib.parse
+
+from bs4 import BeautifulSoup
+
+from image_refs import CSS_URL_PATTERN, split_reference
+from static_server import SIDECAR_SUFFIXES, MIN_COMPRESS_BYTES, is_compressible, compress_bytes
+
+# --- 静态页面重量估算 ---
+# 不启动浏览器，直接从磁盘遍历页面的资源图：HTML、外链 CSS（含 @import）、CSS 中的 url() 图片与字体、脚本、
+# 按视口选择的 srcset/<picture> 候选。结果用于在 Lighthouse 之前快速筛选优化方案。
+# CSS 背景图无法判断选择器是否命中，全部计入，因此这部分是上限估计。
+
+# Lighthouse 默认的移动端设备（Moto G Power）
+DEFAULT_VIEWPORT_WIDTH = 412
+DEFAULT_DEVICE_PIXEL_RATIO = 1.75
+# Chrome 支持的图片类型，<picture><source type> 不在其中时跳过
+SUPPORTED_IMAGE_TYPES = ("image/avif", "image/webp", "image/jpeg", "image/png", "image/gif", "image/svg+xml", "image/x-icon")
+
+RESOURCE_TYPES = {
+    "stylesheet": (".css",),
+    "script": (".js", ".mjs"),
+    "font": (".woff2", ".woff", ".ttf", ".otf", ".eot"),
+    "image": (".png", ".jpg", ".jpeg", ".gif", ".webp", ".avif", ".svg", ".ico", ".bmp"),
+    "media": (".mp4", ".webm", ".ogg", ".mp3"),
+    "document": (".html", ".htm"),
+}
+
+IMPORT_PATTERN = re.compile(r"@import\s+(?:url\(\s*)?['\"]?([^'\")\s;]+)", re.IGNORECASE)
+FONT_FACE_PATTERN = re.compile(r"@font-face\s*{([^}]*)}", re.IGNORECASE)
+MEDIA_WIDTH_PATTERN = re.compile(r"\((min|max)-width\s*:\s*([\d.]+)px\)", re.IGNORECASE)
+SIZE_LENGTH_PATTERN = re.compile(r"([\d.]+)(px|vw)\s*$", re.IGNORECASE)
+
+
+def resource_type(path):
+    lower = path.lower()
+    for kind, extensions in RESOURCE_TYPES.items():
+        if lower.endswith(extensions):
+            return kind
+    return "other"
+
+
+def media_matches(media, viewport_width):
+    """只判断 min-width / max-width 条件，其他条件视为满足。"""
+    if not media:
+        return True
+    for bound, value in MEDIA_WIDTH_PATTERN.findall(media):
+        value = float(value)
+        if (bound.lower() == "min" and viewport_width < value) or (bound.lower() == "max" and viewport_width > value):
+            return False
+    return True
+
+
+def slot_width(sizes, viewport_width):
+    """按 sizes 属性计算图片的显示宽度（CSS 像素），无法解析时按整个视口宽度。"""
+    for entry in (sizes or "").split(","):
+        entry = entry.strip()
+        if not entry:
+            continue
+        condition, _, length = entry.rpartition(" ") if entry.startswith("(") else ("", "", entry)
+        if condition and not media_matches(condition, viewport_width):
+            continue
+        match = SIZE_LENGTH_PATTERN.search(length)
+        if match:
+            value = float(match.group(1))
+            return value if match.group(2).lower() == "px" else viewport_width * value / 100
+        break
+    return viewport_width
+
+
+def choose_srcset_candidate(srcset, sizes, viewport_width, dpr):
+    """
+    按浏览器的选择规则近似挑选 srcset 候选：w 描述符取不小于 显示宽度×dpr 的最小候选，
+    x 描述符取不小于 dpr 的最小候选，都不满足时取最大的候选。
+    """
+    candidates = []
+    for part in re.split(r",\s+", (srcset or "").strip()):
+        pieces = part.strip().split()
+        if not pieces:
+            continue
+        descriptor = pieces[1] if len(pieces) > 1 else "1x"
+        try:
+            value = float(descriptor[:-1])
+        except ValueError:
+            continue
+        candidates.append((descriptor[-1].lower(), value, pieces[0]))
+    if not candidates:
+        return None
+    if any(kind == "w" for kind, _, _ in candidates):
+        target = slot_width(sizes, viewport_width) * dpr
+        widths = sorted((value, url) for kind, value, url in candidates if kind == "w")
+    else:
+        target = dpr
+        widths = sorted((value, url) for _, value, url in candidates)
+    for value, url in widths:
+        if value >= target:
+            return url
+    return widths[-1][1]
+
+
+class PageWeightEstimator:
+    """
+    从 HTML 文件出发估算单次页面加载的传输字节数。compression 为 None、'gzip' 或 'br'，
+    文本资源有对应的 .gz / .br 旁路文件时使用旁路文件大小，否则现场压缩计算。
+    """
+
+    def __init__(self, site_root, viewport_width=DEFAULT_VIEWPORT_WIDTH, dpr=DEFAULT_DEVICE_PIXEL_RATIO,
+                 compression=None, include_lazy=False):
+        self.site_root = os.path.abspath(site_root)
+        self.viewport_width = viewport_width
+        self.dpr = dpr
+        self.compression = compression
+        self.include_lazy = include_lazy
+        self._transfer_sizes = {}
+
+    def resolve(self, ref, base_dir):
+        """返回本地文件路径；远程地址返回 ('remote', url)；data URI 等返回 None。"""
+        ref = (ref or "").strip()
+        if not ref or ref.startswith(("data:", "#", "javascript:", "mailto:", "tel:", "about:")):
+            return None
+        if ref.startswith(("http://", "https://", "//")):
+            return ("remote", ref)
+        path_part = urllib.parse.unquote(split_reference(ref)[0])
+        if not path_part:
+            return None
+        if path_part.startswith("/"):
+            return os.path.normpath(os.path.join(self.site_root, path_part.lstrip("/")))
+        return os.path.normpath(os.path.join(base_dir, path_part))
+
+    def transfer_size(self, path):
+        if path not in self._transfer_sizes:
+            size = os.path.getsize(path)
+            if self.compression and is_compressible(path) and size >= MIN_COMPRESS_BYTES:
+                sidecar = path + SIDECAR_SUFFIXES[self.compression]
+                if os.path.isfile(sidecar) and os.path.getmtime(sidecar) >= os.path.getmtime(path):
+                    size = min(size, os.path.getsize(sidecar))
+                else:
+                    with open(path, "rb") as f:
+                        size = min(size, len(compress_bytes(f.read(), self.compression)))
+            self._transfer_sizes[path] = size
+        return self._transfer_sizes[path]
+
+    def estimate(self, html_path):
+        html_path = os.path.abspath(html_path)
+        state = {"resources": {}, "missing": set(), "remote": set()}
+        self._add(state, html_path, "document")
+        with open(html_path, "r", encoding="utf-8", errors="ignore") as f:
+            soup = BeautifulSoup(f, "html.parser")
+        html_dir = os.path.dirname(html_path)
+
+        for link in soup.find_all("link", href=True):
+            rels = [r.lower() for r in link.get("rel") or []]
+            if "stylesheet" in rels and media_matches(link.get("media"), self.viewport_width):
+                self._add_stylesheet(state, self.resolve(link["href"], html_dir))
+            elif "icon" in rels or ("preload" in rels and link.get("as") in ("image", "font", "script", "style")):
+                self._add(state, self.resolve(link["href"], html_dir))
+        for script in soup.find_all("script", src=True):
+            self._add(state, self.resolve(script["src"], html_dir), "script")
+        for style in soup.find_all("style"):
+            self._add_css_text(state, style.string or "", html_dir)
+        for tag in soup.find_all(style=True):
+            self._add_css_text(state, tag["style"], html_dir)
+
+        for img in soup.find_all("img"):
+            if not self.include_lazy and img.get("loading") == "lazy":
+                continue
+            self._add(state, self.resolve(self._image_choice(img), html_dir), "image")
+        for video in soup.find_all("video"):
+            if video.get("poster"):
+                self._add(state, self.resolve(video["poster"], html_dir), "image")
+            if video.get("preload") != "none" and (video.has_attr("autoplay") or video.get("preload") == "auto"):
+                sources = [video.get("src")] + [s.get("src") for s in video.find_all("source")]
+                source = next((s for s in sources if s), None)
+                self._add(state, self.resolve(source, html_dir), "media")
+
+        by_type = {}
+        for path, kind in state["resources"].items():
+            size = self.transfer_size(path)
+            entry = by_type.setdefault(kind, {"requests": 0, "bytes": 0})
+            entry["requests"] += 1
+            entry["bytes"] += size
+        return {
+            "total_bytes": sum(entry["bytes"] for entry in by_type.values()),
+            "requests": len(state["resources"]),
+            "by_type": by_type,
+            "resources": [{"path": os.path.relpath(p, self.site_root), "type": k, "bytes": self.transfer_size(p)}
+                          for p, k in state["resources"].items()],
+            "missing": sorted(os.path.relpath(p, self.site_root) for p in state["missing"]),
+            "remote": sorted(state["remote"])
+        }
+
+    def _image_choice(self, img):
+        picture = img.find_parent("picture")
+        if picture is not None:
+            for source in picture.find_all("source"):
+                source_type = (source.get("type") or "").lower()
+                if source_type and source_type not in SUPPORTED_IMAGE_TYPES:
+                    continue
+                if not media_matches(source.get("media"), self.viewport_width):
+                    continue
+                choice = choose_srcset_candidate(source.get("srcset"), source.get("sizes"), self.viewport_width, self.dpr)
+                if choice:
+                    return choice
+        if img.get("srcset"):
+            choice = choose_srcset_candidate(img["srcset"], img.get("sizes"), self.viewport_width, self.dpr)
+            if choice:
+                return choice
+        return img.get("src")
+
+    def _add(self, state, resolved, kind=None):
+        """登记一个资源，返回是否为首次登记的本地文件。"""
+        if resolved is None:
+            return False
+        if isinstance(resolved, tuple):
+            state["remote"].add(resolved[1])
+            return False
+        if not os.path.isfile(resolved):
+            state["missing"].add(resolved)
+            return False
+        if resolved in state["resources"]:
+            return False
+        state["resources"][resolved] = kind or resource_type(resolved)
+        return True
+
+    def _add_stylesheet(self, state, resolved):
+        if not self._add(state, resolved, "stylesheet"):
+            return
+        with open(resolved, "r", encoding="utf-8", errors="ignore") as f:
+            self._add_css_text(state, f.read(), os.path.dirname(resolved))
+
+    def _add_css_text(self, state, css_text, base_dir):
+        for ref in IMPORT_PATTERN.findall(css_text):
+            self._add_stylesheet(state, self.resolve(ref, base_dir))
+        # 每个 @font-face 只下载浏览器选中的第一个来源（Chrome 优先 woff2）
+        font_refs = set()
+        for block in FONT_FACE_PATTERN.findall(css_text):
+            urls = [ref for _, ref in CSS_URL_PATTERN.findall(block)]
+            font_refs.update(urls)
+            if urls:
+                chosen = next((u for u in urls if split_reference(u)[0].lower().endswith(".woff2")), urls[0])
+                self._add(state, self.resolve(chosen, base_dir), "font")
+        for _, ref in CSS_URL_PATTERN.findall(css_text):
+            # url(x.css) 只出现在 @import 中，已在上面处理
+            if ref not in font_refs and not split_reference(ref)[0].lower().endswith(".css"):
+                self._add(state, self.resolve(ref, base_dir))
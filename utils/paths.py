@@ -38,6 +38,8 @@ WEBSITES_ORIGINAL_DIR = ROOT_DIR / "websites_original"
 FULL_CARBON_DIR = ROOT_DIR / "7_full_carbon_report"
 CUSTOM_SCRIPT_DIR= ROOT_DIR / "scripts"
 DATA_DIR= ROOT_DIR / "data"
+# 跨站点图片去重索引与优化结果缓存
+IMAGE_CACHE_DIR = ROOT_DIR / "image_cache"
 
 # test dir
 WT_OR = ROOT_DIR / "wt_or"
@@ -53,7 +55,7 @@ def init_dirs():
     for directory in [
         API_BASE_URL,API_KEY,ROOT_DIR, PYTHON_SCRIPTS_DIR, VENV_DIR, NODE_MODULES_DIR, HTML_OPTI_DIR,
         CSS_OPTI_DIR, JS_OPTI_DIR, IMAGE_OPTI_DIR, ACTION_CALC_DIR, FULL_OPTI_DIR,
-        WEBSITES_ORIGINAL_DIR, FULL_CARBON_DIR, WT_OR, WT_OT,CUSTOM_SCRIPT_DIR,DATA_DIR
+        WEBSITES_ORIGINAL_DIR, FULL_CARBON_DIR, WT_OR, WT_OT,CUSTOM_SCRIPT_DIR,DATA_DIR,IMAGE_CACHE_DIR
     ]:
         ensure_dir(directory)
         
\ No newline at end of file
@@ -0,0 +1,372 @@
+import os
+import csv
+import json
+import time
+import uuid
+import sqlite3
+import platform
+import subprocess
+import numpy as np
+
+from paths import ROOT_DIR, NODE_MODULES_DIR
+from lighthouse_resources import RESOURCE_BUCKETS, METRIC_PREFIX
+from throttling_profiles import DEFAULT_PROFILE
+from carbon_uncertainty import carbon_bands, band_columns, band_header
+
+# openpyxl 为可选依赖，未安装时只导出 CSV
+try:
+    import openpyxl
+except ImportError:
+    openpyxl = None
+
+# --- 测量结果库 ---
+# 所有 Lighthouse 原始运行、碳排放估算与优化报告条目追加写入同一个 SQLite 文件，每次执行脚本记为一个 run，
+# 带 git 提交、工具版本与时间戳。汇总 CSV / xlsx 由查询接口一次性从库中重新生成，不再依赖各处零散的文件。
+# 表结构固定（列即指标），按 run_id / 项目建索引，几个月的历史也可以一条 GROUP BY 聚合完。
+
+RESULTS_DB = os.getenv("RESULTS_DB", os.path.join(ROOT_DIR, "results.sqlite"))
+SCHEMA_VERSION = 2
+
+METRIC_COLUMNS = [
+    "total_byte_weight_bytes", "first_contentful_paint_ms", "largest_contentful_paint_ms",
+    "time_to_interactive_ms", "loading_time_ms", "performance_score"
+] + [f"{METRIC_PREFIX}{bucket}".replace("-", "_") for bucket in RESOURCE_BUCKETS]
+# 各脚本中同一指标的不同命名
+METRIC_ALIASES = {"total_byte_weight": "total_byte_weight_bytes"}
+# 优化报告条目中表示优化前后大小的键，按顺序取第一组存在的
+SIZE_KEY_PAIRS = [
+    ("original_size_bytes", "optimized_size_bytes"),
+    ("before_bytes", "after_bytes"),
+    ("original_bytes", "br_bytes"),
+    ("original_bytes", "gzip_bytes"),
+    ("original_bytes", "inlined_bytes"),
+]
+# 结构版本 1 之后新增的列（表, 列, 类型），打开旧库时补齐。旧库中的空值按 DEFAULT_PROFILE 处理：
+# 版本 1 的测量都使用 Lighthouse 默认节流，与 DEFAULT_PROFILE 相同
+ADDED_COLUMNS = [("lighthouse_runs", "profile", "TEXT"), ("carbon_estimates", "profile", "TEXT")]
+# 报告中不是条目的键
+REPORT_SUMMARY_KEYS = ("summary", "svg_summary")
+
+SCHEMA = f"""
+CREATE TABLE IF NOT EXISTS runs (
+    run_id TEXT PRIMARY KEY,
+    kind TEXT NOT NULL,
+    started_at TEXT NOT NULL,
+    git_commit TEXT,
+    git_dirty INTEGER,
+    python_version TEXT,
+    numpy_version TEXT,
+    node_version TEXT,
+    lighthouse_version TEXT,
+    schema_version INTEGER,
+    config TEXT
+);
+CREATE TABLE IF NOT EXISTS lighthouse_runs (
+    run_id TEXT NOT NULL,
+    project TEXT NOT NULL,
+    variant TEXT NOT NULL,
+    state TEXT NOT NULL,
+    sample INTEGER NOT NULL,
+    succeeded INTEGER NOT NULL,
+    kept INTEGER NOT NULL,
+    backend TEXT,
+    concurrency INTEGER,
+    seconds REAL,
+    {", ".join(f"{column} REAL" for column in METRIC_COLUMNS)},
+    profile TEXT
+);
+CREATE INDEX IF NOT EXISTS lighthouse_runs_key ON lighthouse_runs (run_id, project, variant, state);
+CREATE TABLE IF NOT EXISTS carbon_estimates (
+    run_id TEXT NOT NULL,
+    project TEXT NOT NULL,
+    variant TEXT NOT NULL,
+    state TEXT NOT NULL,
+    site_url TEXT,
+    total_bytes REAL,
+    carbon_g REAL,
+    model TEXT,
+    profile TEXT
+);
+CREATE INDEX IF NOT EXISTS carbon_estimates_key ON carbon_estimates (run_id, project, variant, state);
+CREATE TABLE IF NOT EXISTS optimization_rows (
+    run_id TEXT NOT NULL,
+    project TEXT NOT NULL,
+    stage TEXT NOT NULL,
+    item TEXT,
+    status TEXT,
+    before_bytes REAL,
+    after_bytes REAL,
+    details TEXT
+);
+CREATE INDEX IF NOT EXISTS optimization_rows_key ON optimization_rows (run_id, project, stage);
+"""
+
+SUMMARY_HEADER_BEFORE = [
+    "Site Name", "Site Path", "Total Byte Size (bytes)", "First Contentful Paint (ms)",
+    "Largest Contentful Paint (ms)", "Time to Interactive (ms)",
+    "Loading Time (ms)", "Performance Score", "CO2 - Custom (g)"
+]
+SUMMARY_HEADER_AFTER = SUMMARY_HEADER_BEFORE + ["Carbon_reduced (g / %)"]
+SUMMARY_METRICS = ["total_byte_weight_bytes", "first_contentful_paint_ms", "largest_contentful_paint_ms",
+                   "time_to_interactive_ms", "loading_time_ms", "performance_score"]
+HISTORY_HEADER = ["Run ID", "Started At", "Git Commit", "Site Name", "Variant", "Profile",
+                  "Bytes Before", "Bytes After", "CO2 Before (g)", "CO2 After (g)", "CO2 Reduced (g)", "CO2 Reduced (%)"]
+
+
+def _command_output(command, cwd=None):
+    try:
+        result = subprocess.run(command, cwd=cwd, capture_output=True, text=True, timeout=10)
+    except (OSError, subprocess.TimeoutExpired):
+        return None
+    return result.stdout.strip() if result.returncode == 0 else None
+
+
+def environment_info():
+    """当前代码与工具的版本；获取失败的项为 None。"""
+    repo_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    status = _command_output(["git", "status", "--porcelain", "--untracked-files=no"], cwd=repo_dir)
+    lighthouse_version = None
+    package_json = os.path.join(NODE_MODULES_DIR, "lighthouse", "package.json")
+    if os.path.exists(package_json):
+        with open(package_json, "r", encoding="utf-8") as f:
+            lighthouse_version = json.load(f).get("version")
+    return {
+        "git_commit": _command_output(["git", "rev-parse", "HEAD"], cwd=repo_dir),
+        "git_dirty": None if status is None else int(bool(status)),
+        "python_version": platform.python_version(),
+        "numpy_version": np.__version__,
+        "node_version": _command_output(["node", "--version"]),
+        "lighthouse_version": lighthouse_version,
+    }
+
+
+def normalize_metrics(metrics):
+    """把单次运行的指标字典转换为 METRIC_COLUMNS 顺序的值列表，缺失的指标为 None。列名中的 - 换成 _。"""
+    normalized = {METRIC_ALIASES.get(key, key).replace("-", "_"): value for key, value in (metrics or {}).items()}
+    return [normalized.get(column) for column in METRIC_COLUMNS]
+
+
+def optimization_rows(stage, report):
+    """
+    把一个优化阶段的 JSON 报告展开为 (条目, 状态, 优化前字节, 优化后字节, 详情) 行。
+    支持三种报告结构：单文件报告（before_optimization / after_optimization）、
+    条目列表（files / assets / icons）和以路径为键的条目字典。
+    """
+    if "before_optimization" in report:
+        item = report.get("html_file") or report.get("css_file") or report.get("js_file") or stage
+        entries = [(item, {
+            "status": report.get("optimization_status"),
+            "original_size_bytes": report["before_optimization"].get("file_size_bytes"),
+            "optimized_size_bytes": (report.get("after_optimization") or {}).get("file_size_bytes"),
+            **report.get("changes", {})
+        })]
+    else:
+        entries = []
+        for key, value in report.items():
+            if key in REPORT_SUMMARY_KEYS:
+                continue
+            if isinstance(value, list):
+                entries.extend((entry.get("asset") or entry.get("file") or f"{key}[{i}]", entry)
+                               for i, entry in enumerate(value) if isinstance(entry, dict))
+            elif isinstance(value, dict) and key not in ("pages",):
+                if all(isinstance(v, dict) for v in value.values()) and value:
+                    entries.extend(value.items())
+                else:
+                    entries.append((key, value))
+    rows = []
+    for item, entry in entries:
+        before, after = None, None
+        for before_key, after_key in SIZE_KEY_PAIRS:
+            if before_key in entry and after_key in entry:
+                before, after = entry[before_key], entry[after_key]
+                break
+        rows.append((str(item), entry.get("status") or entry.get("replacement"), before, after,
+                     json.dumps(entry, ensure_ascii=False, default=str)))
+    return rows
+
+
+class ResultsStore:
+    """
+    测量结果库。写入：start_run → record_lighthouse_runs / record_carbon / record_optimization_report。
+    读取：runs()、summary()、history()，export_summary() 重新生成汇总 CSV（及 xlsx）。
+    """
+
+    def __init__(self, db_path=RESULTS_DB):
+        self.db_path = db_path
+        os.makedirs(os.path.dirname(os.path.abspath(db_path)), exist_ok=True)
+        self.connection = sqlite3.connect(db_path)
+        self.connection.executescript(SCHEMA)
+        for table, column, column_type in ADDED_COLUMNS:
+            existing = [row[1] for row in self.connection.execute(f"PRAGMA table_info({table})")]
+            if column not in existing:
+                with self.connection:
+                    self.connection.execute(f"ALTER TABLE {table} ADD COLUMN {column} {column_type}")
+
+    def close(self):
+        self.connection.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    # --- 写入 ---
+    def start_run(self, kind, config=None):
+        """登记一次脚本执行并返回 run_id。"""
+        run_id = f"{time.strftime('%Y%m%dT%H%M%S')}-{uuid.uuid4().hex[:8]}"
+        info = environment_info()
+        with self.connection:
+            self.connection.execute(
+                "INSERT INTO runs VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                (run_id, kind, time.strftime("%Y-%m-%d %H:%M:%S"), info["git_commit"], info["git_dirty"],
+                 info["python_version"], info["numpy_version"], info["node_version"], info["lighthouse_version"],
+                 SCHEMA_VERSION, json.dumps(config or {}, ensure_ascii=False, default=str)))
+        return run_id
+
+    def record_lighthouse_runs(self, run_id, project, variant, state, runs, profile=DEFAULT_PROFILE):
+        """
+        runs 为 [{"metrics", "kept", "backend", "concurrency", "seconds"}]，metrics 为 None 表示该次运行失败。
+        """
+        rows = []
+        for sample, run in enumerate(runs, 1):
+            metrics = run.get("metrics")
+            rows.append((run_id, project, variant, state, sample, int(metrics is not None), int(bool(run.get("kept", True))),
+                         run.get("backend"), run.get("concurrency"), run.get("seconds"), *normalize_metrics(metrics), profile))
+        placeholders = ", ".join("?" * (11 + len(METRIC_COLUMNS)))
+        with self.connection:
+            self.connection.executemany(
+                f"INSERT INTO lighthouse_runs (run_id, project, variant, state, sample, succeeded, kept, backend, "
+                f"concurrency, seconds, {', '.join(METRIC_COLUMNS)}, profile) VALUES ({placeholders})", rows)
+
+    def record_carbon(self, run_id, project, variant, state, site_url, total_bytes, carbon_g, model="custom",
+                      profile=DEFAULT_PROFILE):
+        with self.connection:
+            self.connection.execute(
+                "INSERT INTO carbon_estimates (run_id, project, variant, state, site_url, total_bytes, carbon_g, model, "
+                "profile) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                (run_id, project, variant, state, site_url, float(total_bytes), float(carbon_g), model, profile))
+
+    def record_optimization_report(self, run_id, project, stage, report):
+        rows = [(run_id, project, stage, *row) for row in optimization_rows(stage, report)]
+        with self.connection:
+            self.connection.executemany("INSERT INTO optimization_rows VALUES (?, ?, ?, ?, ?, ?, ?, ?)", rows)
+        return len(rows)
+
+    # --- 查询 ---
+    def runs(self, kind=None):
+        """按时间倒序列出所有 run。"""
+        query = "SELECT * FROM runs" + (" WHERE kind = ?" if kind else "") + " ORDER BY started_at DESC, rowid DESC"
+        cursor = self.connection.execute(query, (kind,) if kind else ())
+        columns = [c[0] for c in cursor.description]
+        return [dict(zip(columns, row)) for row in cursor.fetchall()]
+
+    def latest_run_id(self, kind="full"):
+        row = self.connection.execute(
+            "SELECT run_id FROM runs WHERE kind = ? AND run_id IN (SELECT run_id FROM carbon_estimates) "
+            "ORDER BY started_at DESC, rowid DESC LIMIT 1", (kind,)).fetchone()
+        return row[0] if row else None
+
+    def summary(self, run_id, variant="full", profile=DEFAULT_PROFILE):
+        """
+        一个 run 中每个项目在指定节流配置下优化前后的平均指标（只使用未被剔除的成功运行）与碳排放估算。
+        返回 {"projects", "before", "after"}：projects 为项目名列表，before/after 为 {列名: numpy 数组}。
+        """
+        metric_averages = ", ".join(f"AVG(l.{column})" for column in SUMMARY_METRICS)
+        rows = self.connection.execute(
+            f"SELECT l.project, l.state, c.site_url, c.carbon_g, {metric_averages} "
+            f"FROM lighthouse_runs l JOIN carbon_estimates c "
+            f"ON c.run_id = l.run_id AND c.project = l.project AND c.variant = l.variant AND c.state = l.state "
+            f"AND COALESCE(c.profile, :default) = COALESCE(l.profile, :default) "
+            f"WHERE l.run_id = :run_id AND l.variant = :variant AND COALESCE(l.profile, :default) = :profile "
+            f"AND l.succeeded = 1 AND l.kept = 1 GROUP BY l.project, l.state ORDER BY l.project",
+            {"run_id": run_id, "variant": variant, "profile": profile, "default": DEFAULT_PROFILE}).fetchall()
+        by_state = {"before": {}, "after": {}}
+        for project, state, site_url, carbon_g, *averages in rows:
+            by_state[state][project] = (site_url, carbon_g, averages)
+        projects = sorted(set(by_state["before"]) & set(by_state["after"]))
+        result = {"projects": projects}
+        for state, entries in by_state.items():
+            values = np.array([[entries[p][1], *entries[p][2]] for p in projects],
+                              dtype=np.float64).reshape(len(projects), 1 + len(SUMMARY_METRICS))
+            result[state] = {"site_url": [entries[p][0] for p in projects], "carbon_g": values[:, 0]}
+            for i, column in enumerate(SUMMARY_METRICS, 1):
+                result[state][column] = values[:, i]
+        return result
+
+    def history(self, variant="full", project=None):
+        """所有 run 中每个项目在每个节流配置下的优化前后字节数与碳排放，按时间排序。"""
+        query = (
+            "SELECT r.run_id, r.started_at, r.git_commit, b.project, b.variant, COALESCE(b.profile, :default), "
+            "b.total_bytes, a.total_bytes, b.carbon_g, a.carbon_g FROM carbon_estimates b "
+            "JOIN carbon_estimates a ON a.run_id = b.run_id AND a.project = b.project AND a.variant = b.variant "
+            "AND COALESCE(a.profile, :default) = COALESCE(b.profile, :default) "
+            "AND a.state = 'after' JOIN runs r ON r.run_id = b.run_id "
+            "WHERE b.state = 'before' AND b.variant = :variant" + (" AND b.project = :project" if project else "") +
+            " ORDER BY r.started_at, b.project, b.profile")
+        return self.connection.execute(query, {"variant": variant, "project": project, "default": DEFAULT_PROFILE}).fetchall()
+
+    def export_summary(self, out_dir, run_id=None, variant="full", profile=DEFAULT_PROFILE):
+        """
+        从库中重新生成指定节流配置的 carbon_report_before.csv / carbon_report_after.csv（与完整报告脚本的格式相同）
+        carbon_uncertainty.csv（碳排放参数的蒙特卡洛区间）和跨 run 的 carbon_history.csv；
+        安装了 openpyxl 时另外写入 carbon_emissions_summary.xlsx。
+        返回写入的文件列表。
+        """
+        run_id = run_id or self.latest_run_id()
+        if run_id is None:
+            return []
+        data = self.summary(run_id, variant, profile)
+        projects = data["projects"]
+        before, after = data["before"], data["after"]
+        reduced = before["carbon_g"] - after["carbon_g"]
+        with np.errstate(divide="ignore", invalid="ignore"):
+            reduced_percent = np.where(before["carbon_g"] > 0, np.round(reduced / before["carbon_g"] * 100, 2), 0)
+
+        def rows_for(state_data):
+            columns = [np.round(state_data[column], 2) for column in SUMMARY_METRICS] + [np.round(state_data["carbon_g"], 4)]
+            return [[project, state_data["site_url"][i], *(float(c[i]) for c in columns)] for i, project in enumerate(projects)]
+
+        before_rows = rows_for(before)
+        after_rows = [row + [f"{round(float(reduced[i]), 2)} ({float(reduced_percent[i])}%)"]
+                      for i, row in enumerate(rows_for(after))]
+        bands = carbon_bands(before["total_byte_weight_bytes"], after["total_byte_weight_bytes"])
+        uncertainty_rows = [[project, round(float(before["total_byte_weight_bytes"][i]), 2),
+                             round(float(after["total_byte_weight_bytes"][i]), 2)]
+                            + band_columns(bands, i) for i, project in enumerate(projects)]
+        history_rows = []
+        for (run, started_at, commit, project, row_variant, row_profile,
+             bytes_before, bytes_after, carbon_before, carbon_after) in self.history(variant):
+            carbon_reduced = carbon_before - carbon_after
+            history_rows.append([run, started_at, (commit or "")[:12], project, row_variant, row_profile, bytes_before, bytes_after,
+                                 round(carbon_before, 4), round(carbon_after, 4), round(carbon_reduced, 4),
+                                 round(carbon_reduced / carbon_before * 100, 2) if carbon_before > 0 else 0])
+
+        sheets = {
+            "carbon_report_before": (SUMMARY_HEADER_BEFORE, before_rows),
+            "carbon_report_after": (SUMMARY_HEADER_AFTER, after_rows),
+            "carbon_uncertainty": (["Site Name", "Bytes Before", "Bytes After"] + band_header(), uncertainty_rows),
+            "carbon_history": (HISTORY_HEADER, history_rows),
+        }
+        os.makedirs(out_dir, exist_ok=True)
+        written = []
+        for name, (header, rows) in sheets.items():
+            path = os.path.join(out_dir, f"{name}.csv")
+            with open(path, "w", newline="", encoding="utf-8") as f:
+                writer = csv.writer(f)
+                writer.writerow(header)
+                writer.writerows(rows)
+            written.append(path)
+        if openpyxl is not None:
+            workbook = openpyxl.Workbook()
+            workbook.remove(workbook.active)
+            for name, (header, rows) in sheets.items():
+                sheet = workbook.create_sheet(name)
+                sheet.append(header)
+                for row in rows:
+                    sheet.append(row)
+            path = os.path.join(out_dir, "carbon_emissions_summary.xlsx")
+            workbook.save(path)
+            written.append(path)
+        return written
+
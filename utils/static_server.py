@@ -0,0 +1,383 @@
+import os
+import time
+import gzip
+import mimetypes
+import threading
+import urllib.request
+from stat import S_ISREG
+from collections import OrderedDict, deque
+from email.utils import formatdate, parsedate_to_datetime
+
+# brotli 为可选依赖，未安装时只提供 gzip
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+# waitress 只在启动测量服务器时需要，只用到压缩函数的脚本（如 precompress）不必安装
+try:
+    from waitress import create_server, wasyncore
+except ImportError:
+    create_server = wasyncore = None
+
+# --- 测量用本地静态服务器 ---
+# 按 Accept-Encoding 协商内容编码：优先使用预压缩的 .br / .gz 旁路文件，没有旁路文件的资源在服务器就绪前
+# 于内存中预先压缩（precompress_dirs），这样原始站点与优化站点都在接近真实部署的传输编码下被 Lighthouse 测量，
+# 且最高级别压缩的耗时不会只落在其中一方的请求里。
+
+# 值得压缩的文本类资源
+COMPRESSIBLE_EXTENSIONS = (".html", ".htm", ".css", ".js", ".mjs", ".json", ".svg", ".xml", ".txt", ".map",
+                           ".webmanifest", ".ttf", ".otf", ".eot", ".ico")
+# 小于该大小的文件压缩收益不抵头部开销
+MIN_COMPRESS_BYTES = 256
+GZIP_LEVEL = 9
+BROTLI_QUALITY = 11
+# 服务端支持的编码，按优先级排列
+SUPPORTED_ENCODINGS = ("br", "gzip") if brotli is not None else ("gzip",)
+SIDECAR_SUFFIXES = {"br": ".br", "gzip": ".gz"}
+
+# 内存缓存上限（字节），超过时按最近最少使用淘汰
+DEFAULT_CACHE_MAX_BYTES = int(os.getenv("STATIC_CACHE_MAX_BYTES", str(64 * 1024 * 1024)))
+# 超过该大小且无需压缩的文件不读入内存，直接流式发送
+STREAM_THRESHOLD_BYTES = 1024 * 1024
+STREAM_BLOCK_SIZE = 64 * 1024
+# 默认 no-cache：每次都重新验证（命中时返回 304），首次访问测量不受影响；
+# 重复访问测量可设置为 "public, max-age=31536000" 等策略
+DEFAULT_CACHE_CONTROL = os.getenv("STATIC_CACHE_CONTROL", "no-cache")
+LATENCY_SAMPLE_LIMIT = 100000
+# 就绪探测地址，不计入请求统计
+HEALTH_PATH = "/__health"
+READY_TIMEOUT_SECONDS = 10
+READY_POLL_INTERVAL_SECONDS = 0.005
+
+
+def is_compressible(path):
+    return path.lower().endswith(COMPRESSIBLE_EXTENSIONS)
+
+
+def compress_bytes(data, encoding):
+    """以最高压缩级别压缩，encoding 为 'br' 或 'gzip'。"""
+    if encoding == "br":
+        if brotli is None:
+            raise ValueError("brotli 库未安装")
+        return brotli.compress(data, quality=BROTLI_QUALITY)
+    # mtime=0 使相同输入产生相同输出，便于比较与缓存
+    return gzip.compress(data, compresslevel=GZIP_LEVEL, mtime=0)
+
+
+def parse_accept_encoding(header):
+    """解析 Accept-Encoding，返回 {编码: q 值}；'*' 表示其他未列出的编码。"""
+    accepted = {}
+    for part in (header or "").split(","):
+        token, _, params = part.strip().partition(";")
+        token = token.strip().lower()
+        if not token:
+            continue
+        q = 1.0
+        for param in params.split(";"):
+            name, _, value = param.strip().partition("=")
+            if name.strip() == "q":
+                try:
+                    q = float(value)
+                except ValueError:
+                    q = 0.0
+        accepted[token] = q
+    return accepted
+
+
+def negotiate_encoding(header):
+    """返回客户端接受且 q 值最高的服务端编码，都不接受时返回 None（identity）。"""
+    accepted = parse_accept_encoding(header)
+    best, best_q = None, 0.0
+    for encoding in SUPPORTED_ENCODINGS:
+        q = accepted.get(encoding, accepted.get("x-gzip") if encoding == "gzip" else None)
+        if q is None:
+            q = accepted.get("*", 0.0)
+        if q > best_q:
+            best, best_q = encoding, q
+    return best
+
+
+class StaticSite:
+    """
+    静态文件 WSGI 应用。可压缩资源总是带 Vary: Accept-Encoding，实际编码由请求协商决定。
+    响应体与响应头按 (文件, 编码) 缓存在按字节数限制的 LRU 中，文件修改时间变化后自动失效；
+    大文件不进入内存缓存，通过 wsgi.file_wrapper 流式发送。支持 ETag / Last-Modified 条件请求。
+    precompress_dirs（相对 serve_dir）中没有旁路文件的可压缩资源由 prepare() 预先压缩，不受 LRU 上限淘汰。
+    """
+
+    def __init__(self, serve_dir, compress=True, log_requests=False, cache_max_bytes=DEFAULT_CACHE_MAX_BYTES,
+                 cache_control=DEFAULT_CACHE_CONTROL, precompress_dirs=()):
+        self.serve_dir = os.path.abspath(serve_dir)
+        self.compress = compress
+        self.log_requests = log_requests
+        self.cache_max_bytes = cache_max_bytes
+        self.cache_control = cache_control
+        self.precompress_dirs = list(precompress_dirs)
+        self._entries = OrderedDict()
+        # (文件, 编码) -> (mtime_ns, 压缩后内容；压缩无收益时为 None)
+        self._precompressed = {}
+        self._cached_bytes = 0
+        self._lock = threading.Lock()
+        self._latencies = deque(maxlen=LATENCY_SAMPLE_LIMIT)
+        self.stats = {"requests": 0, "cache_hits": 0, "not_modified": 0, "streamed": 0}
+
+    def prepare(self):
+        """
+        压缩 precompress_dirs 中所有没有新鲜旁路文件的可压缩资源，返回 (文件数, 耗时秒数)。
+        MeasurementServer.start() 在监听之前调用，请求中不再进行最高级别压缩。
+        """
+        started = time.perf_counter()
+        count = 0
+        sidecar_suffixes = tuple(SIDECAR_SUFFIXES.values())
+        for directory in self.precompress_dirs:
+            for root, _, names in os.walk(os.path.normpath(os.path.join(self.serve_dir, directory))):
+                for name in names:
+                    file_path = os.path.join(root, name)
+                    if name.endswith(sidecar_suffixes) or not is_compressible(file_path):
+                        continue
+                    stat = os.stat(file_path)
+                    if stat.st_size < MIN_COMPRESS_BYTES:
+                        continue
+                    data = None
+                    for encoding in SUPPORTED_ENCODINGS:
+                        sidecar = file_path + SIDECAR_SUFFIXES[encoding]
+                        if os.path.isfile(sidecar) and os.stat(sidecar).st_mtime_ns >= stat.st_mtime_ns:
+                            continue
+                        if data is None:
+                            with open(file_path, "rb") as f:
+                                data = f.read()
+                        compressed = compress_bytes(data, encoding)
+                        self._precompressed[(file_path, encoding)] = (
+                            stat.st_mtime_ns, compressed if len(compressed) < stat.st_size else None)
+                    count += data is not None
+        return count, time.perf_counter() - started
+
+    def _load_entry(self, file_path, encoding, stat):
+        """
+        读取文件并生成缓存条目：(mtime_ns, 响应头, 响应体)。响应体为 None 表示需要流式发送原文件。
+        压缩无收益时退回 identity 编码。
+        """
+        body, used_encoding = None, None
+        if encoding:
+            sidecar = file_path + SIDECAR_SUFFIXES[encoding]
+            # 旁路文件比源文件旧时视为过期，改为内存压缩
+            precompressed = self._precompressed.get((file_path, encoding))
+            if os.path.isfile(sidecar) and os.stat(sidecar).st_mtime_ns >= stat.st_mtime_ns:
+                with open(sidecar, "rb") as f:
+                    body, used_encoding = f.read(), encoding
+            elif precompressed is not None and precompressed[0] == stat.st_mtime_ns:
+                if precompressed[1] is not None:
+                    body, used_encoding = precompressed[1], encoding
+            elif stat.st_size >= MIN_COMPRESS_BYTES:
+                with open(file_path, "rb") as f:
+                    compressed = compress_bytes(f.read(), encoding)
+                if len(compressed) < stat.st_size:
+                    body, used_encoding = compressed, encoding
+        if body is None and stat.st_size <= STREAM_THRESHOLD_BYTES:
+            with open(file_path, "rb") as f:
+                body = f.read()
+
+        length = len(body) if body is not None else stat.st_size
+        etag = f'"{stat.st_size:x}-{stat.st_mtime_ns:x}{"-" + used_encoding if used_encoding else ""}"'
+        headers = [
+            ("Content-Type", mimetypes.guess_type(file_path)[0] or "application/octet-stream"),
+            ("Content-Length", str(length)),
+            ("ETag", etag),
+            ("Last-Modified", formatdate(stat.st_mtime, usegmt=True)),
+        ]
+        if self.cache_control:
+            headers.append(("Cache-Control", self.cache_control))
+        if encoding is not None or (self.compress and is_compressible(file_path)):
+            headers.append(("Vary", "Accept-Encoding"))
+        if used_encoding:
+            headers.append(("Content-Encoding", used_encoding))
+        return stat.st_mtime_ns, headers, body
+
+    def _get_entry(self, file_path, encoding, stat):
+        key = (file_path, encoding)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry[0] == stat.st_mtime_ns:
+                self._entries.move_to_end(key)
+                self.stats["cache_hits"] += 1
+                return entry
+        entry = self._load_entry(file_path, encoding, stat)
+        size = len(entry[2]) if entry[2] is not None else 0
+        with self._lock:
+            old = self._entries.pop(key, None)
+            if old is not None:
+                self._cached_bytes -= len(old[2]) if old[2] is not None else 0
+            if size <= self.cache_max_bytes:
+                self._entries[key] = entry
+                self._cached_bytes += size
+                while self._cached_bytes > self.cache_max_bytes:
+                    _, evicted = self._entries.popitem(last=False)
+                    self._cached_bytes -= len(evicted[2]) if evicted[2] is not None else 0
+        return entry
+
+    @staticmethod
+    def _not_modified(environ, headers, mtime_ns):
+        etag = dict(headers)["ETag"]
+        if_none_match = environ.get("HTTP_IF_NONE_MATCH")
+        if if_none_match:
+            return if_none_match.strip() == "*" or etag in [t.strip() for t in if_none_match.split(",")]
+        if_modified_since = environ.get("HTTP_IF_MODIFIED_SINCE")
+        if if_modified_since:
+            try:
+                return int(mtime_ns // 1_000_000_000) <= parsedate_to_datetime(if_modified_since).timestamp()
+            except (TypeError, ValueError):
+                return False
+        return False
+
+    def __call__(self, environ, start_response):
+        if environ.get("PATH_INFO") == HEALTH_PATH:
+            start_response("200 OK", [("Content-Type", "text/plain"), ("Cache-Control", "no-store")])
+            return [b"ok"]
+        started = time.perf_counter()
+        try:
+            return self._respond(environ, start_response)
+        finally:
+            with self._lock:
+                self.stats["requests"] += 1
+                self._latencies.append(time.perf_counter() - started)
+
+    def _respond(self, environ, start_response):
+        path = environ.get("PATH_INFO", "").lstrip("/")
+        if self.log_requests:
+            print(f"Request: {path}")
+        file_path = os.path.normpath(os.path.join(self.serve_dir, path))
+        if not file_path.startswith(self.serve_dir):
+            start_response("403 Forbidden", [("Content-Type", "text/plain")])
+            return [b"403 Forbidden"]
+        try:
+            stat = os.stat(file_path)
+        except OSError:
+            stat = None
+        if stat is None or not S_ISREG(stat.st_mode):
+            start_response("404 Not Found", [("Content-Type", "text/plain")])
+            return [b"404 Not Found"]
+
+        encoding = None
+        if self.compress and is_compressible(file_path):
+            encoding = negotiate_encoding(environ.get("HTTP_ACCEPT_ENCODING"))
+        try:
+            mtime_ns, headers, body = self._get_entry(file_path, encoding, stat)
+        except Exception as e:
+            start_response("500 Internal Server Error", [("Content-Type", "text/plain")])
+            return [f"读取文件错误: {e}".encode("utf-8")]
+
+        if self._not_modified(environ, headers, mtime_ns):
+            with self._lock:
+                self.stats["not_modified"] += 1
+            start_response("304 Not Modified", [h for h in headers if h[0] not in ("Content-Length", "Content-Type")])
+            return [b""]
+        start_response("200 OK", headers)
+        if environ.get("REQUEST_METHOD") == "HEAD":
+            return [b""]
+        if body is not None:
+            return [body]
+        with self._lock:
+            self.stats["streamed"] += 1
+        f = open(file_path, "rb")
+        file_wrapper = environ.get("wsgi.file_wrapper")
+        if file_wrapper is not None:
+            return file_wrapper(f, STREAM_BLOCK_SIZE)
+        return iter(lambda: f.read(STREAM_BLOCK_SIZE), b"")
+
+    def latency_summary(self):
+        """返回请求处理耗时的分位数（毫秒）与缓存统计，用于检查服务端是否引入测量噪声。"""
+        with self._lock:
+            samples = sorted(self._latencies)
+            summary = dict(self.stats, cached_bytes=self._cached_bytes)
+        if not samples:
+            return summary
+        def percentile(p):
+            return round(samples[min(len(samples) - 1, int(p / 100 * len(samples)))] * 1000, 3)
+        summary.update({"p50_ms": percentile(50), "p90_ms": percentile(90), "p99_ms": percentile(99),
+                        "max_ms": round(samples[-1] * 1000, 3)})
+        return summary
+
+
+class MeasurementServer:
+    """
+    在后台线程中运行的 waitress 服务器。port 为 0 时由系统分配空闲端口，多个报告脚本可以同时运行；
+    start() 先调用应用的 prepare()（如有），再在 HEALTH_PATH 探测成功后返回；
+    stop() 停止工作线程、关闭监听端口并等待服务线程退出。
+    """
+
+    def __init__(self, app, host="127.0.0.1", port=0, threads=10):
+        self.app = app
+        self.host = host
+        self.requested_port = port
+        self.threads = threads
+        self.server = None
+        self.thread = None
+
+    @property
+    def port(self):
+        return self.server.effective_port if self.server else None
+
+    @property
+    def base_url(self):
+        return f"http://{self.host}:{self.port}"
+
+    def start(self, timeout=READY_TIMEOUT_SECONDS):
+        """启动服务器并等待就绪，返回就绪耗时（秒，包含 prepare 的耗时）；超时抛出 RuntimeError。"""
+        if create_server is None:
+            raise RuntimeError("未安装 waitress，无法启动测量服务器: pip install waitress")
+        started = time.perf_counter()
+        prepare = getattr(self.app, "prepare", None)
+        if prepare is not None:
+            prepare()
+        # create_server 立即绑定端口，effective_port 即系统分配的端口
+        self.server = create_server(self.app, host=self.host, port=self.requested_port, threads=self.threads)
+        self.thread = threading.Thread(target=self.server.run, name=f"measurement-server-{self.port}", daemon=True)
+        self.thread.start()
+        deadline = started + timeout
+        while True:
+            try:
+                with urllib.request.urlopen(self.base_url + HEALTH_PATH, timeout=1) as response:
+                    if response.status == 200:
+                        return time.perf_counter() - started
+            except OSError:
+                pass
+            if time.perf_counter() >= deadline or not self.thread.is_alive():
+                self.stop()
+                raise RuntimeError(f"测量服务器在 {timeout} 秒内未就绪: {self.base_url}")
+            time.sleep(READY_POLL_INTERVAL_SECONDS)
+
+    def stop(self, timeout=5):
+        """关闭服务器，返回服务线程是否已退出。"""
+        if self.server is None:
+            return True
+        self.server.task_dispatcher.shutdown(timeout=timeout)
+        # 监听端口、唤醒管道与所有连接必须在 asyncore 循环线程中关闭：在其他线程关闭会让正在 select() 的循环
+        # 遇到失效的文件描述符（EBADF）。通过唤醒管道把关闭操作交给循环线程，map 清空后循环立即退出
+        close_all = lambda: wasyncore.close_all(self.server._map)
+        if self.thread.is_alive():
+            self.server.trigger.pull_trigger(close_all)
+            self.thread.join(timeout)
+        else:
+            close_all()
+        return not self.thread.is_alive()
+
+
+def write_sidecars(file_path, encodings=SUPPORTED_ENCODINGS):
+    """
+    为单个文件写出 .br / .gz 旁路文件，返回 {编码: 压缩后大小}。压缩无收益时删除已有旁路文件并跳过。
+    """
+    with open(file_path, "rb") as f:
+        data = f.read()
+    written = {}
+    for encoding in encodings:
+        sidecar = file_path + SIDECAR_SUFFIXES[encoding]
+        body = compress_bytes(data, encoding) if len(data) >= MIN_COMPRESS_BYTES else None
+        if body is None or len(body) >= len(data):
+            if os.path.exists(sidecar):
+                os.remove(sidecar)
+            continue
+        with open(sidecar, "wb") as f:
+            f.write(body)
+        written[encoding] = len(body)
+    return written
@@ -0,0 +1,274 @@
+import re
+import xml.etree.ElementTree as ET
+
+# --- SVG 优化（纯标准库实现） ---
+# 删除元数据、注释、编辑器命名空间和无用属性，展开多余的 <g>，降低数值精度，删除未使用的 <defs> 内容。
+
+SVG_NS = "http://www.w3.org/2000/svg"
+XLINK_NS = "http://www.w3.org/1999/xlink"
+XML_NS = "http://www.w3.org/XML/1998/namespace"
+KEPT_NAMESPACES = (SVG_NS, XLINK_NS, XML_NS)
+
+ET.register_namespace("", SVG_NS)
+ET.register_namespace("xlink", XLINK_NS)
+
+DEFAULT_PRECISION = 2
+# 编辑器导出的冗余属性
+REDUNDANT_ATTRIBUTES = ("version", "data-name", f"{{{XML_NS}}}space", "enable-background")
+# 数值可以安全降低精度的属性
+NUMERIC_ATTRIBUTES = ("d", "points", "transform", "viewBox", "x", "y", "x1", "y1", "x2", "y2", "cx", "cy", "r",
+                      "rx", "ry", "width", "height", "stroke-width", "offset", "fx", "fy")
+# 这些属性作用于整个分组，不能下推到子元素
+GROUP_ONLY_ATTRIBUTES = ("id", "class", "clip-path", "mask", "filter", "style", "opacity")
+# 文本内容有意义，不能删除其中的空白
+TEXT_ELEMENTS = ("text", "tspan", "textPath", "style", "script", "title", "desc")
+
+NUMBER_PATTERN = re.compile(r"-?(?:\d+\.\d*|\.\d+|\d+)(?:[eE][-+]?\d+)?")
+ID_REFERENCE_PATTERN = re.compile(r"url\(\s*['\"]?#([^)'\"\s]+)")
+# 每个路径命令一组参数的个数
+PATH_ARGUMENT_COUNTS = {"M": 2, "L": 2, "T": 2, "H": 1, "V": 1, "C": 6, "S": 4, "Q": 4, "A": 7, "Z": 0}
+PATH_ARGUMENT_COUNTS.update({command.lower(): count for command, count in PATH_ARGUMENT_COUNTS.items()})
+
+
+def local_name(tag):
+    return tag.rsplit("}", 1)[-1] if isinstance(tag, str) else ""
+
+
+def namespace_of(name):
+    return name[1:].split("}", 1)[0] if name.startswith("{") else None
+
+
+def format_number(match, precision):
+    value = round(float(match.group(0)), precision)
+    text = f"{value:.{precision}f}".rstrip("0").rstrip(".") if precision > 0 else str(int(value))
+    if text in ("-0", ""):
+        text = "0"
+    # 0.5 → .5，-0.5 → -.5
+    if text.startswith("0.") and len(text) > 2:
+        text = text[1:]
+    elif text.startswith("-0.") and len(text) > 3:
+        text = "-" + text[2:]
+    return text
+
+
+def round_numbers(value, precision):
+    rounded = NUMBER_PATTERN.sub(lambda m: format_number(m, precision), value)
+    # 负号本身就是数值分隔符
+    rounded = re.sub(r"[\s,]+-", "-", rounded)
+    return re.sub(r"\s+", " ", rounded).strip()
+
+
+def tokenize_path(value):
+    """
+    把 d 属性拆成 [(命令, [参数文本, ...]), ...]。A/a 的两个标志位只占一个字符（"011-5" 是 0、1、1、-5），
+    不能按普通数字切分。无法解析时返回 None。
+    """
+    segments = []
+    position = 0
+    command = None
+    separator = re.compile(r"[\s,]*")
+    while True:
+        position = separator.match(value, position).end()
+        if position >= len(value):
+            return segments
+        char = value[position]
+        if char in PATH_ARGUMENT_COUNTS:
+            command = char
+            segments.append((command, []))
+            position += 1
+            continue
+        if command is None or command in "Zz":
+            return None
+        # 同一命令的后续参数组（隐式重复）
+        args = segments[-1][1]
+        if command in "Aa" and len(args) % 7 in (3, 4):
+            if char not in "01":
+                return None
+            args.append(char)
+            position += 1
+            continue
+        match = NUMBER_PATTERN.match(value, position)
+        if not match:
+            return None
+        args.append(match.group(0))
+        position = match.end()
+
+
+def round_path(value, precision):
+    """降低路径数据的精度；标志位原样保留，无法解析的路径不做修改。"""
+    segments = tokenize_path(value)
+    if segments is None or any(PATH_ARGUMENT_COUNTS[command] and len(args) % PATH_ARGUMENT_COUNTS[command]
+                               for command, args in segments):
+        return value
+    parts = []
+    for command, args in segments:
+        flags = set(range(3, len(args), 7)) | set(range(4, len(args), 7)) if command in "Aa" else set()
+        numbers = [arg if i in flags else format_number(NUMBER_PATTERN.match(arg), precision)
+                   for i, arg in enumerate(args)]
+        # 负号本身就是数值分隔符，命令字母本身也是分隔符
+        parts.append(command + re.sub(r" -", "-", " ".join(numbers)))
+    return "".join(parts)
+
+
+def referenced_ids(root):
+    """文档内通过 url(#id) 或 href="#id" 引用的 id。"""
+    ids = set()
+    for element in root.iter():
+        for name, value in element.attrib.items():
+            if local_name(name) == "href" and value.startswith("#"):
+                ids.add(value[1:])
+            else:
+                ids.update(ID_REFERENCE_PATTERN.findall(value))
+        if local_name(element.tag) == "style" and element.text:
+            ids.update(ID_REFERENCE_PATTERN.findall(element.text))
+    return ids
+
+
+def clean_style(value):
+    declarations = [d.strip() for d in value.split(";") if d.strip()]
+    kept = [d for d in declarations if not d.replace(" ", "").startswith("enable-background:")]
+    return ";".join(kept)
+
+
+def clean_element(element, precision, used_ids, keep_ids):
+    for name in list(element.attrib):
+        value = element.attrib[name]
+        namespace = namespace_of(name)
+        if namespace and namespace not in KEPT_NAMESPACES:
+            del element.attrib[name]
+        elif name in REDUNDANT_ATTRIBUTES or (value == "" and name != "alt"):
+            del element.attrib[name]
+        elif name == "style":
+            style = clean_style(value)
+            if style:
+                element.attrib[name] = style
+            else:
+                del element.attrib[name]
+        elif name == "id" and not keep_ids and value not in used_ids:
+            del element.attrib[name]
+        elif name == "d":
+            element.attrib[name] = round_path(value, precision)
+        elif name in NUMERIC_ATTRIBUTES:
+            element.attrib[name] = round_numbers(value, precision)
+
+
+def prune_children(element, precision, used_ids, keep_ids):
+    """递归删除注释、编辑器元素和 <metadata>，清理属性与格式化空白。"""
+    for child in list(element):
+        tag = child.tag
+        if not isinstance(tag, str):
+            # 注释与处理指令
+            element.remove(child)
+            continue
+        namespace = namespace_of(tag)
+        name = local_name(tag)
+        if (namespace and namespace not in KEPT_NAMESPACES) or name == "metadata":
+            element.remove(child)
+            continue
+        clean_element(child, precision, used_ids, keep_ids)
+        prune_children(child, precision, used_ids, keep_ids)
+
+    if local_name(element.tag) not in TEXT_ELEMENTS:
+        element.text = None
+        for child in element:
+            child.tail = None
+
+
+def remove_unused_defs(root, used_ids):
+    for parent in list(root.iter()):
+        for defs in [c for c in parent if local_name(c.tag) == "defs"]:
+            for child in list(defs):
+                if local_name(child.tag) != "style" and child.get("id") not in used_ids:
+                    defs.remove(child)
+            if len(defs) == 0:
+                parent.remove(defs)
+
+
+def collapse_groups(element):
+    """展开无属性的 <g>；只有一个子元素的 <g> 把可下推的属性移到子元素上。"""
+    for child in list(element):
+        collapse_groups(child)
+    index = 0
+    while index < len(element):
+        child = element[index]
+        if local_name(child.tag) != "g":
+            index += 1
+            continue
+        if len(child) == 1 and child.attrib and not any(a in child.attrib for a in GROUP_ONLY_ATTRIBUTES):
+            grandchild = child[0]
+            movable = all(a not in grandchild.attrib or a == "transform" for a in child.attrib)
+            if movable and "transform" in child.attrib and "transform" in grandchild.attrib:
+                grandchild.set("transform", f"{child.attrib['transform']} {grandchild.attrib['transform']}")
+                del child.attrib["transform"]
+            if movable:
+                for name, value in child.attrib.items():
+                    grandchild.set(name, value)
+                child.attrib.clear()
+        if not child.attrib:
+            element.remove(child)
+            for offset, grandchild in enumerate(list(child)):
+                element.insert(index + offset, grandchild)
+            continue
+        index += 1
+
+
+def effective_precision(root, precision):
+    """viewBox 很小的图标需要更多小数位，否则降低精度会明显变形。"""
+    numbers = [abs(float(n)) for n in NUMBER_PATTERN.findall(root.get("viewBox", ""))[2:]]
+    extent = max(numbers) if numbers else 0
+    if 0 < extent < 10:
+        return precision + 2
+    if 0 < extent < 100:
+        return precision + 1
+    return precision
+
+
+def optimize_svg(svg_text, precision=DEFAULT_PRECISION, keep_ids=False):
+    """
+    返回优化后的 SVG 文本。keep_ids=True 时保留所有 id（外部通过 file.svg#id 引用时需要）。
+    解析失败时抛出 ET.ParseError。
+    """
+    root = ET.fromstring(svg_text)
+    if local_name(root.tag) != "svg":
+        raise ValueError(f"根元素不是 <svg>: {root.tag}")
+    used_ids = referenced_ids(root)
+    precision = effective_precision(root, precision)
+    # 内部 <style> 可能通过 #id 选择器引用元素，此时保留全部 id
+    keep_ids = keep_ids or any(local_name(e.tag) == "style" for e in root.iter())
+    clean_element(root, precision, used_ids, keep_ids)
+    for name in ("x", "y"):
+        if root.get(name) in ("0", "0px"):
+            del root.attrib[name]
+    prune_children(root, precision, used_ids, keep_ids)
+    remove_unused_defs(root, used_ids)
+    collapse_groups(root)
+    if namespace_of(root.tag) is None:
+        root.set("xmlns", SVG_NS)
+    return ET.tostring(root, encoding="unicode", short_empty_elements=True)
+
+
+def svg_has_ids(svg_text):
+    return re.search(r"\sid=", svg_text) is not None
+
+
+def strip_namespaces(root):
+    """去掉 ElementTree 的命名空间前缀，便于以 HTML 内联 SVG 的形式输出。"""
+    for element in root.iter():
+        if isinstance(element.tag, str):
+            element.tag = local_name(element.tag)
+        for name in list(element.attrib):
+            if name.startswith("{"):
+                value = element.attrib.pop(name)
+                # SVG 2 中 href 不再需要 xlink 前缀
+                element.attrib[local_name(name)] = value
+    return root
+
+
+def inline_parts(svg_text):
+    """
+    拆出内联所需的部分：返回 (根元素属性, 子元素标记)。
+    """
+    root = strip_namespaces(ET.fromstring(svg_text))
+    attributes = {k: v for k, v in root.attrib.items() if k != "xmlns"}
+    inner = "".join(ET.tostring(child, encoding="unicode", short_empty_elements=True) for child in root)
+    return attributes, inner
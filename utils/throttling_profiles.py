@@ -0,0 +1,67 @@
+import os
+
+# --- Lighthouse 网络 / CPU 节流配置 ---
+# 每个配置同时给出 Lighthouse CLI 参数（build_lighthouse_command）与 Node API 的 settings（lighthouse_warm.mjs），
+# 两种测量后端在同一配置下的节流与设备模拟完全相同。数值取自 Lighthouse 内置的 mobile / desktop 预设。
+
+MOBILE_SCREEN = {"mobile": True, "width": 412, "height": 823, "deviceScaleFactor": 1.75, "disabled": False}
+DESKTOP_SCREEN = {"mobile": False, "width": 1350, "height": 940, "deviceScaleFactor": 1, "disabled": False}
+
+THROTTLING_PROFILES = {
+    # Lighthouse 默认：Moto G Power + 慢速 4G（150 ms RTT，1.6 Mbps），CPU 降速 4 倍
+    "mobile-slow4g": {
+        "description": "移动端，慢速 4G，CPU 4x 降速",
+        "formFactor": "mobile",
+        "screenEmulation": MOBILE_SCREEN,
+        "throttlingMethod": "simulate",
+        "throttling": {"rttMs": 150, "throughputKbps": 1638.4, "cpuSlowdownMultiplier": 4},
+    },
+    # Lighthouse desktop 预设：有线宽带（40 ms RTT，10 Mbps），CPU 不降速
+    "desktop-cable": {
+        "description": "桌面端，有线宽带，CPU 不降速",
+        "formFactor": "desktop",
+        "screenEmulation": DESKTOP_SCREEN,
+        "throttlingMethod": "simulate",
+        "throttling": {"rttMs": 40, "throughputKbps": 10240, "cpuSlowdownMultiplier": 1},
+    },
+    # 不做任何节流，反映本机直连本地服务器的原始速度
+    "none": {
+        "description": "移动端屏幕，不节流",
+        "formFactor": "mobile",
+        "screenEmulation": MOBILE_SCREEN,
+        "throttlingMethod": "provided",
+        "throttling": {"rttMs": 0, "throughputKbps": 0, "cpuSlowdownMultiplier": 1},
+    },
+}
+DEFAULT_PROFILE = "mobile-slow4g"
+
+
+def selected_profiles(value=None):
+    """
+    解析逗号分隔的配置名（默认读取环境变量 LIGHTHOUSE_PROFILES），第一个为主配置。
+    未知的配置名抛出 ValueError。
+    """
+    value = value if value is not None else os.getenv("LIGHTHOUSE_PROFILES", DEFAULT_PROFILE)
+    names = [name.strip() for name in value.split(",") if name.strip()] or [DEFAULT_PROFILE]
+    unknown = [name for name in names if name not in THROTTLING_PROFILES]
+    if unknown:
+        raise ValueError(f"未知的节流配置: {', '.join(unknown)}（可选: {', '.join(THROTTLING_PROFILES)}）")
+    return list(dict.fromkeys(names))
+
+
+def lighthouse_settings(name):
+    """Node API 的 flags / settings 字典。"""
+    profile = THROTTLING_PROFILES[name]
+    return {key: profile[key] for key in ("formFactor", "screenEmulation", "throttlingMethod", "throttling")}
+
+
+def lighthouse_cli_flags(name):
+    """Lighthouse CLI 参数列表。"""
+    settings = lighthouse_settings(name)
+    flags = [f"--form-factor={settings['formFactor']}", f"--throttling-method={settings['throttlingMethod']}"]
+    for group in ("screenEmulation", "throttling"):
+        for key, value in settings[group].items():
+            if isinstance(value, bool):
+                value = str(value).lower()
+            flags.append(f"--{group}.{key}={value}")
+    return flags